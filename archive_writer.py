@@ -0,0 +1,255 @@
+import collections
+import os
+import queue
+import threading
+import time
+
+from metrics import metrics
+
+
+class ArchiveWriter:
+    """
+    Write-behind archive for captured images.
+
+    submit() only enqueues, so the disk never sits on the capture/upload
+    path. A single writer thread drains the bounded queue in batches,
+    optionally fsyncs, and enforces retention after every batch by deleting
+    the oldest files first until the age, file-count and byte limits hold.
+
+    fsync policy:
+      none   — leave flushing to the OS (fastest)
+      batch  — fsync every file of a batch before the next batch starts
+      always — fsync each file right after writing it
+
+    If the queue is full the frame is dropped and counted rather than
+    blocking the caller; a warning is printed when the queue runs more
+    than 75 % full (the writer is falling behind).
+    """
+
+    def __init__(
+        self,
+        root: str,
+        queue_size: int = 32,
+        batch_size: int = 8,
+        fsync: str = "none",
+        max_age_s: float | None = None,
+        max_files: int | None = None,
+        max_bytes: int | None = None,
+        age_check_interval: float = 60.0,
+        on_evicted=None,
+    ):
+        if fsync not in ("none", "batch", "always"):
+            raise ValueError(f"Invalid fsync policy '{fsync}' (none | batch | always)")
+        self.root       = root
+        self.batch_size = max(1, batch_size)
+        self.fsync      = fsync
+        self.max_age_s  = max_age_s
+        self.max_files  = max_files
+        self.max_bytes  = max_bytes
+        self.age_check_interval = age_check_interval
+        self.on_evicted = on_evicted  # on_evicted(path), from the writer thread
+
+        self._queue  = queue.Queue(maxsize=queue_size)
+        self._thread: threading.Thread | None = None
+        self._files: collections.deque[tuple[float, str, int]] = collections.deque()
+        self._total_bytes   = 0
+        self._known_dirs: set[str] = set()
+        self._last_age_check = 0.0
+        self._last_lag_warning = 0.0
+
+        self.written = 0
+        self.dropped = 0
+        self.evicted = 0
+        self.errors  = 0
+
+    # ── Public API ────────────────────────────────────────────────────────────
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        os.makedirs(self.root, exist_ok=True)
+        self._scan_existing()
+        self._thread = threading.Thread(target=self._run, daemon=True, name="archive-writer")
+        self._thread.start()
+        print(f"Archive writer started: {self.root} "
+              f"({len(self._files)} files, {self._total_bytes / 1e9:.2f} GB on disk)")
+
+    def submit(self, relpath: str, data: bytes, on_written=None) -> bool:
+        """
+        Queue `data` to be written to root/relpath. Never blocks; returns
+        False (and counts a drop) if the writer is too far behind.
+        on_written(path) is called from the writer thread after the write.
+        """
+        try:
+            self._queue.put_nowait((relpath, data, on_written))
+        except queue.Full:
+            self.dropped += 1
+            metrics.inc("archive_dropped", help="Images not archived because the writer fell behind")
+            metrics.event("drop", where="archive", path=relpath)
+            print(f"[Archive] Queue full — dropped {relpath} ({self.dropped} dropped total)")
+            return False
+
+        depth = self._queue.qsize()
+        if depth > 0.75 * self._queue.maxsize and time.time() - self._last_lag_warning > 5.0:
+            self._last_lag_warning = time.time()
+            print(f"[Archive] Writer falling behind: {depth}/{self._queue.maxsize} queued")
+        return True
+
+    def stop(self, timeout: float = 10.0):
+        """Flush everything queued so far, then stop the writer thread."""
+        if not self._thread:
+            return
+        self._queue.put(None)
+        self._thread.join(timeout=timeout)
+        self._thread = None
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize(),
+            "written": self.written,
+            "dropped": self.dropped,
+            "evicted": self.evicted,
+            "errors": self.errors,
+            "files": len(self._files),
+            "bytes": self._total_bytes,
+        }
+
+    # ── Writer thread ─────────────────────────────────────────────────────────
+
+    def _run(self):
+        while True:
+            item     = self._queue.get()
+            stopping = item is None
+            batch    = [] if stopping else [item]
+            # On stop, drain everything that is left into the final batch
+            while stopping or len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                else:
+                    batch.append(item)
+
+            if batch:
+                self._write_batch(batch)
+                self._enforce_retention()
+
+            if stopping:
+                return
+
+    def _write_batch(self, batch):
+        pending_sync = []
+        for relpath, data, on_written in batch:
+            path    = os.path.join(self.root, relpath)
+            started = time.perf_counter()
+            try:
+                directory = os.path.dirname(path)
+                if directory not in self._known_dirs:
+                    os.makedirs(directory, exist_ok=True)
+                    self._known_dirs.add(directory)
+
+                f = open(path, "wb")
+                try:
+                    f.write(data)
+                    if self.fsync == "always":
+                        f.flush()
+                        os.fsync(f.fileno())
+                    elif self.fsync == "batch":
+                        f.flush()
+                        pending_sync.append(f)
+                        f = None
+                finally:
+                    if f is not None:
+                        f.close()
+            except OSError as e:
+                self.errors += 1
+                metrics.inc("archive_errors")
+                print(f"[Archive] Write failed for {path}: {e}")
+                continue
+            metrics.observe("archive_write_seconds", time.perf_counter() - started,
+                            help="Disk write time per archived image")
+
+            self._files.append((time.time(), path, len(data)))
+            self._total_bytes += len(data)
+            self.written += 1
+            if on_written:
+                try:
+                    on_written(path)
+                except Exception as e:
+                    print(f"[Archive] on_written callback failed: {e}")
+
+        for f in pending_sync:
+            try:
+                os.fsync(f.fileno())
+            except OSError as e:
+                self.errors += 1
+                print(f"[Archive] fsync failed for {f.name}: {e}")
+            finally:
+                f.close()
+
+    # ── Retention ─────────────────────────────────────────────────────────────
+
+    def _scan_existing(self):
+        entries = []
+        for dirpath, _, filenames in os.walk(self.root):
+            self._known_dirs.add(dirpath)
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, path, st.st_size))
+        entries.sort()
+        self._files = collections.deque(entries)
+        self._total_bytes = sum(e[2] for e in entries)
+        self._enforce_retention(force_age=True)
+
+    def _enforce_retention(self, force_age: bool = False):
+        now = time.time()
+        check_age = self.max_age_s is not None and (
+            force_age or now - self._last_age_check >= self.age_check_interval)
+        if check_age:
+            self._last_age_check = now
+
+        while self._files:
+            mtime, _, _ = self._files[0]
+            over = (
+                (self.max_files is not None and len(self._files) > self.max_files)
+                or (self.max_bytes is not None and self._total_bytes > self.max_bytes)
+                or (check_age and now - mtime > self.max_age_s)
+            )
+            if not over:
+                break
+            self._evict_oldest()
+
+    def _evict_oldest(self):
+        _, path, size = self._files.popleft()
+        self._total_bytes -= size
+        try:
+            os.remove(path)
+            self.evicted += 1
+            metrics.inc("archive_evicted")
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            self.errors += 1
+            print(f"[Archive] Could not delete {path}: {e}")
+            return
+        if self.on_evicted:
+            try:
+                self.on_evicted(path)
+            except Exception as e:
+                print(f"[Archive] on_evicted callback failed: {e}")
+
+        # Drop emptied sub-directories so the tree does not accumulate shells
+        directory = os.path.dirname(path)
+        while os.path.normpath(directory) != os.path.normpath(self.root):
+            try:
+                os.rmdir(directory)
+            except OSError:
+                break
+            self._known_dirs.discard(directory)
+            directory = os.path.dirname(directory)
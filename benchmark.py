@@ -0,0 +1,466 @@
+"""
+End-to-end benchmark: the real capture → encode → save → upload → PLC path
+and the real ModbusButton, run against local stand-ins.
+
+  SyntheticSource       — generated frames at any MEGA_PIXEL_RESOLUTIONS size
+  StubInspectionAPI     — HTTP server answering /headless/inspect after a
+                          configurable latency
+  PlcSimulator          — pymodbus TCP server with the FX5U X0 input and
+                          Y0–Y2 result coils; pulses X0 and timestamps every
+                          coil write
+
+For each resolution the simulator presses X0 `--cycles` times at `--rate`
+and the report shows cycles/s and trigger → coil latency (X0 rising edge on
+the PLC to the FC15 result write arriving back at the PLC).
+
+    python benchmark.py                      # 6 MP, pipeline mode
+    python benchmark.py --mp all --cycles 50
+    python benchmark.py --mode serial --api-latency 120
+    python benchmark.py --mode async --rate 10
+
+Encoder and pipeline settings (UPLOAD_ENCODER, ENCODE_WORKERS, ...) are read
+from the environment / .env as usual; API, Modbus and storage paths are
+always pointed at the stand-ins and a temporary directory.
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import random
+import socket
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from pymodbus.datastore import (ModbusDeviceContext, ModbusSequentialDataBlock,
+                                ModbusServerContext)
+from pymodbus.server import ModbusTcpServer
+
+from source_baumer import MEGA_PIXEL_RESOLUTIONS
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+# ── Inspection API stand-in ──────────────────────────────────────────────────
+
+class StubInspectionAPI:
+    """
+    Accepts the multipart upload and answers like the headless inspection
+    API ({"overall_result": "Pass" | "Fail"}) after `latency` ± `jitter` s.
+    """
+
+    def __init__(self, latency: float = 0.05, jitter: float = 0.0, fail_ratio: float = 0.2):
+        self.latency    = latency
+        self.jitter     = jitter
+        self.fail_ratio = fail_ratio
+        self.requests   = 0
+        self.port       = _free_port()
+        self._lock      = threading.Lock()
+        self._server: ThreadingHTTPServer | None = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}/headless/inspect"
+
+    def start(self):
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive, like the real API
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                with api._lock:
+                    api.requests += 1
+                delay = api.latency + random.uniform(-api.jitter, api.jitter)
+                time.sleep(max(0.0, delay))
+                result = "Fail" if random.random() < api.fail_ratio else "Pass"
+                body = json.dumps({"overall_result": result}).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", self.port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True,
+                         name="stub-api").start()
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+# ── PLC stand-in ─────────────────────────────────────────────────────────────
+
+class _RecordingCoils(ModbusSequentialDataBlock):
+    """Coil block that timestamps every write (one FC15 = one result)."""
+
+    def __init__(self, address, values, on_write):
+        super().__init__(address, values)
+        self._on_write = on_write
+
+    def setValues(self, address, values):
+        result = super().setValues(address, values)
+        self._on_write(time.monotonic(), address - 1, list(values))
+        return result
+
+
+class PlcSimulator:
+    """
+    Modbus TCP server imitating the FX5U: discrete input X0 (the button)
+    and coils Y0–Y2 (NA/Pass/Fail). press() pulses X0; coil writes are
+    recorded with their arrival time.
+    """
+
+    def __init__(self, input_address: int = 0, output_address: int = 0):
+        self.input_address  = input_address
+        self.output_address = output_address
+        self.port           = _free_port()
+        self.presses: list[float] = []                    # monotonic X0 rising edges
+        self.writes: list[tuple[float, int, list]] = []   # (monotonic, address, coils)
+        self._lock   = threading.Lock()
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._server: ModbusTcpServer | None = None
+        self._thread: threading.Thread | None = None
+
+        size = max(input_address, output_address + 2) + 2  # device context adds 1
+        self._device = ModbusDeviceContext(
+            di=ModbusSequentialDataBlock(0, [False] * size),
+            co=_RecordingCoils(0, [False] * size, self._record_write),
+        )
+
+    def _record_write(self, when, address, values):
+        with self._lock:
+            self.writes.append((when, address, values))
+
+    def start(self):
+        ready = threading.Event()
+
+        async def serve():
+            context = ModbusServerContext(devices=self._device, single=True)
+            self._server = ModbusTcpServer(context, address=("127.0.0.1", self.port))
+            await self._server.serve_forever(background=True)
+
+        def run():
+            self._loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self._loop)
+            self._loop.run_until_complete(serve())
+            ready.set()
+            self._loop.run_forever()
+
+        self._thread = threading.Thread(target=run, daemon=True, name="plc-sim")
+        self._thread.start()
+        if not ready.wait(5):
+            raise RuntimeError("Modbus simulator did not start")
+
+    def press(self, width: float = 0.05):
+        """Hold X0 high for `width` seconds (blocking)."""
+        self._device.setValues(2, self.input_address, [True])
+        with self._lock:
+            self.presses.append(time.monotonic())
+        time.sleep(width)
+        self._device.setValues(2, self.input_address, [False])
+
+    def reset(self):
+        with self._lock:
+            self.presses.clear()
+            self.writes.clear()
+
+    def stop(self):
+        if self._loop and self._server:
+            asyncio.run_coroutine_threadsafe(self._server.shutdown(), self._loop).result(5)
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(timeout=5)
+        self._server = None
+
+
+# ── Benchmark run ────────────────────────────────────────────────────────────
+
+def _percentile(samples: list[float], p: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+
+def _button_args(main, plc: PlcSimulator) -> dict:
+    return dict(
+        host="127.0.0.1",
+        port=plc.port,
+        address=plc.input_address,
+        poll_interval=main.MODBUS_POLL_INTERVAL,
+        fast_poll_interval=main.MODBUS_FAST_POLL,
+        fast_poll_window=main.MODBUS_FAST_WINDOW,
+        debounce=main.MODBUS_DEBOUNCE,
+    )
+
+
+def _press_all(plc: PlcSimulator, args):
+    """Pulse X0 `args.cycles` times at `args.rate`."""
+    period  = 1.0 / args.rate
+    started = time.monotonic()
+    for i in range(args.cycles):
+        plc.press(args.pulse)
+        time.sleep(max(0.0, started + (i + 1) * period - time.monotonic()))
+
+
+def _answer(main, sequence: int, part, queued_at: float) -> tuple:
+    """(edge sequence, coil address, result value, when the write was queued) of a part."""
+    return (sequence, part.output_address, main.RESULT_VALUES.get(part.overall_result, 0),
+            queued_at)
+
+
+def _plc_queued_at(part) -> float:
+    """When the PLC stage (which queues the coil write) started, for a part just done."""
+    return time.monotonic() - part.stage_times.get("plc", 0.0)
+
+
+def _match_writes(plc: PlcSimulator, answered: list[tuple]) -> tuple[list[float], int]:
+    """
+    Pair coil writes with parts by address and arrival time. A write serves
+    the parts queued at its address before it arrived: the last one whose
+    result it carries is answered, earlier ones were coalesced into it
+    (superseded). Pulse-end writes (all coils off) are skipped. Returns the
+    trigger → coil latencies and the number of superseded parts.
+    """
+    from modbus_button import _result_coils
+
+    by_address: dict[int, list[tuple]] = {}
+    for entry in sorted(answered, key=lambda a: a[3]):
+        by_address.setdefault(entry[1], []).append(entry)
+
+    latencies, superseded = [], 0
+    for address, parts in by_address.items():
+        pending = 0  # index of the first part not served yet
+        for when, _, coils in (w for w in plc.writes if w[1] == address and any(w[2])):
+            queued = pending
+            while queued < len(parts) and parts[queued][3] <= when:
+                queued += 1
+            served = [k for k in range(pending, queued) if _result_coils(parts[k][2]) == coils]
+            if not served:
+                continue  # not one of ours (or a part queued just as the write went out)
+            last = served[-1]
+            sequence = parts[last][0]
+            if sequence <= len(plc.presses):
+                latencies.append(when - plc.presses[sequence - 1])
+            superseded += last - pending
+            pending = last + 1
+    return latencies, superseded
+
+
+def _summarize(plc: PlcSimulator, answered: list[tuple]) -> dict:
+    latencies, superseded = _match_writes(plc, answered)
+    writes  = [w for w in plc.writes if any(w[2])]
+    elapsed = (writes[-1][0] - plc.presses[0]) if writes and plc.presses else 0.0
+    return {
+        "presses":    len(plc.presses),
+        "answered":   len(latencies),
+        "superseded": superseded,
+        "missed":     len(plc.presses) - len(latencies) - superseded,
+        "cycles_per_s": len(latencies) / elapsed if elapsed > 0 else 0.0,
+        "p50_ms": _percentile(latencies, 50) * 1000 if latencies else float("nan"),
+        "p99_ms": _percentile(latencies, 99) * 1000 if latencies else float("nan"),
+        "max_ms": max(latencies) * 1000 if latencies else float("nan"),
+    }
+
+
+def run_once(main, plc: PlcSimulator, source, args) -> dict:
+    """Drive `args.cycles` X0 presses through one source and collect results."""
+    if args.mode == "async":
+        return asyncio.run(run_once_async(main, plc, source, args))
+    from modbus_button import ModbusButton
+
+    plc.reset()
+    source.connect()
+    button = ModbusButton(**_button_args(main, plc))
+
+    lock     = threading.Lock()
+    answered = []   # _answer() of every part whose result was queued for the PLC
+    finished = []   # every part that left the system (done, failed or dropped)
+
+    def record(sequence, part, queued_at=0.0):
+        with lock:
+            if part is not None and part.overall_result and not part.error:
+                answered.append(_answer(main, sequence, part, queued_at))
+            finished.append(sequence)
+
+    pipeline = None
+    if args.mode == "pipeline":
+        pipeline = main.build_pipeline(source, button)
+        on_done  = pipeline.on_done
+
+        def pipeline_done(part):
+            queued_at = _plc_queued_at(part)
+            on_done(part)
+            record(part.trigger_event.sequence, part, queued_at)
+
+        pipeline.on_done = pipeline_done
+        pipeline.start()
+
+        def on_press(event):
+            part = main.Part(output_address=plc.output_address, trigger_event=event)
+            if not pipeline.submit(part):
+                record(event.sequence, None)
+    else:
+        def on_press(event):
+            started = time.monotonic()
+            record(event.sequence, main.capture_and_process(source, button), started)
+
+    button.on_press = on_press
+    button.connect()
+    button.start()
+    time.sleep(0.2)  # let the poller settle on the idle state
+    _press_all(plc, args)
+
+    deadline = time.monotonic() + args.timeout
+    while time.monotonic() < deadline:
+        with lock:
+            if len(finished) >= len(plc.presses):
+                break
+        time.sleep(0.01)
+
+    button.stop_polling()
+    if pipeline:
+        pipeline.stop()
+    button.stop()
+    source.disconnect()
+    with lock:
+        return _summarize(plc, answered)
+
+
+async def run_once_async(main, plc: PlcSimulator, source, args) -> dict:
+    """run_once for --mode async: AsyncModbusButton + build_async_pipeline."""
+    from modbus_button import AsyncModbusButton
+
+    plc.reset()
+    await asyncio.to_thread(source.connect)
+    button   = AsyncModbusButton(**_button_args(main, plc))
+    pipeline = main.build_async_pipeline(source, button)
+    answered = []
+    finished = []
+    on_done  = pipeline.on_done
+
+    def pipeline_done(part):
+        queued_at = _plc_queued_at(part)
+        on_done(part)
+        if part.overall_result and not part.error:
+            answered.append(_answer(main, part.trigger_event.sequence, part, queued_at))
+        finished.append(part.trigger_event.sequence)
+
+    def on_press(event):
+        part = main.Part(output_address=plc.output_address, trigger_event=event)
+        if not pipeline.submit(part):
+            finished.append(event.sequence)
+
+    pipeline.on_done = pipeline_done
+    pipeline.start()
+    button.on_press = on_press
+    await button.connect()
+    button.start()
+    await asyncio.sleep(0.2)
+    await asyncio.to_thread(_press_all, plc, args)
+
+    deadline = time.monotonic() + args.timeout
+    while time.monotonic() < deadline and len(finished) < len(plc.presses):
+        await asyncio.sleep(0.01)
+
+    await button.stop_polling()
+    await pipeline.stop()
+    await button.stop()
+    source.disconnect()
+    # The async client belongs to this run's event loop
+    if main._async_upload_client:
+        await main._async_upload_client.close()
+        main._async_upload_client = None
+    return _summarize(plc, answered)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end trigger → PLC benchmark")
+    parser.add_argument("--mp", default="6",
+                        help="Comma-separated megapixel sizes, or 'all' (default: 6)")
+    parser.add_argument("--mono", action="store_true", help="Mono8 frames instead of RGB8")
+    parser.add_argument("--mode", choices=("pipeline", "async", "serial"), default="pipeline",
+                        help="pipeline = build_pipeline, async = build_async_pipeline "
+                             "(RUN_MODE=async), serial = capture_and_process per press")
+    parser.add_argument("--cycles", type=int, default=20, help="X0 presses per resolution")
+    parser.add_argument("--rate", type=float, default=4.0, help="X0 presses per second")
+    parser.add_argument("--pulse", type=float, default=0.05, help="X0 high time (s)")
+    parser.add_argument("--capture-delay", type=float, default=0.0,
+                        help="Simulated exposure + transfer per frame (ms)")
+    parser.add_argument("--api-latency", type=float, default=50.0, help="Stub API latency (ms)")
+    parser.add_argument("--api-jitter", type=float, default=0.0, help="Stub API jitter ± (ms)")
+    parser.add_argument("--timeout", type=float, default=60.0,
+                        help="Max wait for outstanding parts after the last press (s)")
+    parser.add_argument("--verbose", action="store_true", help="Show the application's output")
+    args = parser.parse_args()
+
+    sizes = (sorted(MEGA_PIXEL_RESOLUTIONS) if args.mp == "all"
+             else [int(mp) for mp in args.mp.split(",")])
+    if args.pulse + 0.02 >= 1.0 / args.rate:
+        parser.error("--rate too high for --pulse: X0 needs low time between presses")
+
+    api = StubInspectionAPI(args.api_latency / 1000, args.api_jitter / 1000)
+    plc = PlcSimulator()
+    workdir = tempfile.TemporaryDirectory(prefix="bench_")
+
+    # main reads its configuration at import time; .env never overrides these
+    os.environ.update({
+        "API_URL":          api.url,
+        "IMAGES_SAVE_PATH": os.path.join(workdir.name, "images"),
+        "SPOOL_PATH":       os.path.join(workdir.name, "spool"),
+        "CATALOG_PATH":     os.path.join(workdir.name, "captures.sqlite"),
+        "METRICS_PORT":     "0",
+        "METRICS_LOG_PATH": "",
+    })
+    import main as app
+    from source_synthetic import SyntheticSource
+
+    api.start()
+    plc.start()
+    print(f"Stub API {api.url} ({args.api_latency:g} ms), PLC simulator 127.0.0.1:{plc.port}")
+    print(f"Mode {args.mode}, {args.cycles} presses at {args.rate:g}/s, "
+          f"upload encoder {app.UPLOAD_ENCODER}, archive encoder {app.ARCHIVE_ENCODER}\n")
+    print(f"{'MP':>4} {'size':>11} {'presses':>8} {'answered':>9} {'cycles/s':>9} "
+          f"{'p50 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+
+    results = {}
+    try:
+        for mp in sizes:
+            width, height = MEGA_PIXEL_RESOLUTIONS[mp]
+            source = SyntheticSource(mp, mono=args.mono,
+                                     capture_delay=args.capture_delay / 1000)
+            quiet = contextlib.nullcontext() if args.verbose else \
+                contextlib.redirect_stdout(open(os.devnull, "w"))
+            with quiet:
+                results[mp] = r = run_once(app, plc, source, args)
+            print(f"{mp:>4} {f'{width}x{height}':>11} {r['presses']:>8} {r['answered']:>9} "
+                  f"{r['cycles_per_s']:>9.2f} {r['p50_ms']:>8.1f} {r['p99_ms']:>8.1f} "
+                  f"{r['max_ms']:>8.1f}")
+            if r["missed"]:
+                print(f"     {r['missed']} press(es) got no PLC result (dropped, failed or timed out)")
+            if r["superseded"]:
+                print(f"     {r['superseded']} result(s) coalesced into a newer write before being sent")
+    finally:
+        with contextlib.redirect_stdout(open(os.devnull, "w")):
+            app._close_shared()
+        plc.stop()
+        api.stop()
+        workdir.cleanup()
+    return results
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,272 @@
+"""
+Capture IDs and the SQLite capture catalog.
+
+Every part gets a capture id: microseconds since the epoch at the trigger,
+bumped by one when two triggers land on the same microsecond (two stations,
+or a double press). Ids are unique and strictly increasing within a
+process. The catalog seeds the generator with its highest id, so they stay
+increasing across restarts as long as the clock does not jump back. The id
+also gives the file name (capture_[station_]20250101-120000-123456) and
+the archive shard (2025-01-01/12/), so names never collide.
+
+CaptureCatalog keeps one row per finished part in SQLite: id, name,
+station, source, archive path and size, per-stage seconds, result and
+error. The table is indexed by time, by result and by station, so
+"all Fails between 14:00 and 22:00" is an index range scan, not a
+directory walk:
+
+    python catalog.py --result Fail --since "2025-01-01 14:00" --until "2025-01-01 22:00"
+
+Like the archive, rows are queued and written by one thread in batched
+transactions (WAL journal), so the pipeline never waits on SQLite.
+Readers (query(), the CLI, other tools) use their own connections and
+are not blocked by the writer.
+"""
+import argparse
+import contextlib
+import datetime
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+from metrics import metrics
+
+STAGES = ("capture", "encode", "save", "upload", "plc")
+
+_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS captures (
+    capture_id     INTEGER PRIMARY KEY,  -- µs since the epoch, unique
+    name           TEXT,
+    station        TEXT NOT NULL DEFAULT '',
+    source         TEXT,
+    path           TEXT,                 -- relative to the archive root; NULL = not archived
+    bytes          INTEGER,
+    trigger_time   REAL NOT NULL,        -- Unix time
+    done_time      REAL,
+    {', '.join(f'{stage}_s REAL' for stage in STAGES)},
+    overall_result TEXT,
+    error          TEXT,
+    spooled        INTEGER NOT NULL DEFAULT 0,
+    duplicate_of   INTEGER
+);
+CREATE INDEX IF NOT EXISTS captures_time           ON captures (trigger_time);
+CREATE INDEX IF NOT EXISTS captures_result_time    ON captures (overall_result, trigger_time);
+CREATE INDEX IF NOT EXISTS captures_station_time   ON captures (station, trigger_time);
+CREATE INDEX IF NOT EXISTS captures_path           ON captures (path);
+"""
+
+_COLUMNS = ("capture_id", "name", "station", "source", "path", "bytes", "trigger_time",
+            "done_time", *(f"{stage}_s" for stage in STAGES), "overall_result", "error",
+            "spooled", "duplicate_of")
+
+
+class CaptureIds:
+    """Unique, strictly increasing capture ids (see module docstring)."""
+
+    def __init__(self, last: int = 0):
+        self._last = last
+        self._lock = threading.Lock()
+
+    def next(self, at: float | None = None) -> int:
+        us = int((time.time() if at is None else at) * 1_000_000)
+        with self._lock:
+            self._last = max(us, self._last + 1)
+            return self._last
+
+
+def capture_stamp(capture_id: int) -> str:
+    """20250101-120000-123456: local time of the id, to the microsecond."""
+    seconds, micros = divmod(capture_id, 1_000_000)
+    return f"{time.strftime('%Y%m%d-%H%M%S', time.localtime(seconds))}-{micros:06d}"
+
+
+def shard_dir(capture_id: int, sharding: str = "hour") -> str:
+    """Archive sub-directory for a capture: hour → 2025-01-01/12, day → 2025-01-01."""
+    if sharding == "none":
+        return ""
+    fmt = "%Y-%m-%d" if sharding == "day" else os.path.join("%Y-%m-%d", "%H")
+    return time.strftime(fmt, time.localtime(capture_id // 1_000_000))
+
+
+class CaptureCatalog:
+    """
+    SQLite index of every finished part. record() / set_result() only
+    enqueue; a writer thread commits them in batches. If the queue is
+    full, the row is dropped and counted. The catalog is an index, and
+    the archive and the event log remain the record.
+    """
+
+    def __init__(self, path: str, queue_size: int = 1024, batch_size: int = 64):
+        self.path       = path
+        self.batch_size = max(1, batch_size)
+        self._queue     = queue.Queue(maxsize=queue_size)
+        self._thread: threading.Thread | None = None
+        self.written = 0
+        self.dropped = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        conn = self._connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(_SCHEMA)
+        conn.close()
+        self._thread = threading.Thread(target=self._run, daemon=True, name="capture-catalog")
+        self._thread.start()
+        print(f"Capture catalog: {self.path} ({self.count()} captures)")
+
+    def _read(self, sql: str, args=()) -> list[sqlite3.Row]:
+        with contextlib.closing(self._connect()) as conn:
+            return conn.execute(sql, args).fetchall()
+
+    def last_id(self) -> int:
+        return self._read("SELECT MAX(capture_id) FROM captures")[0][0] or 0
+
+    def count(self) -> int:
+        return self._read("SELECT COUNT(*) FROM captures")[0][0]
+
+    # ── Writes (queued) ───────────────────────────────────────────────────────
+
+    def record(self, **row):
+        """Queue one capture row (keys from the captures table). Never blocks."""
+        self._put(("record", row))
+
+    def set_result(self, capture_id: int, overall_result: str):
+        """
+        Fill in the result of a spooled upload once it is delivered. A
+        fast replay can answer before the part's own row is queued; the
+        result then creates the row, and record() fills in the rest.
+        """
+        self._put(("result", (capture_id, overall_result)))
+
+    def forget_path(self, root: str, path: str):
+        """The archive deleted this file: keep the row, clear its path."""
+        self._put(("evicted", (os.path.relpath(path, root),)))
+
+    def _put(self, item):
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            self.dropped += 1
+            metrics.inc("catalog_dropped", help="Catalog writes dropped because SQLite fell behind")
+            print(f"[Catalog] Queue full — dropped a {item[0]} ({self.dropped} dropped total)")
+
+    def stop(self, timeout: float = 10.0):
+        if not self._thread:
+            return
+        self._queue.put(None)
+        self._thread.join(timeout=timeout)
+        self._thread = None
+
+    def _run(self):
+        conn = self._connect()
+        conn.execute("PRAGMA synchronous=NORMAL")  # WAL: durable at checkpoints, never corrupt
+        # A result delivered by the spool wins over the row's own (NULL, spooled)
+        updates = [f"{c} = excluded.{c}" for c in _COLUMNS
+                   if c not in ("capture_id", "overall_result", "spooled")]
+        insert = (f"INSERT INTO captures ({', '.join(_COLUMNS)}) "
+                  f"VALUES ({', '.join('?' * len(_COLUMNS))}) "
+                  f"ON CONFLICT (capture_id) DO UPDATE SET {', '.join(updates)}, "
+                  "overall_result = COALESCE(overall_result, excluded.overall_result), "
+                  "spooled = CASE WHEN overall_result IS NULL THEN excluded.spooled ELSE 0 END")
+        statements = {
+            "result":  "INSERT INTO captures (capture_id, trigger_time, overall_result, spooled) "
+                       "VALUES (?1, ?1 / 1000000.0, ?2, 0) ON CONFLICT (capture_id) "
+                       "DO UPDATE SET overall_result = excluded.overall_result, spooled = 0",
+            "evicted": "UPDATE captures SET path = NULL WHERE path = ?",
+        }
+        try:
+            while True:
+                item     = self._queue.get()
+                stopping = item is None
+                batch    = [] if stopping else [item]
+                while stopping or len(batch) < self.batch_size:
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is None:
+                        stopping = True
+                    else:
+                        batch.append(item)
+                if batch:
+                    started = time.perf_counter()
+                    try:
+                        with conn:  # one transaction per batch
+                            for op, args in batch:
+                                if op == "record":
+                                    conn.execute(insert, [args.get(c) for c in _COLUMNS])
+                                else:
+                                    conn.execute(statements[op], args)
+                        self.written += len(batch)
+                    except sqlite3.Error as e:
+                        metrics.inc("catalog_errors")
+                        print(f"[Catalog] Write of {len(batch)} rows failed: {e}")
+                    metrics.observe("catalog_write_seconds", time.perf_counter() - started,
+                                    help="One batched catalog transaction")
+                if stopping:
+                    return
+        finally:
+            conn.close()
+
+    # ── Reads ─────────────────────────────────────────────────────────────────
+
+    def query(self, result: str | None = None, station: str | None = None,
+              since: float | None = None, until: float | None = None,
+              limit: int | None = None) -> list[dict]:
+        """Captures matching every given filter, oldest first (times are Unix seconds)."""
+        where, args = [], []
+        for column, op, value in (("overall_result", "=", result), ("station", "=", station),
+                                  ("trigger_time", ">=", since), ("trigger_time", "<", until)):
+            if value is not None:
+                where.append(f"{column} {op} ?")
+                args.append(value)
+        sql = "SELECT * FROM captures"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY trigger_time"
+        if limit:
+            sql += f" LIMIT {int(limit)}"
+        return [dict(row) for row in self._read(sql, args)]
+
+
+def _parse_time(value: str) -> float:
+    """'2025-01-01 14:00' (local time) or Unix seconds."""
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.datetime.fromisoformat(value).timestamp()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query the capture catalog")
+    parser.add_argument("--catalog", default=os.getenv("CATALOG_PATH", "./captures.sqlite"))
+    parser.add_argument("--result", help="Pass | Fail | NA")
+    parser.add_argument("--station")
+    parser.add_argument("--since", type=_parse_time, help="local time, e.g. '2025-01-01 14:00'")
+    parser.add_argument("--until", type=_parse_time)
+    parser.add_argument("--limit", type=int)
+    args = parser.parse_args()
+    if not os.path.isfile(args.catalog):
+        parser.error(f"no capture catalog at {args.catalog} (set --catalog or CATALOG_PATH)")
+
+    rows = CaptureCatalog(args.catalog).query(args.result, args.station, args.since,
+                                              args.until, args.limit)
+    for row in rows:
+        when = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(row["trigger_time"]))
+        print(f"{when}  {row['station'] or '-':<8} {row['overall_result'] or '-':<5} "
+              f"{row['path'] or '(not archived)'}{'  ' + row['error'] if row['error'] else ''}")
+    print(f"{len(rows)} captures")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Local control endpoint: trigger captures, query status and read the last
+result from other processes without going through stdin.
+
+One command per line, one JSON object per reply line, over a Unix socket
+(CONTROL_SOCKET) and/or TCP on localhost (CONTROL_PORT). Connections can
+stay open for any number of commands. A round trip is a line read, a dict
+lookup and a json.dumps, so it takes well under a millisecond:
+
+    $ echo status | nc -U /run/inspection/control.sock
+    {"ok":true,"uptime":12.3,"stations":{...}}
+    $ printf 'trigger st1 wait\\n' | nc 127.0.0.1 8765
+    {"ok":true,"part_id":7,"station":"st1","result":"Pass",...}
+
+The commands themselves are supplied by main.py as {name: func(arg) → dict}.
+"""
+import json
+import os
+import socket
+import socketserver
+import stat
+import threading
+import time
+from typing import Callable
+
+from metrics import metrics
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def setup(self):
+        super().setup()
+        if self.request.family in (socket.AF_INET, socket.AF_INET6):
+            self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def handle(self):
+        for raw in self.rfile:
+            line = raw.decode(errors="replace").strip()
+            if not line:
+                continue
+            reply = self.server.control.dispatch(line)
+            self.wfile.write(json.dumps(reply, separators=(",", ":"), default=str).encode() + b"\n")
+
+
+class _TCPServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads      = True
+
+
+if hasattr(socketserver, "ThreadingUnixStreamServer"):
+    class _UnixServer(socketserver.ThreadingUnixStreamServer):
+        daemon_threads = True
+else:  # Windows: TCP only
+    _UnixServer = None
+
+
+class ControlServer:
+    """Serves `commands` on a Unix socket and/or a localhost TCP port."""
+
+    def __init__(self, commands: dict[str, Callable[[str], dict]], unix_path: str = "",
+                 port: int = 0, host: str = "127.0.0.1"):
+        self.commands  = commands
+        self.unix_path = unix_path
+        self.port      = port
+        self.host      = host
+        self._servers: list[socketserver.BaseServer] = []
+        self._bound: tuple[int, int] | None = None  # (st_dev, st_ino) of our socket file
+
+    def start(self):
+        if self.unix_path:
+            if _UnixServer is None:
+                raise RuntimeError("Unix sockets are not supported on this platform; "
+                                   "use CONTROL_PORT")
+            self._remove_stale_socket()
+            server = _UnixServer(self.unix_path, _Handler)
+            st = os.stat(self.unix_path)
+            self._bound = (st.st_dev, st.st_ino)
+            self._serve(server, f"unix:{self.unix_path}")
+        if self.port:
+            server = _TCPServer((self.host, self.port), _Handler)
+            self.port = server.server_address[1]
+            self._serve(server, f"tcp://{self.host}:{self.port}")
+
+    def _remove_stale_socket(self):
+        """Unlink a socket left by an unclean exit; refuse a live one or a non-socket."""
+        try:
+            st = os.stat(self.unix_path)
+        except FileNotFoundError:
+            return
+        if not stat.S_ISSOCK(st.st_mode):
+            raise RuntimeError(f"CONTROL_SOCKET {self.unix_path} exists and is not a socket")
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(self.unix_path)
+        except ConnectionRefusedError:
+            os.unlink(self.unix_path)
+            print(f"[Control] Removed stale socket {self.unix_path}")
+            return
+        finally:
+            probe.close()
+        raise RuntimeError(f"CONTROL_SOCKET {self.unix_path} is in use by another process")
+
+    def _serve(self, server: socketserver.BaseServer, label: str):
+        server.control = self
+        threading.Thread(target=server.serve_forever, daemon=True,
+                         name=f"control-{label}").start()
+        self._servers.append(server)
+        print(f"[Control] Listening on {label} (commands: {', '.join(sorted(self.commands))})")
+
+    def dispatch(self, line: str) -> dict:
+        started = time.perf_counter()
+        name, _, arg = line.partition(" ")
+        func = self.commands.get(name.lower())
+        if func is None:
+            reply = {"ok": False, "error": f"unknown command '{name}'",
+                     "commands": sorted(self.commands)}
+        else:
+            try:
+                reply = func(arg.strip())
+            except Exception as e:
+                reply = {"ok": False, "error": str(e)}
+        label = name.lower() if func else "unknown"
+        metrics.observe("control_seconds", time.perf_counter() - started, {"command": label},
+                        help="Control endpoint command handling time")
+        return reply
+
+    def stop(self):
+        for server in self._servers:
+            server.shutdown()
+            server.server_close()
+        self._servers.clear()
+        if self._bound:
+            # Only our own socket: another instance may have replaced it since
+            try:
+                st = os.stat(self.unix_path)
+                if (st.st_dev, st.st_ino) == self._bound:
+                    os.unlink(self.unix_path)
+            except FileNotFoundError:
+                pass
+            self._bound = None
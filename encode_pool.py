@@ -0,0 +1,130 @@
+"""
+Encode worker processes fed through shared memory.
+
+Pillow and OpenCV encoders hold the GIL for much of an encode, so encode
+threads in one process mostly take turns on one core. EncodePool runs the
+encodes in `processes` worker processes instead. Each frame is copied once
+into a free multiprocessing.shared_memory slot. Only the slot name, shape
+and the (preprocess, encoder) recipes are pickled. Workers map the slot as
+an ndarray and return the encoded bytes.
+
+Slots are sized from the first frame and grow if a larger one arrives.
+A grown slot is a new segment under a new name. Every job lists the live
+slot names, and workers close their mappings of any other slot. The
+number of slots bounds how many frames can wait for a worker, and callers
+block on a free slot (backpressure, like the pipeline queues).
+"""
+import multiprocessing
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from metrics import metrics
+
+# Worker-side cache of attached slots (name → SharedMemory), per process
+_attached: dict[str, shared_memory.SharedMemory] = {}
+
+
+def _encode_job(slot: str, shape: tuple, dtype: str, pixel_format: str, jobs: list,
+                live: tuple = ()) -> list[bytes]:
+    """Runs in a worker: encode one shared-memory frame with each (preprocess, encoder)."""
+    for name in [name for name in _attached if name not in live and name != slot]:
+        _attached.pop(name).close()  # slot was resized or freed: drop the old mapping
+    shm = _attached.get(slot)
+    if shm is None:
+        shm = _attached[slot] = shared_memory.SharedMemory(name=slot)
+    array = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+    out = []
+    for preprocess, encoder in jobs:
+        data, fmt = (array, pixel_format) if preprocess is None else preprocess.apply(array, pixel_format)
+        out.append(encoder.encode(data, fmt))
+    return out
+
+
+def _warm_up() -> bool:
+    import encoders  # noqa: F401  (pay the Pillow/OpenCV import before the first part)
+    return True
+
+
+class _Slot:
+    def __init__(self, size: int):
+        self.shm  = shared_memory.SharedMemory(create=True, size=max(1, size))
+        self.size = size
+
+    def view(self, shape: tuple, dtype) -> np.ndarray:
+        return np.ndarray(shape, dtype=dtype, buffer=self.shm.buf)
+
+    def free(self):
+        self.shm.close()
+        self.shm.unlink()
+
+
+class EncodePool:
+    """
+    encode(array, pixel_format, jobs) → [bytes, ...], run in a worker process.
+
+    `jobs` is a list of (Preprocess | None, Encoder) pairs; both must be
+    picklable (the ones in preprocess.py and encoders.py are). Thread-safe:
+    call it from as many encode threads as there are processes.
+    """
+
+    def __init__(self, processes: int = 2, slots: int | None = None):
+        self.processes = max(1, processes)
+        self.slots     = slots or self.processes * 2
+        self._free: queue.Queue[_Slot | None] = queue.Queue()
+        self._all: list[_Slot] = []
+        self._lock = threading.Lock()
+        self._executor: ProcessPoolExecutor | None = None
+
+    def start(self):
+        if self._executor is not None:
+            return
+        # spawn: forking a process full of camera/Modbus threads is unsafe
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.processes, mp_context=multiprocessing.get_context("spawn"))
+        for future in [self._executor.submit(_warm_up) for _ in range(self.processes)]:
+            future.result()
+        for _ in range(self.slots):
+            self._free.put(None)  # placeholder, allocated on first use
+        print(f"[Encode] {self.processes} encode processes, {self.slots} shared-memory slots")
+
+    def encode(self, array: np.ndarray, pixel_format: str, jobs: list) -> list[bytes]:
+        if self._executor is None:
+            raise RuntimeError("EncodePool not started")
+        waited = self._free.empty()
+        slot = self._free.get()
+        if waited:
+            metrics.inc("encode_slot_waits", help="Encodes that waited for a free shared-memory slot")
+        try:
+            slot = self._fit(slot, array.nbytes)
+            slot.view(array.shape, array.dtype)[...] = array  # the one copy per frame
+            with self._lock:
+                live = tuple(s.shm.name for s in self._all)
+            future = self._executor.submit(_encode_job, slot.shm.name, array.shape,
+                                           array.dtype.str, pixel_format, jobs, live)
+            return future.result()
+        finally:
+            self._free.put(slot)
+
+    def _fit(self, slot: _Slot | None, nbytes: int) -> _Slot:
+        if slot is not None and slot.size >= nbytes:
+            return slot
+        with self._lock:
+            if slot is not None:
+                self._all.remove(slot)
+                slot.free()
+            slot = _Slot(nbytes)
+            self._all.append(slot)
+        return slot
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        with self._lock:
+            for slot in self._all:
+                slot.free()
+            self._all.clear()
@@ -0,0 +1,209 @@
+"""
+Image encoder backends.
+
+An encoder spec is "<backend>[:<param>]", e.g.:
+
+    pil-webp        Pillow lossless WebP (method 4, the historical default)
+    pil-webp:0      Pillow lossless WebP, fastest method (0..6, higher = smaller/slower)
+    cv2-webp:90     OpenCV WebP, quality 1..100 (101 = lossless)
+    cv2-jpeg:95     OpenCV JPEG, quality 0..100
+    cv2-png:1       OpenCV PNG, compression level 0..9
+    png:1           Pillow PNG, compression level 0..9
+    raw             Uncompressed PPM/PGM (header + pixel bytes, no encode cost)
+
+Run `python encoders.py --mp 20` to benchmark every backend on a frame of
+that size and print ms/frame and bytes/frame.
+"""
+import argparse
+import io
+import time
+
+import numpy as np
+from PIL import Image
+
+
+class Encoder:
+    """Encodes an HxW (mono) or HxWx3 uint8 array into file bytes."""
+
+    name      = "base"
+    extension = "bin"
+    mime      = "application/octet-stream"
+
+    def encode(self, array: np.ndarray, pixel_format: str = "RGB8") -> bytes:
+        raise NotImplementedError
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.name})"
+
+
+def _to_pil(array: np.ndarray, pixel_format: str) -> Image.Image:
+    if array.ndim == 2:
+        return Image.fromarray(array, mode="L")
+    if pixel_format == "BGR8":
+        array = array[..., ::-1]
+    return Image.fromarray(np.ascontiguousarray(array), mode="RGB")
+
+
+def _to_cv2(array: np.ndarray, pixel_format: str) -> np.ndarray:
+    if array.ndim == 2 or pixel_format == "BGR8":
+        return array
+    import cv2
+    return cv2.cvtColor(array, cv2.COLOR_RGB2BGR)
+
+
+class PilWebpEncoder(Encoder):
+    extension = "webp"
+    mime      = "image/webp"
+
+    def __init__(self, method: int = 4, quality: int = 100, lossless: bool = True):
+        self.method   = method
+        self.quality  = quality
+        self.lossless = lossless
+        self.name     = f"pil-webp:{method}"
+
+    def encode(self, array, pixel_format="RGB8"):
+        buffer = io.BytesIO()
+        _to_pil(array, pixel_format).save(
+            buffer, format="WEBP", quality=self.quality,
+            lossless=self.lossless, method=self.method,
+        )
+        return buffer.getvalue()
+
+
+class PilPngEncoder(Encoder):
+    extension = "png"
+    mime      = "image/png"
+
+    def __init__(self, level: int = 6):
+        self.level = level
+        self.name  = f"png:{level}"
+
+    def encode(self, array, pixel_format="RGB8"):
+        buffer = io.BytesIO()
+        _to_pil(array, pixel_format).save(buffer, format="PNG", compress_level=self.level)
+        return buffer.getvalue()
+
+
+class Cv2Encoder(Encoder):
+    """cv2.imencode straight from the numpy array (no PIL round trip)."""
+
+    _FORMATS = {
+        "webp": (".webp", "image/webp", "IMWRITE_WEBP_QUALITY", 101),
+        "jpeg": (".jpg",  "image/jpeg", "IMWRITE_JPEG_QUALITY", 95),
+        "png":  (".png",  "image/png",  "IMWRITE_PNG_COMPRESSION", 1),
+    }
+
+    def __init__(self, fmt: str, param: int | None = None):
+        import cv2
+        if fmt not in self._FORMATS:
+            raise ValueError(f"Unsupported cv2 format '{fmt}'. Available: {sorted(self._FORMATS)}")
+        ext, mime, flag, default = self._FORMATS[fmt]
+        self._ext      = ext
+        self.extension = ext.lstrip(".")
+        self.mime      = mime
+        self.param     = default if param is None else param
+        self._params   = [getattr(cv2, flag), self.param]
+        self.name      = f"cv2-{fmt}:{self.param}"
+
+    def encode(self, array, pixel_format="RGB8"):
+        import cv2
+        ok, buf = cv2.imencode(self._ext, _to_cv2(array, pixel_format), self._params)
+        if not ok:
+            raise RuntimeError(f"cv2.imencode failed for {self.name}")
+        return buf.tobytes()
+
+
+class RawEncoder(Encoder):
+    """Binary PPM (RGB) / PGM (mono): a tiny header in front of the pixels."""
+
+    name      = "raw"
+    extension = "ppm"
+    mime      = "image/x-portable-anymap"
+
+    def encode(self, array, pixel_format="RGB8"):
+        if array.ndim == 2:
+            magic = b"P5"
+        else:
+            magic = b"P6"
+            if pixel_format == "BGR8":
+                array = array[..., ::-1]
+        h, w = array.shape[:2]
+        header = magic + f"\n{w} {h}\n255\n".encode()
+        return header + np.ascontiguousarray(array).tobytes()
+
+
+def build_encoder(spec: str) -> Encoder:
+    """Create an encoder from a spec string like 'cv2-jpeg:95' (see module docstring)."""
+    backend, _, param = spec.strip().lower().partition(":")
+    value = int(param) if param else None
+
+    if backend == "pil-webp":
+        return PilWebpEncoder(method=4 if value is None else value)
+    if backend == "png":
+        return PilPngEncoder(level=6 if value is None else value)
+    if backend.startswith("cv2-"):
+        return Cv2Encoder(backend[4:], value)
+    if backend == "raw":
+        return RawEncoder()
+    raise ValueError(f"Unknown encoder '{spec}'")
+
+
+BENCHMARK_SPECS = [
+    "pil-webp:0", "pil-webp:4", "pil-webp:6",
+    "cv2-webp:101", "cv2-webp:90",
+    "cv2-jpeg:95", "cv2-jpeg:80",
+    "cv2-png:0", "cv2-png:1", "cv2-png:3",
+    "png:1", "png:6",
+    "raw",
+]
+
+
+def benchmark(array: np.ndarray, specs: list[str], frames: int = 3,
+              pixel_format: str = "RGB8") -> list[tuple[str, float, int]]:
+    """Encode `array` `frames` times with each spec; returns (spec, ms/frame, bytes/frame)."""
+    results = []
+    for spec in specs:
+        try:
+            encoder = build_encoder(spec)
+        except Exception as e:
+            print(f"  {spec:<14} unavailable: {e}")
+            continue
+        encoder.encode(array, pixel_format)  # warm-up
+        t = time.perf_counter()
+        for _ in range(frames):
+            data = encoder.encode(array, pixel_format)
+        ms = (time.perf_counter() - t) * 1000 / frames
+        results.append((encoder.name, ms, len(data)))
+    return results
+
+
+def main():
+    from source_baumer import MEGA_PIXEL_RESOLUTIONS
+    from source_synthetic import synthetic_frame
+
+    parser = argparse.ArgumentParser(description="Benchmark image encoder backends")
+    parser.add_argument("--mp", type=int, default=20, choices=sorted(MEGA_PIXEL_RESOLUTIONS),
+                        help="Synthetic frame size in megapixels (Baumer resolutions)")
+    parser.add_argument("--image", help="Benchmark on this image file instead of a synthetic frame")
+    parser.add_argument("--mono", action="store_true", help="Use a single-channel frame")
+    parser.add_argument("--frames", type=int, default=3, help="Encodes per backend")
+    parser.add_argument("--specs", nargs="*", default=BENCHMARK_SPECS, help="Encoder specs to run")
+    args = parser.parse_args()
+
+    if args.image:
+        img = Image.open(args.image)
+        array = np.asarray(img.convert("L" if args.mono else "RGB"))
+    else:
+        width, height = MEGA_PIXEL_RESOLUTIONS[args.mp]
+        array = synthetic_frame(width, height, mono=args.mono)
+
+    h, w = array.shape[:2]
+    print(f"Frame: {w}x{h} {'Mono8' if array.ndim == 2 else 'RGB8'} "
+          f"({array.nbytes / 1e6:.1f} MB raw), {args.frames} frame(s) per backend\n")
+    print(f"  {'encoder':<14} {'ms/frame':>10} {'bytes/frame':>14} {'ratio':>7}")
+    for name, ms, size in benchmark(array, args.specs, args.frames):
+        print(f"  {name:<14} {ms:>10.1f} {size:>14,} {array.nbytes / size:>6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
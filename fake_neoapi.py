@@ -0,0 +1,322 @@
+"""
+Minimal stand-in for the Baumer NeoAPI (`neoapi`) used by source_baumer.
+
+Covers the subset BaumerSource touches — CamInfoList, Cam.Connect/GetImage,
+feature access through `cam.f.<Name>` and Image.Convert/GetNPArray — and
+simulates the timing that matters for acquisition modes: stream start-up
+cost, exposure time, frame rate, software and hardware (line) triggers.
+
+Enable with BAUMER_FAKE=true, or use directly in scripts:
+
+    import fake_neoapi
+    cam = fake_neoapi.Cam()
+    cam.Connect()
+    cam.f.TriggerMode.SetString("On")
+"""
+import collections
+import threading
+import time
+
+import numpy as np
+
+# Simulated timings (seconds)
+STREAM_START_DELAY = 0.060   # AcquisitionStart → stream running
+STREAM_STOP_DELAY  = 0.010
+TRANSFER_TIME      = 0.005   # readout + transfer per frame
+DEFAULT_MODEL      = "VCXG-201C.R"
+DEFAULT_SERIAL     = "700000000001"
+
+
+class Feature:
+    def __init__(self, cam, name, value=None):
+        self._cam  = cam
+        self.name  = name
+        self.value = value
+
+    def IsAvailable(self):
+        return True
+
+    def Set(self, value):
+        self.value = value
+        self._cam._on_feature_set(self.name, value)
+        return self
+
+    SetString = Set
+    SetInt    = Set
+    SetDouble = Set
+
+    def Get(self):
+        return self.value
+
+    GetCurrent = Get
+    GetString  = Get
+    GetInt     = Get
+    GetDouble  = Get
+
+    def Execute(self):
+        self._cam._on_command(self.name)
+
+
+class _FeatureAccess:
+    _DEFAULTS = {
+        "DeviceModelName": DEFAULT_MODEL,
+        "DeviceSerialNumber": DEFAULT_SERIAL,
+        "Width": 2976,
+        "Height": 2000,
+        "OffsetX": 0,
+        "OffsetY": 0,
+        "PixelFormat": "BayerRG8",
+        "ExposureTime": 5000.0,   # µs
+        "Gain": 0.0,
+        "TargetBrightness": 50,
+        "AcquisitionMode": "Continuous",
+        "AcquisitionFrameRate": 30.0,
+        "TriggerMode": "Off",
+        "TriggerSource": "Software",
+        "TriggerActivation": "RisingEdge",
+    }
+
+    def __init__(self, cam):
+        object.__setattr__(self, "_cam", cam)
+        object.__setattr__(self, "_features", {})
+
+    def __getattr__(self, name):
+        features = self._features
+        if name not in features:
+            features[name] = Feature(self._cam, name, self._DEFAULTS.get(name))
+        return features[name]
+
+
+class Image:
+    def __init__(self, data: np.ndarray | None = None, pixel_format: str = "",
+                 image_id: int = 0, timestamp_ns: int = 0):
+        self._data         = data
+        self._pixel_format = pixel_format
+        self._image_id     = image_id
+        self._timestamp_ns = timestamp_ns
+
+    def IsEmpty(self):
+        return self._data is None
+
+    def GetNPArray(self):
+        return self._data
+
+    def GetPixelFormat(self):
+        return self._pixel_format
+
+    def GetImageID(self):
+        return self._image_id
+
+    def GetTimestamp(self):
+        return self._timestamp_ns
+
+    def GetWidth(self):
+        return 0 if self._data is None else self._data.shape[1]
+
+    def GetHeight(self):
+        return 0 if self._data is None else self._data.shape[0]
+
+    def Convert(self, pixel_format: str) -> "Image":
+        if self._data is None or pixel_format == self._pixel_format:
+            return self
+        import cv2
+        src, data = self._pixel_format, self._data
+        if src.startswith("Bayer"):
+            data = cv2.cvtColor(data, _bayer_code(src))
+            src  = "RGB8"
+        if src == "Mono8" and pixel_format in ("RGB8", "BGR8"):
+            data = cv2.cvtColor(data, cv2.COLOR_GRAY2RGB)
+        elif src in ("RGB8", "BGR8") and pixel_format == "Mono8":
+            data = cv2.cvtColor(data, cv2.COLOR_RGB2GRAY if src == "RGB8" else cv2.COLOR_BGR2GRAY)
+        elif {src, pixel_format} == {"RGB8", "BGR8"}:
+            data = data[..., ::-1].copy()
+        return Image(data, pixel_format, self._image_id, self._timestamp_ns)
+
+
+def _bayer_code(pixel_format: str) -> int:
+    import cv2
+    # OpenCV names Bayer patterns by the 2x2 block starting at the second row/column
+    return {
+        "BayerRG8": cv2.COLOR_BayerBG2RGB,
+        "BayerGR8": cv2.COLOR_BayerGB2RGB,
+        "BayerGB8": cv2.COLOR_BayerGR2RGB,
+        "BayerBG8": cv2.COLOR_BayerRG2RGB,
+    }[pixel_format]
+
+
+class CamInfo:
+    def __init__(self, model=DEFAULT_MODEL, serial=DEFAULT_SERIAL):
+        self._model  = model
+        self._serial = serial
+
+    def GetModelName(self):
+        return self._model
+
+    def GetSerialNumber(self):
+        return self._serial
+
+    def IsConnectable(self):
+        return True
+
+
+class CamInfoList:
+    _instance = None
+    cameras   = [CamInfo()]
+
+    @classmethod
+    def Get(cls):
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def Refresh(self):
+        return True
+
+    def __iter__(self):
+        return iter(self.cameras)
+
+
+class Cam:
+    """Simulated camera. Frames are a moving gradient stamped with the frame id."""
+
+    def __init__(self):
+        self.f          = _FeatureAccess(self)
+        self._connected = False
+        self._streaming = False
+        self._buffer_count = 10
+        self._images    = collections.deque()
+        self._cond      = threading.Condition()
+        self._pending_triggers = 0
+        self._image_id  = 0
+        self._thread: threading.Thread | None = None
+        self._base: np.ndarray | None = None
+
+    # ── Connection ────────────────────────────────────────────────────────────
+
+    def Connect(self, identifier: str = ""):
+        for info in CamInfoList.Get():
+            if not identifier or identifier in (info.GetModelName(), info.GetSerialNumber()):
+                self.f.DeviceModelName.value    = info.GetModelName()
+                self.f.DeviceSerialNumber.value = info.GetSerialNumber()
+                self._connected = True
+                return self
+        raise RuntimeError(f"fake_neoapi: no camera matching '{identifier}'")
+
+    def IsConnected(self):
+        return self._connected
+
+    def Disconnect(self):
+        self._stop_stream()
+        self._connected = False
+
+    def SetImageBufferCount(self, count: int):
+        self._buffer_count = max(1, int(count))
+        return self
+
+    def SetImageBufferCycleCount(self, count: int):
+        return self
+
+    # ── Hardware trigger line (for tests) ─────────────────────────────────────
+
+    def FireLine(self):
+        """Simulate a pulse on the hardware trigger input."""
+        if self.f.TriggerMode.value == "On" and self.f.TriggerSource.value.startswith("Line"):
+            self._trigger()
+
+    # ── Acquisition ───────────────────────────────────────────────────────────
+
+    def GetImage(self, timeout: int = 400) -> Image:
+        """Return the oldest buffered image, waiting up to `timeout` ms."""
+        if not self._connected:
+            raise RuntimeError("fake_neoapi: camera not connected")
+        deadline = time.monotonic() + timeout / 1000
+        with self._cond:
+            while not self._images:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self._streaming:
+                    return Image()
+                self._cond.wait(remaining)
+            return self._images.popleft()
+
+    def _on_command(self, name):
+        if name == "AcquisitionStart":
+            self._start_stream()
+        elif name == "AcquisitionStop":
+            self._stop_stream()
+        elif name == "TriggerSoftware":
+            if self.f.TriggerMode.value == "On" and self.f.TriggerSource.value == "Software":
+                self._trigger()
+
+    def _on_feature_set(self, name, value):
+        if name in ("Width", "Height", "PixelFormat"):
+            self._base = None
+
+    def _start_stream(self):
+        if self._streaming:
+            return
+        time.sleep(STREAM_START_DELAY)
+        self._streaming = True
+        self._thread = threading.Thread(target=self._sensor_loop, daemon=True)
+        self._thread.start()
+
+    def _stop_stream(self):
+        if not self._streaming:
+            return
+        with self._cond:
+            self._streaming = False
+            self._cond.notify_all()
+        if self._thread:
+            self._thread.join(timeout=1)
+            self._thread = None
+        with self._cond:
+            self._images.clear()
+        time.sleep(STREAM_STOP_DELAY)
+
+    def _trigger(self):
+        with self._cond:
+            self._pending_triggers += 1
+            self._cond.notify_all()
+
+    def _sensor_loop(self):
+        while self._streaming:
+            triggered = self.f.TriggerMode.value == "On"
+            if triggered:
+                with self._cond:
+                    while self._streaming and not self._pending_triggers:
+                        self._cond.wait(0.1)
+                    if not self._streaming:
+                        return
+                    self._pending_triggers -= 1
+                time.sleep(self.f.ExposureTime.value / 1e6 + TRANSFER_TIME)
+            else:
+                period = max(1.0 / float(self.f.AcquisitionFrameRate.value),
+                             self.f.ExposureTime.value / 1e6 + TRANSFER_TIME)
+                time.sleep(period)
+            self._emit()
+
+    def _emit(self):
+        self._image_id += 1
+        image = Image(self._render(self._image_id), self.f.PixelFormat.value,
+                      self._image_id, time.monotonic_ns())
+        with self._cond:
+            self._images.append(image)
+            while len(self._images) > self._buffer_count:
+                self._images.popleft()  # oldest buffer is recycled
+            self._cond.notify_all()
+
+    def _render(self, image_id: int) -> np.ndarray:
+        width, height = int(self.f.Width.value), int(self.f.Height.value)
+        fmt = self.f.PixelFormat.value
+        if self._base is None:
+            x = np.linspace(0, 255, width, dtype=np.uint8)[None, :]
+            y = np.linspace(0, 255, height, dtype=np.uint8)[:, None]
+            gray = (x // 2 + y // 2).astype(np.uint8)
+            if fmt in ("RGB8", "BGR8"):
+                self._base = np.stack([gray, gray[::-1], 255 - gray], axis=-1)
+            else:  # Mono8 and raw Bayer are single-plane
+                self._base = gray
+        frame = np.roll(self._base, image_id * 8, axis=1)
+        # Stamp the frame id into the first row so tests can tell frames apart
+        stamp = np.frombuffer(image_id.to_bytes(8, "little"), dtype=np.uint8)
+        frame[0, :8] = stamp[:, None] if frame.ndim == 3 else stamp
+        return frame
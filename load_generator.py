@@ -0,0 +1,200 @@
+"""
+Software trigger generator for load tests.
+
+TriggerGenerator calls fire() on a schedule, from its own thread:
+
+  fixed     `rate` triggers per second, evenly spaced
+  poisson   `rate` triggers per second on average, exponentially
+            distributed gaps (bursts and lulls, like a real line)
+  original  the replay source's own timeline (source_replay.py), sped up
+            by `speed`
+
+Trigger times are absolute offsets from the start, so a late trigger does
+not shift all the later ones. fire() returns the submitted Part, or None
+when the pipeline refused it because its queue was full. That refusal is
+the backpressure signal. Every `report_every` seconds, and once at the
+end, a line reports the target rate and what was achieved:
+
+    [Load] 30s: fired 300 (10.0/s, target 10.0/s), done 296 (9.9/s), failed 0,
+           dropped 2 (pipeline full), in flight 2, lag p99 1.4 ms
+"""
+import collections
+import random
+import threading
+import time
+from typing import Callable
+
+from metrics import metrics
+
+MODES = ("fixed", "poisson", "original")
+
+
+class TriggerGenerator:
+    def __init__(self, fire: Callable[[], object], mode: str = "fixed", rate: float = 5.0,
+                 timeline: list[float] | None = None, count: int = 0, duration: float = 0.0,
+                 speed: float = 1.0, report_every: float = 5.0, name: str = "",
+                 on_finished: Callable[[], None] | None = None):
+        if mode not in MODES:
+            raise ValueError(f"Unknown load mode '{mode}'. Choose from {MODES}")
+        if mode == "original" and not timeline:
+            raise ValueError("LOAD_MODE=original needs a source with a timeline (SOURCE_TYPE=replay)")
+        if mode != "original" and rate <= 0:
+            raise ValueError(f"Load rate must be positive, got {rate}")
+        self.fire         = fire
+        self.mode         = mode
+        self.rate         = rate
+        self.timeline     = timeline or []
+        self.count        = count
+        self.duration     = duration
+        self.speed        = speed
+        self.report_every = report_every
+        self.name         = name
+        self.on_finished  = on_finished
+
+        self.fired   = 0
+        self.dropped = 0
+        self.errors  = 0  # fire() raised
+        self.done    = 0
+        self.failed  = 0  # finished with part.error
+        self._inflight: collections.deque = collections.deque()
+        self._lags     = collections.deque(maxlen=10_000)
+        self._started  = 0.0
+        self._last_fire = 0.0
+        self._stop     = threading.Event()
+        self._finished = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    @property
+    def target_rate(self) -> float:
+        if self.mode != "original":
+            return self.rate
+        span = self.timeline[-1] - self.timeline[0]
+        return (len(self.timeline) - 1) / span * self.speed if span > 0 else 0.0
+
+    def _offsets(self):
+        """Seconds from the start to each trigger."""
+        if self.mode == "original":
+            first = self.timeline[0]
+            for t in self.timeline:
+                yield (t - first) / self.speed
+            return
+        offset = 0.0
+        while True:
+            yield offset
+            offset += (random.expovariate(self.rate) if self.mode == "poisson"
+                       else 1.0 / self.rate)
+
+    # ── Thread ────────────────────────────────────────────────────────────────
+
+    def start(self):
+        where = f" [{self.name}]" if self.name else ""
+        limit = f", {self.count} triggers" if self.count else ""
+        limit += f", {self.duration:g} s" if self.duration else ""
+        print(f"[Load]{where} {self.mode} triggers at {self.target_rate:.1f}/s{limit}")
+        self._thread = threading.Thread(target=self._run, daemon=True,
+                                        name=f"load-{self.name or 'default'}")
+        self._thread.start()
+
+    def _run(self):
+        self._started = time.monotonic()
+        next_report   = self._started + self.report_every
+        for i, offset in enumerate(self._offsets()):
+            if (self.count and i >= self.count) or (self.duration and offset > self.duration):
+                break
+            at = self._started + offset
+            while not self._stop.is_set():
+                now = time.monotonic()
+                if now >= next_report:
+                    self.report()
+                    next_report += self.report_every
+                if now >= at:
+                    break
+                self._stop.wait(min(at, next_report) - now)
+            if self._stop.is_set():
+                break
+            self._lags.append(time.monotonic() - at)
+            self._trigger()
+
+        self._wait_inflight(timeout=30.0)
+        self.report(final=True)
+        self._finished.set()
+        if self.on_finished and not self._stop.is_set():
+            self.on_finished()
+
+    def _trigger(self):
+        self.fired += 1
+        self._last_fire = time.monotonic()
+        try:
+            part = self.fire()
+        except Exception as e:
+            self.errors += 1
+            print(f"[Load] Trigger failed: {e}")
+            return
+        if part is None:
+            self.dropped += 1
+            outcome = "dropped"
+        else:
+            self._inflight.append(part)
+            outcome = "accepted"
+        metrics.inc("load_triggers", {"outcome": outcome},
+                    help="Load generator triggers by pipeline admission")
+
+    def _collect(self):
+        """Move finished parts out of the in-flight list."""
+        still = collections.deque()
+        for part in self._inflight:
+            if part.done.is_set():
+                self.done += 1
+                self.failed += part.error is not None
+            else:
+                still.append(part)
+        self._inflight = still
+
+    def _wait_inflight(self, timeout: float):
+        deadline = time.monotonic() + timeout
+        for part in list(self._inflight):
+            part.done.wait(max(0.0, deadline - time.monotonic()))
+        self._collect()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=35)
+            self._thread = None
+
+    def wait(self, timeout: float | None = None) -> bool:
+        return self._finished.wait(timeout)
+
+    # ── Reporting ─────────────────────────────────────────────────────────────
+
+    def stats(self) -> dict:
+        self._collect()
+        elapsed = max(time.monotonic() - self._started, 1e-9) if self._started else 0.0
+        # Over the firing window only, so the final drain does not dilute it
+        firing  = (self._last_fire - self._started) * self.fired / max(self.fired - 1, 1)
+        lags = sorted(self._lags)
+        return {
+            "mode": self.mode,
+            "elapsed": round(elapsed, 3),
+            "target_rate": round(self.target_rate, 3),
+            "fired": self.fired,
+            "fired_rate": round(self.fired / firing, 3) if firing > 0 else 0.0,
+            "done": self.done,
+            "done_rate": round(self.done / elapsed, 3) if elapsed else 0.0,
+            "failed": self.failed,
+            "dropped": self.dropped,
+            "errors": self.errors,
+            "in_flight": len(self._inflight),
+            "lag_p99": lags[int(0.99 * (len(lags) - 1))] if lags else 0.0,
+        }
+
+    def report(self, final: bool = False):
+        s = self.stats()
+        where = f" [{self.name}]" if self.name else ""
+        print(f"[Load]{where} {'finished after ' if final else ''}{s['elapsed']:.0f}s: "
+              f"fired {s['fired']} ({s['fired_rate']:.1f}/s, target {s['target_rate']:.1f}/s), "
+              f"done {s['done']} ({s['done_rate']:.1f}/s), failed {s['failed']}, "
+              f"dropped {s['dropped']} (pipeline full), in flight {s['in_flight']}, "
+              f"lag p99 {s['lag_p99'] * 1000:.1f} ms")
+        if final:
+            metrics.event("load", name=self.name, **s)
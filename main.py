@@ -1,9 +1,28 @@
+import asyncio
+import concurrent.futures
+import functools
+import itertools
 import os
-import io
+import signal
+import sys
 import time
 import threading
-import requests
+import uuid
 from dotenv import load_dotenv
+from archive_writer import ArchiveWriter
+from burst import Burst, parse_roi
+from catalog import STAGES, CaptureCatalog, CaptureIds, capture_stamp, shard_dir
+from control import ControlServer
+from dedupe import FrameDeduper
+from encode_pool import EncodePool
+from encoders import build_encoder
+from metrics import metrics
+from preprocess import Preprocess, build_preprocess
+from source_supervisor import SupervisedSource
+from pipeline import AsyncPipeline, Part, Pipeline, Stage
+from stations import Station, load_stations
+from upload_client import AsyncUploadClient, UploadClient, UploadError
+from upload_spool import UploadSpool
 
 load_dotenv()
 
@@ -19,11 +38,66 @@ SESSION_NAME     = os.getenv("SESSION_NAME")
 ARTICLE_NAME     = os.getenv("ARTICLE_NAME")
 NEXT_ARTICLE     = os.getenv("NEXT_ARTICLE", "false")
 
+# --- Encoding ---
+# See encoders.py for specs; the archive copy can use a different (e.g. faster) encoder
+UPLOAD_ENCODER  = os.getenv("UPLOAD_ENCODER", "pil-webp")
+ARCHIVE_ENCODER = os.getenv("ARCHIVE_ENCODER", UPLOAD_ENCODER)
+
+# --- Preprocess (software crop / downscale / grayscale, see preprocess.py) ---
+# Defaults for every source; stations can override them in config.json
+UPLOAD_PREPROCESS  = os.getenv("UPLOAD_PREPROCESS", "")
+ARCHIVE_PREPROCESS = os.getenv("ARCHIVE_PREPROCESS", UPLOAD_PREPROCESS)
+
+# --- Burst capture (several frames per trigger, sharpest wins, see burst.py) ---
+BURST_FRAMES     = int(os.getenv("BURST_FRAMES", "1"))  # 1 = single frame
+BURST_BUDGET_MS  = float(os.getenv("BURST_BUDGET_MS", "250"))
+BURST_ROI        = os.getenv("BURST_ROI", "")  # x,y,width,height scored; empty = full frame
+BURST_SCORE_STEP = int(os.getenv("BURST_SCORE_STEP", "2"))
+BURST_UPLOAD     = os.getenv("BURST_UPLOAD", "best").lower()  # best | all (one request)
+
+# --- Duplicate / static frame suppression (perceptual hash, see dedupe.py) ---
+DEDUPE_ACTION   = os.getenv("DEDUPE_ACTION", "off").lower()  # off | tag | skip | cache
+DEDUPE_DISTANCE = int(os.getenv("DEDUPE_DISTANCE", "4"))  # max differing bits of 64
+DEDUPE_WINDOW_S = float(os.getenv("DEDUPE_WINDOW_S", "5"))
+DEDUPE_HISTORY  = int(os.getenv("DEDUPE_HISTORY", "8"))
+
+# --- Upload client ---
+UPLOAD_POOL_SIZE = int(os.getenv("UPLOAD_POOL_SIZE", "4"))
+UPLOAD_TIMEOUT   = float(os.getenv("UPLOAD_TIMEOUT", "30"))
+
+# --- Upload spool (store-and-forward while the API is unreachable) ---
+SPOOL_PATH        = os.getenv("SPOOL_PATH", "./spool")
+SPOOL_CONCURRENCY = int(os.getenv("SPOOL_CONCURRENCY", "2"))
+SPOOL_MAX_BACKOFF = float(os.getenv("SPOOL_MAX_BACKOFF", "300"))
+
 # --- Image source ---
 IMAGES_SAVE_PATH = os.getenv("IMAGES_SAVE_PATH", "./images")
-SOURCE_TYPE      = os.getenv("SOURCE_TYPE", "baumer").lower()  # baumer | rtsp | webcam
+SOURCE_TYPE      = os.getenv("SOURCE_TYPE", "baumer").lower()  # baumer | rtsp | webcam | replay
 RTSP_URL         = os.getenv("RTSP_URL")
+RTSP_BACKEND     = os.getenv("RTSP_BACKEND", "opencv").lower()  # opencv | ffmpeg
+FFMPEG_PATH      = os.getenv("FFMPEG_PATH", "ffmpeg")
 WEBCAM_ID        = os.getenv("WEBCAM_ID", "0")  # integer index or device name substring
+WEBCAM_INDEX_PATH = os.getenv("WEBCAM_INDEX_PATH", "./webcam_index.json")  # empty = no cache
+REPLAY_PATH      = os.getenv("REPLAY_PATH", "")  # image directory or video file (required)
+REPLAY_LOOP      = os.getenv("REPLAY_LOOP", "false").lower() == "true"
+REPLAY_PREFETCH  = int(os.getenv("REPLAY_PREFETCH", "8"))  # decoded frames buffered ahead
+REPLAY_OUTPUT    = os.getenv("REPLAY_OUTPUT_PATH", "./replay_output")  # archive/catalog/spool of a replay run
+
+# --- Source health (background reconnect, see source_supervisor.py) ---
+SOURCE_SUPERVISE   = os.getenv("SOURCE_SUPERVISE", "true").lower() == "true"
+SOURCE_STALE_S     = float(os.getenv("SOURCE_STALE_S", "3"))  # no frame for this long = unhealthy
+SOURCE_MAX_ERRORS  = int(os.getenv("SOURCE_MAX_ERRORS", "2"))  # consecutive failed captures
+SOURCE_MAX_BACKOFF = float(os.getenv("SOURCE_MAX_BACKOFF", "30"))
+
+# --- Archive (write-behind, with retention) ---
+ARCHIVE_QUEUE_SIZE   = int(os.getenv("ARCHIVE_QUEUE_SIZE", "32"))
+ARCHIVE_BATCH_SIZE   = int(os.getenv("ARCHIVE_BATCH_SIZE", "8"))
+ARCHIVE_FSYNC        = os.getenv("ARCHIVE_FSYNC", "none").lower()  # none | batch | always
+ARCHIVE_MAX_AGE_DAYS = float(os.getenv("ARCHIVE_MAX_AGE_DAYS", "0"))  # 0 = unlimited
+ARCHIVE_MAX_FILES    = int(os.getenv("ARCHIVE_MAX_FILES", "0"))
+ARCHIVE_MAX_GB       = float(os.getenv("ARCHIVE_MAX_GB", "0"))
+ARCHIVE_SHARDING     = os.getenv("ARCHIVE_SHARDING", "hour").lower()  # hour | day | none
+CATALOG_PATH         = os.getenv("CATALOG_PATH", "./captures.sqlite")  # SQLite index, empty = off
 
 # --- Modbus ---
 MODBUS_TRIGGER        = os.getenv("MODBUS_TRIGGER", "false").lower() == "true"
@@ -33,151 +107,1075 @@ MODBUS_ADDRESS        = int(os.getenv("MODBUS_ADDRESS", "0"))
 MODBUS_UNIT           = int(os.getenv("MODBUS_UNIT", "1"))
 MODBUS_USE_COIL       = os.getenv("MODBUS_USE_COIL", "false").lower() == "true"
 MODBUS_POLL_INTERVAL  = float(os.getenv("MODBUS_POLL_INTERVAL", "0.1"))
+MODBUS_FAST_POLL      = float(os.getenv("MODBUS_FAST_POLL_INTERVAL", "0.005"))
+MODBUS_FAST_WINDOW    = float(os.getenv("MODBUS_FAST_POLL_WINDOW", "2.0"))
+MODBUS_DEBOUNCE       = float(os.getenv("MODBUS_DEBOUNCE", "0.02"))
 MODBUS_OUTPUT_ADDRESS = int(os.getenv("MODBUS_OUTPUT_ADDRESS", "0"))
+MODBUS_RESULT_PULSE   = float(os.getenv("MODBUS_RESULT_PULSE_MS", "0")) / 1000  # 0 = latched
+
+# --- Pipeline ---
+RUN_MODE            = os.getenv("RUN_MODE", "threads").lower()  # threads | async
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "4"))
+PIPELINE_MAX_IN_FLIGHT = int(os.getenv("PIPELINE_MAX_IN_FLIGHT", "16"))  # async mode
+ENCODE_WORKERS      = int(os.getenv("ENCODE_WORKERS", "1"))
+ENCODE_PROCESSES    = int(os.getenv("ENCODE_PROCESSES", "0"))  # 0 = encode in-process
+UPLOAD_WORKERS      = int(os.getenv("UPLOAD_WORKERS", "2"))
+
+# --- Metrics ---
+METRICS_PORT     = int(os.getenv("METRICS_PORT", "0"))  # 0 = no HTTP endpoint
+METRICS_LOG_PATH = os.getenv("METRICS_LOG_PATH", "")    # JSONL event log, empty = off
+
+# --- Service mode / control endpoint (see control.py) ---
+DAEMON_MODE    = os.getenv("DAEMON_MODE", "false").lower() == "true"  # no console, stop on SIGTERM
+CONTROL_SOCKET = os.getenv("CONTROL_SOCKET", "")  # Unix socket path, empty = off
+CONTROL_PORT   = int(os.getenv("CONTROL_PORT", "0"))  # localhost TCP port, 0 = off
+
+# --- Load generator (software triggers for load tests, see load_generator.py) ---
+LOAD_MODE       = os.getenv("LOAD_MODE", "off").lower()  # off | fixed | poisson | original
+LOAD_RATE       = float(os.getenv("LOAD_RATE", "5"))  # triggers/s per station (fixed, poisson)
+LOAD_SPEED      = float(os.getenv("LOAD_SPEED", "1"))  # original: replay this many times faster
+LOAD_COUNT      = int(os.getenv("LOAD_COUNT", "0"))  # 0 = no limit (a replay ends it)
+LOAD_DURATION_S = float(os.getenv("LOAD_DURATION_S", "0"))  # 0 = no limit
 
 # Inspection result → output coil index (Y0=NA, Y1=Pass, Y2=Fail)
 RESULT_VALUES = {"NA": 0, "Pass": 1, "Fail": 2}
 
 
-def capture_and_process(source, modbus_btn=None):
-    try:
-        print("Capturing image...")
-        pil_img = source.get_image()
+def capture_step(part, source, modbus_btn=None, burst: Burst | None = None):
+    print(f"Capturing image (part #{part.part_id})...")
+    part.capture_id = part.capture_id or get_capture_ids().next(part.trigger_time)
+    part.source_id  = getattr(source, "source_id", None)
+    # Buffering sources must return a frame taken after the trigger, not before
+    if part.trigger_event:
+        after = part.trigger_event.timestamp
+    else:
+        after = time.monotonic() - (time.time() - part.trigger_time)
+    burst = burst or _burst
+    if burst.enabled:
+        scored = burst.capture(source, after)
+        if not scored:
+            raise RuntimeError("Burst captured no frames")
+        part.frame, part.burst_frames = scored[0][0], [frame for frame, _ in scored[1:]]
+    else:
+        part.frame = source.get_frame(after=after)
+    if part.frame is None:
+        raise RuntimeError("Captured image is empty")
+
+    if modbus_btn and part.trigger_event:
+        latency = modbus_btn.record_capture(part.trigger_event)
+        stats   = modbus_btn.latency_stats()
+        print(f"[Modbus] Trigger → capture {latency * 1000:.1f} ms "
+              f"(p50 {stats['p50']:.1f} ms, p99 {stats['p99']:.1f} ms, n={stats['count']})")
+
+    # Unique even for several captures per second (see catalog.py)
+    stamp = capture_stamp(part.capture_id)
+    part.name = f"capture_{part.station}_{stamp}" if part.station else f"capture_{stamp}"
+
+    if _dedupe.enabled:
+        _check_duplicate(part)
+
+
+_DEDUPE_VERBS = {"tag": "tagged, processing anyway", "skip": "skipped",
+                 "cache": "reusing its result", "pending": "processing until it has a result"}
+
+
+def _check_duplicate(part):
+    """Compare the frame with recent captures of the same station (dedupe.py)."""
+    match = _dedupe.check(part.station or part.frame.source_id, part.frame, part)
+    decision = "unique" if match is None else _dedupe.action
+    metrics.inc("dedupe_decisions", {"decision": decision},
+                help="Captured frames by duplicate check outcome")
+    if match is None:
+        return
+    original, distance, age = match
+    part.duplicate_of, part.dedupe = original, _dedupe.action
+    metrics.event("duplicate", part_id=part.part_id, station=part.station,
+                  duplicate_of=original.part_id, distance=distance, age=round(age, 3),
+                  action=part.dedupe)
+    verb = part.dedupe if _suppressed(part) or part.dedupe == "tag" else "pending"
+    print(f"[Dedupe] Part #{part.part_id} matches #{original.part_id} "
+          f"(distance {distance}, {age:.2f}s earlier) — {_DEDUPE_VERBS[verb]}")
+    if _suppressed(part):
+        part.frame, part.burst_frames = None, []
+
+
+def _suppressed(part) -> bool:
+    """
+    Duplicate whose encode, archive and upload are skipped. A cached
+    duplicate only counts once its original has a result; until then it
+    keeps its frame and goes through the stages like a tagged one.
+    """
+    if part.dedupe == "cache":
+        return part.duplicate_of.overall_result is not None
+    return part.dedupe == "skip"
+
+
+def _uploading_original(part):
+    """The original a cached duplicate waits for: being uploaded right now, no result yet."""
+    if part.dedupe != "cache" or _suppressed(part):
+        return None
+    original = part.duplicate_of
+    # The key is set when its upload starts; one still queued is not waited for
+    if original.idempotency_key and not original.done.is_set():
+        return original
+    return None
+
+
+def _uncache(part):
+    """Upload time and the original still has no result: process the duplicate itself."""
+    if part.dedupe == "cache" and not _suppressed(part):
+        original = part.duplicate_of
+        state = ("spooled" if original.spooled else "failed" if original.error
+                 else "not uploaded yet")
+        print(f"[Dedupe] Part #{original.part_id} has no result ({state}), "
+              f"uploading duplicate #{part.part_id} itself")
+        metrics.inc("dedupe_uncached",
+                    help="Cached duplicates uploaded because the original had no result")
+        part.dedupe = "tag"
+
+
+def _reuse_result(part):
+    # The PLC stage is ordered, so the original's result is final by now
+    if part.dedupe == "cache" and part.overall_result is None:
+        part.overall_result = part.duplicate_of.overall_result
+
+
+_upload_encoder  = build_encoder(UPLOAD_ENCODER)
+_archive_encoder = (_upload_encoder if ARCHIVE_ENCODER == UPLOAD_ENCODER
+                    else build_encoder(ARCHIVE_ENCODER))
+
+
+_upload_preprocess  = build_preprocess(UPLOAD_PREPROCESS)
+_archive_preprocess = (_upload_preprocess if ARCHIVE_PREPROCESS == UPLOAD_PREPROCESS
+                       else build_preprocess(ARCHIVE_PREPROCESS))
+
+
+_burst = Burst(BURST_FRAMES, BURST_BUDGET_MS / 1000, parse_roi(BURST_ROI),
+               step=BURST_SCORE_STEP, keep=BURST_UPLOAD)
+
+_dedupe = FrameDeduper(DEDUPE_ACTION, DEDUPE_DISTANCE, DEDUPE_WINDOW_S, DEDUPE_HISTORY)
+
+
+_encode_pool: EncodePool | None = None
+
+
+def get_encode_pool() -> EncodePool | None:
+    """Shared encode worker processes (None when ENCODE_PROCESSES=0)."""
+    global _encode_pool
+    if _encode_pool is None and ENCODE_PROCESSES > 0:
+        _encode_pool = EncodePool(ENCODE_PROCESSES)
+        _encode_pool.start()
+    return _encode_pool
+
+
+def encode_step(part, upload_pre: Preprocess | None = None,
+                archive_pre: Preprocess | None = None):
+    if _suppressed(part):
+        return
+    upload_pre  = upload_pre or _upload_preprocess
+    archive_pre = archive_pre or _archive_preprocess
+    array, fmt  = part.frame.data, part.frame.pixel_format
+    shared      = _archive_encoder is _upload_encoder and archive_pre is upload_pre
+
+    pool = get_encode_pool()
+    if pool:
+        # Both copies from one shared-memory handoff, off the GIL
+        jobs = [(upload_pre, _upload_encoder)]
+        if not shared:
+            jobs.append((archive_pre, _archive_encoder))
+        encoded = pool.encode(array, fmt, jobs)
+    else:
+        encoded = [_upload_encoder.encode(*upload_pre.apply(array, fmt))]
+        if not shared:
+            encoded.append(_archive_encoder.encode(*archive_pre.apply(array, fmt)))
+
+    # BURST_UPLOAD=all: the other burst frames ride along in the same request (upload copy only)
+    extra = []
+    for frame in part.burst_frames:
+        if pool:
+            extra.append(pool.encode(frame.data, frame.pixel_format, jobs[:1])[0])
+        else:
+            extra.append(_upload_encoder.encode(*upload_pre.apply(frame.data, frame.pixel_format)))
+    part.extra_images = [(f"{part.name}_{i}.{_upload_encoder.extension}", data)
+                         for i, data in enumerate(extra, 1)]
+    part.burst_frames = []
+
+    part.image_data   = encoded[0]
+    part.filename     = f"{part.name}.{_upload_encoder.extension}"
+    part.mime         = _upload_encoder.mime
+    part.archive_data = encoded[0] if shared else encoded[1]
+    part.archive_filename = os.path.join(shard_dir(part.capture_id, ARCHIVE_SHARDING),
+                                         f"{part.name}.{_archive_encoder.extension}")
+    part.frame = None  # release the decoded frame as early as possible
+
+
+_archive_writer: ArchiveWriter | None = None
+
+
+def get_archive_writer() -> ArchiveWriter:
+    """Shared, lazily started write-behind archive for IMAGES_SAVE_PATH."""
+    global _archive_writer
+    if _archive_writer is None:
+        _archive_writer = ArchiveWriter(
+            IMAGES_SAVE_PATH,
+            queue_size=ARCHIVE_QUEUE_SIZE,
+            batch_size=ARCHIVE_BATCH_SIZE,
+            fsync=ARCHIVE_FSYNC,
+            max_age_s=ARCHIVE_MAX_AGE_DAYS * 86400 or None,
+            max_files=ARCHIVE_MAX_FILES or None,
+            max_bytes=int(ARCHIVE_MAX_GB * 1e9) or None,
+            on_evicted=_forget_archived,
+        )
+        _archive_writer.start()
+    return _archive_writer
+
 
-        if pil_img is None:
-            print("Captured image is empty.")
-            return
+def save_step(part):
+    if _suppressed(part):
+        return
+    # Only enqueues; the archive thread does the disk I/O off the critical path
+    if get_archive_writer().submit(part.archive_filename, part.archive_data,
+                                   on_written=lambda path: print(f"Saved: {path}")):
+        part.archive_bytes = len(part.archive_data)
+    part.archive_data = None
 
-        buffer = io.BytesIO()
-        pil_img.save(buffer, format="WEBP", quality=100, lossless=True)
-        image_data = buffer.getvalue()
 
-        timestamp = time.strftime("%Y%m%d-%H%M%S")
-        filename  = f"capture_{timestamp}.webp"
+_catalog: CaptureCatalog | None = None
+_capture_ids: CaptureIds | None = None
 
-        os.makedirs(IMAGES_SAVE_PATH, exist_ok=True)
-        local_path = os.path.join(IMAGES_SAVE_PATH, filename)
-        with open(local_path, "wb") as f:
-            f.write(image_data)
-        print(f"Saved: {local_path}")
 
-        if not API_URL:
-            print("No API_URL configured, skipping upload.")
-            return
+def get_catalog() -> CaptureCatalog | None:
+    """Shared, lazily started capture catalog (None when CATALOG_PATH is empty)."""
+    global _catalog
+    if _catalog is None and CATALOG_PATH:
+        _catalog = CaptureCatalog(CATALOG_PATH)
+        _catalog.start()
+    return _catalog
 
-        print(f"Uploading to API...")
-        headers = {"x-api-key": API_KEY, "x-workspace-id": WORKSPACE_ID}
-        data    = {
+
+def get_capture_ids() -> CaptureIds:
+    """Capture id generator, continuing after the highest id in the catalog."""
+    global _capture_ids
+    if _capture_ids is None:
+        catalog = get_catalog()
+        _capture_ids = CaptureIds(catalog.last_id() if catalog else 0)
+    return _capture_ids
+
+
+def _forget_archived(path: str):
+    if get_catalog():
+        _catalog.forget_path(IMAGES_SAVE_PATH, path)
+
+
+def _catalog_row(part) -> dict:
+    return {
+        "capture_id": part.capture_id, "name": part.name, "station": part.station or "",
+        "source": part.source_id,
+        "path": part.archive_filename if part.archive_bytes is not None else None,
+        "bytes": part.archive_bytes, "trigger_time": part.trigger_time, "done_time": time.time(),
+        **{f"{stage}_s": part.stage_times.get(stage) for stage in STAGES},
+        "overall_result": part.overall_result, "error": part.error, "spooled": int(part.spooled),
+        "duplicate_of": part.duplicate_of.capture_id if part.duplicate_of else None,
+    }
+
+
+_upload_client: UploadClient | None = None
+
+
+def _upload_client_args() -> dict:
+    return dict(
+        api_key=API_KEY,
+        workspace_id=WORKSPACE_ID,
+        form_fields={
             "product_name": PRODUCT_NAME,
             "session_name": SESSION_NAME,
             "article_name": ARTICLE_NAME,
             "next_article": NEXT_ARTICLE,
-        }
-        files = {IMAGE_FIELD_NAME: (filename, image_data, "image/webp")}
+        },
+        image_field=IMAGE_FIELD_NAME,
+        pool_size=UPLOAD_POOL_SIZE,
+        max_in_flight=UPLOAD_WORKERS,
+        timeout=UPLOAD_TIMEOUT,
+    )
 
-        try:
-            response = requests.post(API_URL, headers=headers, data=data, files=files, timeout=30)
-            print(f"API Response: {response.status_code}")
 
-            if response.status_code >= 400:
-                print(f"Error: {response.text}")
-                return
+def get_upload_client() -> UploadClient | None:
+    """Shared, lazily created keep-alive client (None when API_URL is unset)."""
+    global _upload_client
+    if _upload_client is None and API_URL:
+        _upload_client = UploadClient(API_URL, **_upload_client_args())
+    return _upload_client
 
-            body           = response.json()
-            overall_result = body.get("overall_result", "NA")
-            modbus_value   = RESULT_VALUES.get(overall_result, 0)
-            print(f"Result: {overall_result}")
 
-            if modbus_btn:
-                modbus_btn.write_result(MODBUS_OUTPUT_ADDRESS, modbus_value)
+_async_upload_client: AsyncUploadClient | None = None
+
+
+def get_async_upload_client() -> AsyncUploadClient | None:
+    """Event-loop upload client for RUN_MODE=async (None when API_URL is unset)."""
+    global _async_upload_client
+    if _async_upload_client is None and API_URL:
+        _async_upload_client = AsyncUploadClient(API_URL, **_upload_client_args())
+    return _async_upload_client
+
+
+_upload_spool: UploadSpool | None = None
+
+
+def get_upload_spool() -> UploadSpool | None:
+    """Shared on-disk spool for uploads that failed (None when API_URL is unset)."""
+    global _upload_spool
+    if _upload_spool is None and get_upload_client():
+        _upload_spool = UploadSpool(
+            SPOOL_PATH,
+            get_upload_client(),
+            concurrency=SPOOL_CONCURRENCY,
+            max_backoff=SPOOL_MAX_BACKOFF,
+            on_result=_on_spool_result,
+        )
+        _upload_spool.start()
+    return _upload_spool
+
+
+def _on_spool_result(entry: dict, body: dict):
+    result = body.get("overall_result", "NA")
+    metrics.inc("inspection_results", {"result": result, "via": "spool"})
+    capture_id = entry["meta"].get("capture_id")
+    if capture_id and get_catalog():
+        _catalog.set_result(capture_id, result)
+
+
+def _spool(part, reason: str):
+    get_upload_spool().put(part.filename, part.image_data, part.mime, part.idempotency_key,
+                           meta={"part_id": part.part_id, "capture_id": part.capture_id,
+                                 "trigger_time": part.trigger_time},
+                           extra_images=part.extra_images)
+    part.spooled = True
+    print(f"Part #{part.part_id} spooled for later upload ({reason})")
+
+
+def upload_step(part):
+    client = get_upload_client()
+    if client is None:
+        print("No API_URL configured, skipping upload.")
+        return
+    if original := _uploading_original(part):
+        original.done.wait(UPLOAD_TIMEOUT + 10)  # its result may spare this upload
+    if _suppressed(part):
+        return
+    _uncache(part)
+
+    part.idempotency_key = part.idempotency_key or uuid.uuid4().hex
+    if get_upload_spool().is_backing_off():
+        # API known to be down: don't make the part wait for a timeout
+        _spool(part, "API unreachable")
+        return
 
+    print(f"Uploading part #{part.part_id} to API...")
+    try:
+        body = client.upload(part.filename, part.image_data, part.mime,
+                             extra_headers={"Idempotency-Key": part.idempotency_key},
+                             extra_images=part.extra_images)
+    except UploadError as e:
+        if not e.retryable:
+            raise
+        _spool(part, str(e))
+        return
+
+    part.overall_result = body.get("overall_result", "NA")
+    print(f"Result (part #{part.part_id}): {part.overall_result}")
+
+
+async def upload_step_async(part):
+    """upload_step for RUN_MODE=async: the HTTP request runs on the event loop."""
+    client = get_async_upload_client()
+    if client is None:
+        print("No API_URL configured, skipping upload.")
+        return
+    if original := _uploading_original(part):
+        await asyncio.to_thread(original.done.wait, UPLOAD_TIMEOUT + 10)
+    if _suppressed(part):
+        return
+    _uncache(part)
+
+    part.idempotency_key = part.idempotency_key or uuid.uuid4().hex
+    if get_upload_spool().is_backing_off():
+        await asyncio.to_thread(_spool, part, "API unreachable")
+        return
+
+    print(f"Uploading part #{part.part_id} to API...")
+    try:
+        body = await client.upload(part.filename, part.image_data, part.mime,
+                                   extra_headers={"Idempotency-Key": part.idempotency_key},
+                                   extra_images=part.extra_images)
+    except UploadError as e:
+        if not e.retryable:
+            raise
+        await asyncio.to_thread(_spool, part, str(e))
+        return
+
+    part.overall_result = body.get("overall_result", "NA")
+    print(f"Result (part #{part.part_id}): {part.overall_result}")
+
+
+def plc_step(part, modbus_btn):
+    _reuse_result(part)
+    if modbus_btn is None or part.overall_result is None:
+        return
+    modbus_value = RESULT_VALUES.get(part.overall_result, 0)
+    modbus_btn.write_result(part.output_address, modbus_value)
+
+
+async def plc_step_async(part, modbus_btn):
+    _reuse_result(part)
+    if modbus_btn is None or part.overall_result is None:
+        return
+    modbus_value = RESULT_VALUES.get(part.overall_result, 0)
+    await modbus_btn.write_result(part.output_address, modbus_value)
+
+
+_serial_ids = itertools.count(1)
+
+
+def capture_and_process(source, modbus_btn=None):
+    """Run one part through every step serially in the calling thread."""
+    part = Part(output_address=MODBUS_OUTPUT_ADDRESS)
+    part.part_id = next(_serial_ids)
+    steps = [
+        ("capture", lambda p: capture_step(p, source, modbus_btn)),
+        ("encode",  encode_step),
+        ("save",    save_step),
+        ("upload",  upload_step),
+        ("plc",     lambda p: plc_step(p, modbus_btn)),
+    ]
+    for name, step in steps:
+        started = time.perf_counter()
+        try:
+            step(part)
         except Exception as e:
-            print(f"API upload failed: {e}")
+            part.error = f"{name}: {e}"
+            metrics.inc("stage_errors", {"stage": name})
+            print(f"Capture error ({name}): {e}")
+        part.stage_times[name] = time.perf_counter() - started
+        metrics.observe("stage_seconds", part.stage_times[name], {"stage": name})
+        if part.error:
+            break
+    part.done.set()
+    _on_part_done(part)  # same catalog row, metrics and event as a pipeline part
+    return part
+
+
+_last_parts: dict[str, dict] = {}  # station name → summary of its last finished part
+
+
+def _part_summary(part, cycle: float | None = None) -> dict:
+    return {"part_id": part.part_id, "capture_id": part.capture_id,
+            "station": part.station or "", "name": part.name,
+            "result": part.overall_result, "error": part.error, "spooled": part.spooled,
+            "duplicate_of": part.duplicate_of.part_id if part.duplicate_of else None,
+            "cycle": round(cycle, 6) if cycle is not None else None,
+            "trigger_time": part.trigger_time}
+
+
+def _on_part_done(part):
+    cycle = time.time() - part.trigger_time
+    _last_parts[part.station or ""] = _part_summary(part, cycle)
+    metrics.observe("cycle_seconds", cycle, help="Trigger to part done, all stages")
+    if part.capture_id and get_catalog():
+        _catalog.record(**_catalog_row(part))
+    if part.overall_result:
+        via = "cache" if part.dedupe == "cache" else "live"
+        metrics.inc("inspection_results", {"result": part.overall_result, "via": via},
+                    help="Inspection API results by overall_result")
+    metrics.event("part", part_id=part.part_id, station=part.station, name=part.name,
+                  result=part.overall_result, error=part.error, spooled=part.spooled,
+                  duplicate_of=part.duplicate_of.part_id if part.duplicate_of else None,
+                  cycle=round(cycle, 6),
+                  stages={k: round(v, 6) for k, v in part.stage_times.items()})
+    label = f"[{part.station}] Part #{part.part_id}" if part.station else f"Part #{part.part_id}"
+    if part.error:
+        print(f"{label} failed ({part.error}) — cycle {cycle:.2f}s")
+    elif part.spooled:
+        print(f"{label} spooled, no result yet — cycle {cycle:.2f}s")
+    elif part.dedupe == "skip":
+        print(f"{label} skipped, duplicate of #{part.duplicate_of.part_id} — cycle {cycle:.2f}s")
+    else:
+        print(f"{label} done: {part.overall_result} — cycle {cycle:.2f}s")
 
-    except Exception as e:
-        print(f"Capture error: {e}")
 
+def build_pipeline(source, modbus_btn=None, preprocess: tuple | None = None,
+                   burst: Burst | None = None) -> Pipeline:
+    """
+    capture → encode → save → upload → plc, each with its own workers.
 
-def _build_source():
-    if SOURCE_TYPE == "rtsp":
-        if not RTSP_URL:
+    Capture stays single-threaded (one camera), uploads run in parallel,
+    and the PLC stage is ordered so results land on the right part.
+    `preprocess` is the source's (upload, archive) Preprocess pair and
+    `burst` its burst capture settings (default: .env).
+    """
+    upload_pre, archive_pre = preprocess or (None, None)
+    get_upload_client()  # create shared resources before workers race for them
+    get_archive_writer()
+    get_upload_spool()
+    get_encode_pool()
+    get_capture_ids()
+
+    stages = [
+        Stage("capture", lambda p: capture_step(p, source, modbus_btn, burst)),
+        Stage("encode",  lambda p: encode_step(p, upload_pre, archive_pre),
+              workers=max(ENCODE_WORKERS, ENCODE_PROCESSES)),
+        Stage("save",    save_step),
+        Stage("upload",  upload_step, workers=UPLOAD_WORKERS),
+        Stage("plc",     lambda p: plc_step(p, modbus_btn), ordered=True),
+    ]
+    return Pipeline(stages, queue_size=PIPELINE_QUEUE_SIZE, on_done=_on_part_done)
+
+
+def build_async_pipeline(source, modbus_btn=None, preprocess: tuple | None = None,
+                         burst: Burst | None = None) -> AsyncPipeline:
+    """
+    The same stages for RUN_MODE=async: capture and encode run on per-stage
+    thread pools, upload and the PLC write are coroutines on the loop.
+    """
+    upload_pre, archive_pre = preprocess or (None, None)
+    get_async_upload_client()
+    get_archive_writer()
+    get_upload_spool()
+    get_encode_pool()
+    get_capture_ids()
+
+    stages = [
+        Stage("capture", lambda p: capture_step(p, source, modbus_btn, burst)),
+        Stage("encode",  lambda p: encode_step(p, upload_pre, archive_pre),
+              workers=max(ENCODE_WORKERS, ENCODE_PROCESSES)),
+        Stage("save",    save_step),
+        Stage("upload",  upload_step_async, workers=UPLOAD_WORKERS),
+        Stage("plc",     functools.partial(plc_step_async, modbus_btn=modbus_btn), ordered=True),
+    ]
+    return AsyncPipeline(stages, max_in_flight=PIPELINE_MAX_IN_FLIGHT, on_done=_on_part_done)
+
+
+def _build_source(spec: dict | None = None):
+    """Build an ImageSource from a station's source spec (default: .env settings)."""
+    spec        = spec or {}
+    source_type = spec.get("type", SOURCE_TYPE).lower()
+    if source_type == "rtsp":
+        url = spec.get("url", RTSP_URL)
+        if not url:
             raise ValueError("RTSP_URL must be set when SOURCE_TYPE=rtsp")
+        if spec.get("backend", RTSP_BACKEND).lower() == "ffmpeg":
+            from source_ffmpeg import FFmpegRTSPSource
+            return FFmpegRTSPSource(url, ffmpeg=spec.get("ffmpeg", FFMPEG_PATH),
+                                    width=spec.get("width"), height=spec.get("height"))
         from source_rtsp import RTSPSource
-        return RTSPSource(RTSP_URL)
-    if SOURCE_TYPE == "webcam":
+        return RTSPSource(url)
+    if source_type == "webcam":
         from source_webcam import WebcamSource
-        return WebcamSource(WEBCAM_ID)
+        return WebcamSource(str(spec.get("webcam_id", WEBCAM_ID)), index_path=WEBCAM_INDEX_PATH)
+    if source_type == "replay":
+        from source_replay import ReplaySource
+        path = spec.get("path", REPLAY_PATH)
+        if not path:
+            raise ValueError("REPLAY_PATH must be set when SOURCE_TYPE=replay")
+        if _inside(path, IMAGES_SAVE_PATH):
+            raise ValueError(f"Replay path {path} is inside the run's archive {IMAGES_SAVE_PATH}")
+        return ReplaySource(path,
+                            loop=bool(spec.get("loop", REPLAY_LOOP)),
+                            prefetch=int(spec.get("prefetch", REPLAY_PREFETCH)))
     from source_baumer import BaumerSource
-    return BaumerSource()
+    return BaumerSource(spec.get("camera_id"))
+
+
+def _station_preprocess(station: Station) -> tuple[Preprocess, Preprocess]:
+    """(upload, archive) variants from the station's source "preprocess" block."""
+    spec = station.source.get("preprocess")
+    if spec is None:
+        return _upload_preprocess, _archive_preprocess
+    upload = build_preprocess(spec.get("upload"))
+    archive = upload if "archive" not in spec else build_preprocess(spec["archive"])
+    return upload, archive
+
+
+def _station_burst(station: Station) -> Burst:
+    """Burst settings from the station's source "burst" block (default: .env)."""
+    spec = station.source.get("burst")
+    if spec is None:
+        return _burst
+    return Burst(int(spec.get("frames", BURST_FRAMES)),
+                 float(spec.get("budget_ms", BURST_BUDGET_MS)) / 1000,
+                 parse_roi(spec.get("roi", BURST_ROI)),
+                 step=int(spec.get("step", BURST_SCORE_STEP)),
+                 keep=str(spec.get("upload", BURST_UPLOAD)).lower())
+
+
+def _inside(path: str, root: str) -> bool:
+    path, root = os.path.realpath(path), os.path.realpath(root)
+    return os.path.commonpath([path, root]) == root
+
+
+def _isolate_replay(stations: list[Station]):
+    """
+    A replay run archives, catalogs, spools and logs under REPLAY_OUTPUT_PATH,
+    never into the production archive and catalog it may be replaying.
+    """
+    global IMAGES_SAVE_PATH, CATALOG_PATH, SPOOL_PATH, METRICS_LOG_PATH
+    if not any(st.source.get("type", SOURCE_TYPE).lower() == "replay" for st in stations):
+        return
+    IMAGES_SAVE_PATH = os.path.join(REPLAY_OUTPUT, "images")
+    SPOOL_PATH       = os.path.join(REPLAY_OUTPUT, "spool")
+    CATALOG_PATH     = os.path.join(REPLAY_OUTPUT, "captures.sqlite") if CATALOG_PATH else ""
+    METRICS_LOG_PATH = os.path.join(REPLAY_OUTPUT, "events.jsonl") if METRICS_LOG_PATH else ""
+    print(f"Replay run: archive, catalog, spool and event log go to {REPLAY_OUTPUT}")
+
+
+def _env_station() -> Station:
+    """Single-station mode: one station described entirely by .env."""
+    return Station("", MODBUS_ADDRESS, MODBUS_OUTPUT_ADDRESS, {"type": SOURCE_TYPE})
+
+
+def _connect_sources(stations: list[Station], sources: dict):
+    """Build and connect one ImageSource per station into `sources` (name → source)."""
+    for station in stations:
+        source = _build_source(station.source)
+        # A finished replay must not be "reconnected" (restarted) by the supervisor
+        if SOURCE_SUPERVISE and station.source.get("type", SOURCE_TYPE).lower() != "replay":
+            # A missing camera no longer aborts startup; it is retried in the background
+            source = SupervisedSource(source, stale_after=SOURCE_STALE_S,
+                                      max_errors=SOURCE_MAX_ERRORS, max_backoff=SOURCE_MAX_BACKOFF)
+        source.connect()
+        sources[station.name] = source
+        print(f"\nSource{f' [{station.name}]' if station.name else ''}: "
+              f"{station.source.get('type', SOURCE_TYPE).upper()}")
+
+
+def _make_button(cls, stations: list[Station]):
+    # One connection and one block read for all station inputs
+    return cls(
+        host=MODBUS_HOST,
+        port=MODBUS_PORT,
+        address=MODBUS_ADDRESS,
+        unit=MODBUS_UNIT,
+        use_coil=MODBUS_USE_COIL,
+        poll_interval=MODBUS_POLL_INTERVAL,
+        fast_poll_interval=MODBUS_FAST_POLL,
+        fast_poll_window=MODBUS_FAST_WINDOW,
+        debounce=MODBUS_DEBOUNCE,
+        addresses=[st.input_address for st in stations],
+        pulse=MODBUS_RESULT_PULSE,
+    )
+
+
+def _stations_for(cmd: str, stations: list[Station]) -> list[Station]:
+    """'c' targets every station, 'c <name>' a single one."""
+    _, _, name = cmd.partition(" ")
+    targets = [st for st in stations if not name or st.name == name.strip()]
+    if not targets:
+        print(f"Unknown station: '{name.strip()}'")
+    return targets
+
+
+def _press_message(station: Station, event) -> str:
+    where = f" [{station.name}]" if station.name else ""
+    if event is None:
+        return f"\n[Control]{where} Software trigger — capturing..."
+    return f"\n[Modbus]{where} Button pressed (edge #{event.sequence}) — capturing..."
+
+
+def _control_commands(stations: list[Station], pipelines: dict, sources: dict, press,
+                      modbus_btn=None) -> dict:
+    """
+    Control endpoint commands. `press(station)` submits a software trigger
+    the same way a button press does and returns the Part (None if dropped).
+
+      trigger [station] [wait]   capture (every station if none named);
+                                 with `wait`, reply when the part is done
+      last [station]             summary of the last finished part
+      status                     per-station queue depth, drops, source health,
+                                 last result
+      ping
+    """
+    started = time.monotonic()
+    by_name = {st.name: st for st in stations}
+
+    def targets(names: list[str]) -> list[Station]:
+        unknown = [n for n in names if n not in by_name]
+        if unknown:
+            raise ValueError(f"unknown station {', '.join(unknown)}")
+        return [by_name[n] for n in names] if names else stations
+
+    def trigger(arg: str) -> dict:
+        words = arg.split()
+        wait  = "wait" in words
+        parts = {st.name: press(st) for st in targets([w for w in words if w != "wait"])}
+        if wait:
+            for part in filter(None, parts.values()):
+                part.done.wait(UPLOAD_TIMEOUT + 10)
+        replies = {}
+        for name, part in parts.items():
+            done = _last_parts.get(name)
+            if part is None:
+                replies[name] = {"error": "pipeline full"}
+            elif done and done["part_id"] == part.part_id:
+                replies[name] = done  # finished (wait): includes the cycle time
+            else:
+                replies[name] = _part_summary(part)
+        ok = all(parts.values())
+        return ({"ok": ok, **next(iter(replies.values()))} if len(replies) == 1
+                else {"ok": ok, "parts": replies})
+
+    def last(arg: str) -> dict:
+        station = targets(arg.split())[0] if arg else stations[0]
+        return {"ok": True, **(_last_parts.get(station.name) or {"part_id": None})}
+
+    def status(arg: str) -> dict:
+        return {
+            "ok": True,
+            "uptime": round(time.monotonic() - started, 3),
+            "run_mode": RUN_MODE,
+            "modbus": modbus_btn is not None,
+            "stations": {st.name or "default": {"pending": pipelines[st.name].pending(),
+                                   "dropped": pipelines[st.name].dropped,
+                                   "source": _source_status(sources.get(st.name)),
+                                   "last": _last_parts.get(st.name)} for st in stations},
+        }
+
+    return {"trigger": trigger, "last": last, "status": status,
+            "ping": lambda arg: {"ok": True, "pong": time.time()}}
+
+
+def _source_status(source) -> dict | None:
+    return source.status() if isinstance(source, SupervisedSource) else None
+
+
+def _start_load(stations: list[Station], sources: dict, trigger, on_finished=None) -> list:
+    """
+    One TriggerGenerator per station when LOAD_MODE is set; `trigger(station)`
+    submits a part without the per-press console line. A replay that does
+    not loop also bounds the trigger count. on_finished() runs once every
+    generator is done.
+    """
+    if LOAD_MODE == "off":
+        return []
+    from load_generator import TriggerGenerator
+    generators = []
+    remaining  = [len(stations)]
+    lock       = threading.Lock()
+
+    def finished():
+        with lock:
+            remaining[0] -= 1
+            if remaining[0] == 0 and on_finished:
+                on_finished()
+
+    for station in stations:
+        source   = sources[station.name]
+        timeline = source.timeline() if hasattr(source, "timeline") else None
+        count    = LOAD_COUNT
+        if timeline is not None and not source.loop:
+            count = min(count or len(timeline), len(timeline))
+        generators.append(TriggerGenerator(
+            functools.partial(trigger, station), LOAD_MODE, LOAD_RATE, timeline, count,
+            LOAD_DURATION_S, speed=LOAD_SPEED, name=station.name, on_finished=finished))
+    for generator in generators:
+        generator.start()
+    return generators
+
+
+def _start_control(commands: dict) -> ControlServer | None:
+    if not (CONTROL_SOCKET or CONTROL_PORT):
+        return None
+    server = ControlServer(commands, unix_path=CONTROL_SOCKET, port=CONTROL_PORT)
+    server.start()
+    return server
+
+
+def _on_loop(loop: asyncio.AbstractEventLoop, func, *args):
+    """Call func(*args) on the event loop from another thread and return its result."""
+    done = concurrent.futures.Future()
+
+    def call():
+        try:
+            done.set_result(func(*args))
+        except Exception as e:
+            done.set_exception(e)
+
+    loop.call_soon_threadsafe(call)
+    return done.result(timeout=5)
+
+
+def _interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+
+def _close_shared():
+    if _encode_pool:
+        _encode_pool.close()
+    if _upload_spool:
+        _upload_spool.stop()
+    if _upload_client:
+        _upload_client.close()
+    if _archive_writer:
+        _archive_writer.stop()
+    if _catalog:
+        _catalog.stop()
+    metrics.close()
 
 
 def main():
-    source     = None
+    if RUN_MODE == "async":
+        asyncio.run(main_async())
+        return
+
+    stations   = []
+    sources    = {}  # station name → ImageSource
+    pipelines  = {}  # station name → Pipeline
     modbus_btn = None
+    control    = None
+    loads      = []  # load_generator.TriggerGenerator per station (LOAD_MODE)
 
     try:
-        source = _build_source()
-        source.connect()
-        print(f"\nSource: {SOURCE_TYPE.upper()}")
+        stations = load_stations() or [_env_station()]
+        _isolate_replay(stations)
+        if METRICS_LOG_PATH:
+            metrics.open_event_log(METRICS_LOG_PATH)
+        if METRICS_PORT:
+            metrics.serve_http(METRICS_PORT)
+
+        _connect_sources(stations, sources)
 
         if MODBUS_TRIGGER:
             from modbus_button import ModbusButton
+            modbus_btn = _make_button(ModbusButton, stations)
 
-            capture_lock = threading.Lock()
-
-            def on_button_press():
-                with capture_lock:
-                    print("\n[Modbus] Button pressed — capturing...")
-                    t = time.time()
-                    capture_and_process(source, modbus_btn)
-                    print(f"Cycle time: {time.time() - t:.2f}s")
-                    print("Press button or type 'c' to capture, 'x' to exit: ", end="", flush=True)
+        # Each station gets its own pipeline so stations capture in parallel;
+        # the upload client, spool, archive and PLC connection are shared.
+        for station in stations:
+            pipelines[station.name] = build_pipeline(sources[station.name], modbus_btn,
+                                                     _station_preprocess(station),
+                                                     _station_burst(station))
+            pipelines[station.name].start()
+        by_input = {st.input_address: st for st in stations}
 
-            modbus_btn = ModbusButton(
-                host=MODBUS_HOST,
-                port=MODBUS_PORT,
-                address=MODBUS_ADDRESS,
-                unit=MODBUS_UNIT,
-                use_coil=MODBUS_USE_COIL,
-                poll_interval=MODBUS_POLL_INTERVAL,
+        def trigger(station, event=None):
+            part = Part(
+                output_address=station.output_address,
+                trigger_event=event,
+                station=station.name or None,
             )
+            return part if pipelines[station.name].submit(part) else None
+
+        def trigger_cmd(cmd):
+            for st in _stations_for(cmd, stations):
+                trigger(st)
+
+        def press(station, event=None):
+            # Only enqueue: the poll loop is back watching the button
+            # while the previous part is still encoding/uploading.
+            print(_press_message(station, event))
+            return trigger(station, event)
+
+        control = _start_control(_control_commands(stations, pipelines, sources, press, modbus_btn))
+
+        if modbus_btn:
+            def on_button_press(event):
+                station = by_input.get(event.address)
+                if station is None:
+                    return
+                press(station, event)
+
             modbus_btn.on_press = on_button_press
             modbus_btn.connect()
             modbus_btn.start()
-            print(f"Modbus trigger active — {MODBUS_HOST}:{MODBUS_PORT} input #{MODBUS_ADDRESS}")
+            inputs = ", ".join(f"#{st.input_address}" for st in stations)
+            print(f"Modbus trigger active — {MODBUS_HOST}:{MODBUS_PORT} input {inputs}")
+
+        # Daemon mode: set by SIGTERM/SIGINT, or when a load run has finished
+        stop  = threading.Event()
+        loads = _start_load(stations, sources, trigger, stop.set if DAEMON_MODE else None)
+
+        if DAEMON_MODE:
+            # No console: run until SIGTERM (systemd stop) or SIGINT, then drain
+            for sig in (signal.SIGTERM, signal.SIGINT):
+                signal.signal(sig, lambda signum, frame: stop.set())
+            print("Running as a service — stop with SIGTERM/SIGINT.")
+            while not stop.wait(1.0):
+                pass
+            print("Shutting down...")
+
+        elif modbus_btn:
+            signal.signal(signal.SIGTERM, _interrupt)
             print("Press button or type 'c' to capture, 'x' to exit: ", end="", flush=True)
 
             while True:
                 cmd = input().strip().lower()
                 if cmd == "x":
                     break
-                elif cmd == "c":
-                    t = time.time()
-                    capture_and_process(source, modbus_btn)
-                    print(f"Cycle time: {time.time() - t:.2f}s")
+                elif cmd == "c" or cmd.startswith("c "):
+                    trigger_cmd(cmd)
                 elif cmd:
                     print("Press button or type 'c' to capture, 'x' to exit: ", end="", flush=True)
 
         else:
+            signal.signal(signal.SIGTERM, _interrupt)
             print("Ready. Type 'c' to capture, 'x' to exit.")
             while True:
                 cmd = input("> ").strip().lower()
                 if cmd == "x":
                     break
-                elif cmd == "c":
-                    t = time.time()
-                    capture_and_process(source, modbus_btn)
-                    print(f"Cycle time: {time.time() - t:.2f}s")
+                elif cmd == "c" or cmd.startswith("c "):
+                    trigger_cmd(cmd)
                 elif cmd:
                     print(f"Unknown command: '{cmd}'")
 
+    except KeyboardInterrupt:
+        print("\nInterrupted, shutting down...")
     except Exception as e:
         print(f"Error: {e}")
     finally:
+        for load in loads:
+            load.stop()
+        if control:
+            control.stop()
+        if modbus_btn:
+            modbus_btn.stop_polling()
+        if pipelines:
+            print("Draining pipeline...")
+            for pipeline in pipelines.values():
+                pipeline.stop()
         if modbus_btn:
             modbus_btn.stop()
-        if source:
+        for source in sources.values():
+            source.disconnect()
+        _close_shared()
+
+
+def _stdin_lines(loop: asyncio.AbstractEventLoop) -> asyncio.Queue:
+    """Console commands as an asyncio.Queue (None on EOF), read by a daemon thread."""
+    lines: asyncio.Queue[str | None] = asyncio.Queue()
+
+    def reader():
+        for line in sys.stdin:
+            loop.call_soon_threadsafe(lines.put_nowait, line.strip().lower())
+        loop.call_soon_threadsafe(lines.put_nowait, None)
+
+    threading.Thread(target=reader, daemon=True, name="stdin").start()
+    return lines
+
+
+async def main_async():
+    """
+    RUN_MODE=async: PLC polling and result writes use pymodbus's async
+    client and uploads run on the event loop (aiohttp when installed), so
+    in-flight parts are tasks rather than threads. Camera reads and
+    encodes still run on small per-stage thread pools.
+    """
+    stations   = []
+    sources    = {}  # station name → ImageSource
+    pipelines  = {}  # station name → AsyncPipeline
+    modbus_btn = None
+    control    = None
+    loads      = []
+
+    try:
+        stations = load_stations() or [_env_station()]
+        _isolate_replay(stations)
+        if METRICS_LOG_PATH:
+            metrics.open_event_log(METRICS_LOG_PATH)
+        if METRICS_PORT:
+            metrics.serve_http(METRICS_PORT)
+
+        await asyncio.to_thread(_connect_sources, stations, sources)
+
+        if MODBUS_TRIGGER:
+            from modbus_button import AsyncModbusButton
+            modbus_btn = _make_button(AsyncModbusButton, stations)
+
+        for station in stations:
+            pipelines[station.name] = build_async_pipeline(sources[station.name], modbus_btn,
+                                                           _station_preprocess(station),
+                                                           _station_burst(station))
+            pipelines[station.name].start()
+        by_input = {st.input_address: st for st in stations}
+        client   = get_async_upload_client()
+        if client:
+            print(f"Uploads: {client.backend}")
+
+        def trigger(station, event=None):
+            part = Part(
+                output_address=station.output_address,
+                trigger_event=event,
+                station=station.name or None,
+            )
+            return part if pipelines[station.name].submit(part) else None
+
+        def press(station, event=None):
+            print(_press_message(station, event))
+            return trigger(station, event)
+
+        loop    = asyncio.get_running_loop()
+        control = _start_control(_control_commands(
+            stations, pipelines, sources, lambda st: _on_loop(loop, press, st), modbus_btn))
+
+        if modbus_btn:
+            def on_button_press(event):
+                station = by_input.get(event.address)
+                if station is None:
+                    return
+                press(station, event)
+
+            modbus_btn.on_press = on_button_press
+            await modbus_btn.connect()
+            modbus_btn.start()
+            inputs = ", ".join(f"#{st.input_address}" for st in stations)
+            print(f"Modbus trigger active (async) — {MODBUS_HOST}:{MODBUS_PORT} input {inputs}")
+
+        if DAEMON_MODE:
+            commands: asyncio.Queue[str | None] = asyncio.Queue()
+            print("Running as a service — stop with SIGTERM/SIGINT.")
+        else:
+            commands = _stdin_lines(loop)
+            if modbus_btn:
+                print("Press button or type 'c' to capture, 'x' to exit: ", end="", flush=True)
+            else:
+                print("Ready. Type 'c' to capture, 'x' to exit.")
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            try:
+                loop.add_signal_handler(sig, commands.put_nowait, None)
+            except (NotImplementedError, RuntimeError):
+                pass  # Windows event loops have no signal handlers
+        loads = _start_load(
+            stations, sources, lambda st: _on_loop(loop, trigger, st),
+            (lambda: loop.call_soon_threadsafe(commands.put_nowait, None)) if DAEMON_MODE else None)
+
+        while True:
+            cmd = await commands.get()
+            if cmd is None or cmd == "x":
+                break
+            elif cmd == "c" or cmd.startswith("c "):
+                for st in _stations_for(cmd, stations):
+                    trigger(st)
+            elif cmd:
+                print(f"Unknown command: '{cmd}'")
+
+    except Exception as e:
+        print(f"Error: {e}")
+    finally:
+        for load in loads:
+            await asyncio.to_thread(load.stop)  # waits for its parts, which need the loop
+        if control:
+            control.stop()
+        if modbus_btn:
+            await modbus_btn.stop_polling()
+        if pipelines:
+            print("Draining pipeline...")
+            for pipeline in pipelines.values():
+                await pipeline.stop()
+        if modbus_btn:
+            await modbus_btn.stop()
+        for source in sources.values():
             source.disconnect()
+        if _async_upload_client:
+            await _async_upload_client.close()
+        _close_shared()
 
 
 if __name__ == "__main__":
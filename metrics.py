@@ -0,0 +1,200 @@
+import collections
+import json
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Histogram bucket upper bounds in seconds (Prometheus "le" labels)
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+           1.0, 2.5, 5.0, 10.0, 30.0, float("inf"))
+
+
+def _label_key(labels: dict | None) -> tuple:
+    return tuple(sorted((labels or {}).items()))
+
+
+def _format_labels(key: tuple, extra: tuple = ()) -> str:
+    items = key + extra
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in items) + "}"
+
+
+class Histogram:
+    """Cumulative buckets for export plus a recent-sample window for percentiles."""
+
+    def __init__(self, window: int = 2048):
+        self.counts  = [0] * len(BUCKETS)
+        self.count   = 0
+        self.sum     = 0.0
+        self.samples = collections.deque(maxlen=window)
+
+    def observe(self, value: float):
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.count += 1
+        self.sum   += value
+        self.samples.append(value)
+
+    def percentiles(self, ps=(50, 90, 99)) -> dict:
+        ordered = sorted(self.samples)
+        if not ordered:
+            return {}
+        return {f"p{p}": ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))] for p in ps}
+
+
+class Metrics:
+    """
+    In-process metrics registry: named histograms (timers) and counters,
+    each with optional labels. Thread-safe and cheap enough to call from
+    every stage of every part.
+
+    Exported as Prometheus text (serve_http) and, if an event log is
+    configured, as one JSON object per line (event).
+    """
+
+    def __init__(self):
+        self._lock       = threading.Lock()
+        self._histograms: dict[str, dict[tuple, Histogram]] = collections.defaultdict(dict)
+        self._counters: dict[str, dict[tuple, float]] = collections.defaultdict(dict)
+        self._help: dict[str, str] = {}
+        self._log        = None
+        self._log_lock   = threading.Lock()
+        self._server: ThreadingHTTPServer | None = None
+
+    # ── Recording ─────────────────────────────────────────────────────────────
+
+    def observe(self, name: str, seconds: float, labels: dict | None = None, help: str = ""):
+        key = _label_key(labels)
+        with self._lock:
+            hist = self._histograms[name].get(key)
+            if hist is None:
+                hist = self._histograms[name][key] = Histogram()
+            hist.observe(seconds)
+            if help:
+                self._help.setdefault(name, help)
+
+    @contextmanager
+    def timer(self, name: str, labels: dict | None = None, help: str = ""):
+        """with metrics.timer("upload_http_seconds"): ..."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, labels, help)
+
+    def inc(self, name: str, labels: dict | None = None, amount: float = 1, help: str = ""):
+        key = _label_key(labels)
+        with self._lock:
+            self._counters[name][key] = self._counters[name].get(key, 0) + amount
+            if help:
+                self._help.setdefault(name, help)
+
+    # ── JSONL event log ───────────────────────────────────────────────────────
+
+    def open_event_log(self, path: str):
+        with self._log_lock:
+            if self._log:
+                self._log.close()
+            self._log = open(path, "a", encoding="utf-8", buffering=1)
+
+    def event(self, kind: str, **fields):
+        """Append one event to the JSONL log (no-op when no log is open)."""
+        if self._log is None:
+            return
+        record = {"ts": time.time(), "event": kind, **fields}
+        line = json.dumps(record, default=str, separators=(",", ":"))
+        with self._log_lock:
+            if self._log:
+                self._log.write(line + "\n")
+
+    # ── Export ────────────────────────────────────────────────────────────────
+
+    def snapshot(self) -> dict:
+        """Counters and timer percentiles (seconds) as plain dicts."""
+        with self._lock:
+            timers = {
+                name + _format_labels(key): {"count": h.count, "sum": h.sum, **h.percentiles()}
+                for name, series in self._histograms.items() for key, h in series.items()
+            }
+            counters = {
+                name + _format_labels(key): value
+                for name, series in self._counters.items() for key, value in series.items()
+            }
+        return {"timers": timers, "counters": counters}
+
+    def prometheus_text(self) -> str:
+        lines = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                metric = name if name.endswith("_total") else name + "_total"
+                if name in self._help:
+                    lines.append(f"# HELP {metric} {self._help[name]}")
+                lines.append(f"# TYPE {metric} counter")
+                for key, value in series.items():
+                    lines.append(f"{metric}{_format_labels(key)} {value:g}")
+
+            for name, series in sorted(self._histograms.items()):
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} histogram")
+                for key, h in series.items():
+                    cumulative = 0
+                    for bound, count in zip(BUCKETS, h.counts):
+                        cumulative += count
+                        le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                        lines.append(f"{name}_bucket{_format_labels(key, (('le', le),))} {cumulative}")
+                    lines.append(f"{name}_sum{_format_labels(key)} {h.sum:.6f}")
+                    lines.append(f"{name}_count{_format_labels(key)} {h.count}")
+
+                # Percentiles over the recent-sample window, as a separate gauge family
+                lines.append(f"# TYPE {name}_recent gauge")
+                for key, h in series.items():
+                    for p, value in h.percentiles().items():
+                        quantile = f"0.{p[1:]}"
+                        lines.append(f"{name}_recent{_format_labels(key, (('quantile', quantile),))}"
+                                     f" {value:.6f}")
+        return "\n".join(lines) + "\n"
+
+    def serve_http(self, port: int, host: str = "127.0.0.1"):
+        """Serve /metrics (Prometheus text) and /metrics.json on a background thread."""
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.startswith("/metrics.json"):
+                    body, ctype = json.dumps(registry.snapshot()).encode(), "application/json"
+                elif self.path.startswith("/metrics"):
+                    body, ctype = registry.prometheus_text().encode(), "text/plain; version=0.0.4"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", ctype)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self._server.serve_forever, daemon=True,
+                         name="metrics-http").start()
+        print(f"Metrics: http://{host}:{port}/metrics")
+
+    def close(self):
+        if self._server:
+            self._server.shutdown()
+            self._server = None
+        with self._log_lock:
+            if self._log:
+                self._log.close()
+                self._log = None
+
+
+# Process-wide registry shared by all modules
+metrics = Metrics()
@@ -1,20 +1,56 @@
+import asyncio
+import collections
+import itertools
+import queue
 import threading
 import time
-from pymodbus.client import ModbusTcpClient
+from pymodbus.client import AsyncModbusTcpClient, ModbusTcpClient
 
+from metrics import metrics
 
-class ModbusButton:
-    """
-    Polls a single discrete input or coil on a Modbus TCP device and fires
-    an on_press callback on a rising edge (False → True transition).
 
-    Also exposes write_result() to drive 3 output coils (Y0/Y1/Y2) based on
-    the inspection outcome — only the active coil is ON, the others are reset.
+class TriggerEvent:
+    """A debounced rising edge, timestamped when the poll that saw it returned."""
 
-    Designed for Mitsubishi FX5U PLCs (Modbus TCP server on port 502):
-      - Button input : X0 (IN 0) → discrete input address 0
-      - Result output: Y0=NA, Y1=Pass, Y2=Fail (coil addresses 0, 1, 2)
-    Reconnects automatically if the PLC drops the connection.
+    def __init__(self, sequence: int, timestamp: float, address: int):
+        self.sequence  = sequence
+        self.timestamp = timestamp    # time.monotonic()
+        self.wall_time = time.time()
+        self.address   = address
+
+    def __repr__(self):
+        return f"TriggerEvent(#{self.sequence}, input {self.address})"
+
+
+_RESULT_LABELS = {0: "NA", 1: "Pass", 2: "Fail"}
+
+
+def _result_coils(value: int | None) -> list[bool]:
+    """Y0..Y2 pattern for a result value; None = all off (pulse reset)."""
+    coils = [False, False, False]
+    if value is not None:
+        coils[value] = True
+    return coils
+
+
+def _log_write(result, start_address: int, value: int | None, elapsed: float):
+    metrics.observe("modbus_write_seconds", elapsed, help="write_result FC15 round trip")
+    if result.isError():
+        print(f"Modbus write error: {result}")
+    elif value is None:
+        print(f"Modbus output: Y{start_address}..Y{start_address + 2} OFF (pulse end)")
+    else:
+        print(f"Modbus output: Y{start_address + value} ON  "
+              f"({_RESULT_LABELS[value]}, Y{start_address}..Y{start_address + 2}"
+              f" = {[int(b) for b in _result_coils(value)]})")
+
+
+class _ButtonBase:
+    """
+    What the threaded and the asyncio button share: settings, debounced
+    edge detection, adaptive poll interval, trigger → capture latency and
+    the coalescing result-write queue. The I/O itself lives in the
+    subclasses, each with its own (sync or async) connection.
     """
 
     def __init__(
@@ -25,72 +61,250 @@ class ModbusButton:
         unit: int = 1,
         use_coil: bool = False,
         poll_interval: float = 0.1,
+        fast_poll_interval: float = 0.005,
+        fast_poll_window: float = 2.0,
+        debounce: float = 0.02,
+        addresses: list[int] | None = None,
+        pulse: float = 0.0,
     ):
         self.host          = host
         self.port          = port
         self.address       = address
+        self.addresses     = sorted(set(addresses)) if addresses else [address]
         self.unit          = unit
         self.use_coil      = use_coil
-        self.poll_interval = poll_interval
-        self.on_press: callable = None
+        self.poll_interval      = poll_interval
+        self.fast_poll_interval = min(fast_poll_interval, poll_interval)
+        self.fast_poll_window   = fast_poll_window
+        self.debounce           = debounce
+        self.pulse              = pulse  # seconds result coils stay ON (0 = latched)
+        self.on_press: callable = None  # on_press(event: TriggerEvent)
+
+        self._polling     = threading.Event()  # set while the inputs are watched
+        self._write_lock  = threading.Lock()
+        self._writes: dict[int, int] = {}    # start_address → result value, latest wins
+        self._resets: dict[int, float] = {}  # start_address → monotonic() to switch off
+        self._last_state  = {a: False for a in self.addresses}
+        self._events: queue.Queue[TriggerEvent | None] = queue.Queue()
+        self._sequence    = itertools.count(1)
+        self._latencies   = collections.deque(maxlen=1000)  # trigger → capture, seconds
+        self._reset_edges()
+
+    def get_event(self, timeout: float | None = None) -> TriggerEvent | None:
+        """Pull the next edge (for consumers that don't use on_press)."""
+        try:
+            return self._events.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def record_capture(self, event: TriggerEvent) -> float:
+        """Record that `event` has been captured; returns trigger → capture latency (s)."""
+        latency = time.monotonic() - event.timestamp
+        self._latencies.append(latency)
+        metrics.observe("trigger_to_capture_seconds", latency,
+                        help="Modbus edge detected → frame captured")
+        return latency
 
+    def latency_stats(self) -> dict:
+        """Trigger → capture latency percentiles (ms) over the last 1000 captures."""
+        samples = sorted(self._latencies)
+        if not samples:
+            return {"count": 0}
+
+        def pct(p):
+            return samples[min(len(samples) - 1, int(p / 100 * len(samples)))] * 1000
+
+        return {"count": len(samples), "p50": pct(50), "p95": pct(95),
+                "p99": pct(99), "max": samples[-1] * 1000}
+
+    # ── Result writes ─────────────────────────────────────────────────────────
+
+    def _queue_write(self, start_address: int, value: int):
+        with self._write_lock:
+            if start_address in self._writes:
+                metrics.inc("modbus_writes_coalesced",
+                            help="Result writes replaced by a newer one before being sent")
+            self._writes[start_address] = value
+
+    def _take_writes(self, end_pulses: bool = False) -> list[tuple[int, int | None]]:
+        """Queued results plus due pulse ends (all of them with end_pulses), to send now."""
+        now = time.monotonic()
+        with self._write_lock:
+            writes, self._writes = self._writes, {}
+            due = [a for a, at in self._resets.items() if end_pulses or at <= now or a in writes]
+            for address in due:
+                del self._resets[address]
+        # A new result rewrites all three coils, so it replaces a pending pulse end
+        return [(a, None) for a in due if a not in writes] + list(writes.items())
+
+    def _requeue(self, batch: list[tuple[int, int | None]]):
+        """Writes that did not go out: retry after the reconnect, unless superseded."""
+        now = time.monotonic()
+        with self._write_lock:
+            for address, value in batch:
+                if value is None:
+                    self._resets.setdefault(address, now)
+                else:
+                    self._writes.setdefault(address, value)
+        metrics.inc("modbus_write_retries")
+
+    def _written(self, start_address: int, value: int | None, result):
+        if value is not None and self.pulse > 0 and not result.isError():
+            with self._write_lock:
+                self._resets[start_address] = time.monotonic() + self.pulse
+
+    def _next_reset(self) -> float | None:
+        with self._write_lock:
+            return min(self._resets.values()) if self._resets else None
+
+    # ── Edges ─────────────────────────────────────────────────────────────────
+
+    def _detect_edges(self, states: dict[int, bool], now: float):
+        """Debounced rising edges in `states` → TriggerEvents on the queue."""
+        for address, state in states.items():
+            was = self._last_state[address]
+            if state and not was:
+                since = self._low_since[address]
+                if since is not None and now - since >= self.debounce:
+                    self._last_edge = now
+                    self._events.put(TriggerEvent(next(self._sequence), now, address))
+                self._low_since[address] = None
+            elif not state and was:
+                self._low_since[address] = now
+            self._last_state[address] = state
+
+    def _next_interval(self, interval: float, now: float) -> float:
+        # Adaptive polling: fast right after an edge, backing off while idle
+        if now - self._last_edge < self.fast_poll_window:
+            return self.fast_poll_interval
+        return min(self.poll_interval, interval * 1.5)
+
+    def _reset_edges(self):
+        self._last_edge = float("-inf")
+        # Start of the current stable low period per input (None while high)
+        self._low_since = {a: time.monotonic() for a in self.addresses}
+
+
+class ModbusButton(_ButtonBase):
+    """
+    Polls one or more discrete inputs or coils on a Modbus TCP device and
+    fires an on_press callback on a rising edge (False → True transition).
+    Several inputs (`addresses`, one per station) are read with a single
+    block read (FC2, or FC1 for coils) per poll cycle.
+
+    Also exposes write_result() to drive 3 output coils (Y0/Y1/Y2) based on
+    the inspection outcome — only the active coil is ON, the others are reset.
+    With `pulse` > 0 the coils are switched off again after `pulse` seconds
+    instead of staying latched until the next part.
+
+    One Modbus I/O thread owns the connection: it polls the inputs, sends
+    the queued result writes between polls and is the only one that
+    reconnects. write_result() just queues the write and returns, so the
+    caller never waits for the PLC. A write that has not gone out yet is
+    replaced by a newer one for the same coils (coalesced).
+
+    Edges are timestamped with time.monotonic(), debounced (a rising edge
+    only counts if the input was low for at least `debounce` seconds) and
+    put on a queue; a dispatcher thread calls on_press(event), so a slow
+    callback never stalls polling and no edge is lost. The poll interval
+    drops to `fast_poll_interval` for `fast_poll_window` seconds after an
+    edge and then backs off towards `poll_interval` while idle.
+
+    Designed for Mitsubishi FX5U PLCs (Modbus TCP server on port 502):
+      - Button input : X0 (IN 0) → discrete input address 0
+      - Result output: Y0=NA, Y1=Pass, Y2=Fail (coil addresses 0, 1, 2)
+    Reconnects automatically if the PLC drops the connection.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
         self._client: ModbusTcpClient | None = None
-        self._thread: threading.Thread | None = None
-        self._stop_event  = threading.Event()
-        self._last_state  = False
+        self._thread: threading.Thread | None = None  # Modbus I/O; sole user of _client
+        self._dispatch_thread: threading.Thread | None = None
+        self._stop_event  = threading.Event()  # ends the I/O thread
+        self._wake        = threading.Event()  # a write was queued
 
     def connect(self):
         self._client = ModbusTcpClient(self.host, port=self.port, timeout=2)
         if not self._client.connect():
             raise ConnectionError(f"Cannot connect to Modbus device at {self.host}:{self.port}")
+        inputs = ", ".join(f"#{a}" for a in self.addresses)
         print(f"Modbus connected: {self.host}:{self.port} "
-              f"({'coil' if self.use_coil else 'discrete input'} #{self.address})")
+              f"({'coil' if self.use_coil else 'discrete input'} {inputs})")
 
     def start(self):
-        if self._thread and self._thread.is_alive():
-            return
-        self._stop_event.clear()
-        self._thread = threading.Thread(target=self._poll_loop, daemon=True)
-        self._thread.start()
+        self._polling.set()
+        self._start_io()
+        if callable(self.on_press) and not (self._dispatch_thread
+                                            and self._dispatch_thread.is_alive()):
+            self._dispatch_thread = threading.Thread(target=self._dispatch_loop, daemon=True)
+            self._dispatch_thread.start()
+
+    def _start_io(self):
+        with self._write_lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._io_loop, daemon=True, name="modbus-io")
+            self._thread.start()
+
+    def stop_polling(self):
+        """Stop watching the button; the I/O thread keeps sending result writes."""
+        self._polling.clear()
+        self._wake.set()
+        if self._dispatch_thread:
+            self._events.put(None)
+            self._dispatch_thread.join(timeout=2)
+            self._dispatch_thread = None
 
     def stop(self):
-        self._stop_event.set()
+        """Send queued writes (and due pulse ends), then close the connection."""
+        self.stop_polling()
         if self._thread:
-            self._thread.join(timeout=2)
+            self._stop_event.set()
+            self._wake.set()
+            self._thread.join(timeout=2 + self.pulse)
+            self._thread = None
         if self._client:
             self._client.close()
         print("Modbus disconnected.")
 
     def write_result(self, start_address: int, value: int):
         """
-        Write inspection result to 3 output coils (FC15).
+        Queue the inspection result for the 3 output coils (FC15) and return.
         Exactly one coil at (start_address + value) is turned ON; the rest OFF.
           value=0 (NA)   → Y0=ON,  Y1=OFF, Y2=OFF
           value=1 (Pass) → Y0=OFF, Y1=ON,  Y2=OFF
           value=2 (Fail) → Y0=OFF, Y1=OFF, Y2=ON
         """
-        coils = [False, False, False]
-        coils[value] = True
-        labels = {0: "NA", 1: "Pass", 2: "Fail"}
+        self._queue_write(start_address, value)
+        self._start_io()
+        self._wake.set()
 
-        for attempt in range(2):
-            try:
-                result = self._client.write_coils(start_address, coils)
-                if result.isError():
-                    print(f"Modbus write error: {result}")
-                else:
-                    print(f"Modbus output: Y{start_address + value} ON  "
-                          f"({labels[value]}, Y{start_address}..Y{start_address + 2}"
-                          f" = {[int(b) for b in coils]})")
-                return
-            except Exception as e:
-                if attempt == 0:
-                    print(f"Modbus write failed ({e}), reconnecting...")
-                    self._reconnect()
-                else:
-                    print(f"Modbus write failed after reconnect: {e}")
+    def _flush_writes(self) -> bool:
+        """Send queued results and due pulse ends (I/O thread). False if the link failed."""
+        batch = self._take_writes()
+        for n, (address, value) in enumerate(batch):
+            if not self._write_coils(address, value):
+                self._requeue(batch[n:])
+                return False
+        return True
+
+    def _write_coils(self, start_address: int, value: int | None) -> bool:
+        try:
+            started = time.perf_counter()
+            result  = self._client.write_coils(start_address, _result_coils(value))
+        except Exception as e:
+            metrics.inc("modbus_write_errors")
+            print(f"Modbus write failed ({e}), retrying after reconnect...")
+            return False
+        _log_write(result, start_address, value, time.perf_counter() - started)
+        self._written(start_address, value, result)
+        return True
 
     def _reconnect(self) -> bool:
+        metrics.inc("modbus_reconnects", help="Modbus TCP reconnect attempts")
+        metrics.event("reconnect", device="modbus", host=self.host)
         try:
             if self._client:
                 self._client.close()
@@ -103,33 +317,260 @@ class ModbusButton:
             print(f"Modbus reconnect failed: {e}")
             return False
 
-    def _read_state(self) -> bool | None:
+    def _read_state(self) -> dict[int, bool] | None:
+        """Read all watched inputs with one block request; None on failure."""
+        first = self.addresses[0]
+        count = self.addresses[-1] - first + 1
         try:
             if self.use_coil:
-                result = self._client.read_coils(self.address, count=1)
+                result = self._client.read_coils(first, count=count)
             else:
-                result = self._client.read_discrete_inputs(self.address, count=1)
+                result = self._client.read_discrete_inputs(first, count=count)
             if result.isError():
                 return None
-            return bool(result.bits[0])
+            return {a: bool(result.bits[a - first]) for a in self.addresses}
         except Exception:
             return None
 
-    def _poll_loop(self):
+    def _dispatch_loop(self):
+        while True:
+            event = self._events.get()
+            if event is None:
+                return
+            try:
+                self.on_press(event)
+            except Exception as e:
+                print(f"Modbus on_press callback failed: {e}")
+
+    def _io_loop(self):
+        interval = self.poll_interval
+        polling  = False
+
         while not self._stop_event.is_set():
-            state = self._read_state()
+            started = time.monotonic()
+            # Clear before flushing: a write queued from here on sets it again
+            # and cuts the wait below short
+            self._wake.clear()
+            ok = self._flush_writes()
+
+            if ok and self._polling.is_set():
+                if not polling:
+                    self._reset_edges()
+                    interval, polling = self.poll_interval, True
+                states = self._read_state()
+                now    = time.monotonic()
+                if states is None:
+                    ok = False
+                else:
+                    self._detect_edges(states, now)
+                    interval = self._next_interval(interval, now)
+            elif not self._polling.is_set():
+                polling, interval = False, 1.0  # writes only: sleep until woken
 
-            if state is None:
+            if not ok:
                 print("Modbus connection lost, reconnecting...")
                 while not self._stop_event.is_set():
                     if self._reconnect():
                         break
-                    time.sleep(1.0)
+                    self._stop_event.wait(1.0)
+                continue
+
+            wait = interval - (time.monotonic() - started)
+            reset_at = self._next_reset()
+            if reset_at is not None:
+                wait = min(wait, reset_at - time.monotonic())
+            self._wake.wait(max(0.0, wait))
+
+        # Shutting down: send what is queued and let running pulses finish
+        deadline = time.monotonic() + self.pulse + 1.0
+        while self._flush_writes() and self._resets and time.monotonic() < deadline:
+            time.sleep(max(0.0, (self._next_reset() or 0.0) - time.monotonic()))
+
+
+class AsyncModbusButton(_ButtonBase):
+    """
+    asyncio counterpart of ModbusButton for the async run mode, with the
+    same edge detection, debounce, adaptive polling and coalesced result
+    writes. It is not a ModbusButton: connect(), write_result(),
+    stop_polling() and stop() are coroutines, and everything runs on the
+    event loop over pymodbus's AsyncModbusTcpClient.
+
+    A poll task watches the inputs and calls on_press(event) directly on
+    the loop, so on_press must not block (submitting to an AsyncPipeline
+    is fine). write_result() only queues the write; a writer task sends
+    queued results and pulse ends, and a result that has not gone out yet
+    is replaced by a newer one for the same coils. Both tasks share the
+    one connection, serialised by an asyncio.Lock.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._client: AsyncModbusTcpClient | None = None
+        self._aio_lock: asyncio.Lock | None = None
+        self._task: asyncio.Task | None = None
+        self._writer_task: asyncio.Task | None = None
+        self._wake_async: asyncio.Event | None = None
+        self._stopping   = False
+        self._generation = 0  # bumped by every successful reconnect
+
+    async def connect(self):
+        self._aio_lock   = asyncio.Lock()
+        self._wake_async = asyncio.Event()
+        self._client     = AsyncModbusTcpClient(self.host, port=self.port, timeout=2)
+        if not await self._client.connect():
+            raise ConnectionError(f"Cannot connect to Modbus device at {self.host}:{self.port}")
+        inputs = ", ".join(f"#{a}" for a in self.addresses)
+        print(f"Modbus connected (async): {self.host}:{self.port} "
+              f"({'coil' if self.use_coil else 'discrete input'} {inputs})")
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._polling.set()
+            self._task = asyncio.get_running_loop().create_task(self._poll())
+        self._start_writer()
+
+    def _start_writer(self):
+        if self._writer_task is None or self._writer_task.done():
+            self._stopping = False
+            self._writer_task = asyncio.get_running_loop().create_task(self._write_loop())
+
+    async def stop_polling(self):
+        if self._task:
+            # pymodbus can turn a cancel inside a pending read into a plain
+            # error; the flag makes the loop exit even then
+            self._polling.clear()
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def stop(self):
+        """Send queued writes, end running pulses now, then close the connection."""
+        await self.stop_polling()
+        if self._writer_task:
+            self._stopping = True
+            self._wake_async.set()
+            try:
+                await asyncio.wait_for(self._writer_task, timeout=2)
+            except (asyncio.TimeoutError, asyncio.CancelledError):
+                print("Modbus writer did not finish, queued results were not sent")
+            self._writer_task = None
+        if self._client:
+            self._client.close()
+        print("Modbus disconnected.")
+
+    async def write_result(self, start_address: int, value: int):
+        """Queue the result (same coil pattern as ModbusButton.write_result) and return."""
+        self._queue_write(start_address, value)
+        self._start_writer()
+        self._wake_async.set()
+
+    # ── Writer task ───────────────────────────────────────────────────────────
+
+    async def _write_loop(self):
+        while True:
+            self._wake_async.clear()
+            batch = self._take_writes(end_pulses=self._stopping)
+            for n, (address, value) in enumerate(batch):
+                generation = self._generation
+                if not await self._write(address, value):
+                    self._requeue(batch[n:])
+                    if self._stopping:
+                        return
+                    await self._reconnect_async(generation)
+                    await asyncio.sleep(0.1 if self._generation != generation else 1.0)
+                    break
+            else:
+                if self._stopping:
+                    return
+
+            reset_at = self._next_reset()
+            timeout  = None if reset_at is None else max(0.0, reset_at - time.monotonic())
+            if self._writes:
+                continue
+            try:
+                await asyncio.wait_for(self._wake_async.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _write(self, start_address: int, value: int | None) -> bool:
+        try:
+            started = time.perf_counter()
+            async with self._aio_lock:
+                result = await self._client.write_coils(start_address, _result_coils(value))
+        except Exception as e:
+            metrics.inc("modbus_write_errors")
+            print(f"Modbus write failed ({e}), retrying after reconnect...")
+            return False
+        _log_write(result, start_address, value, time.perf_counter() - started)
+        self._written(start_address, value, result)
+        return True
+
+    async def _reconnect_async(self, generation: int) -> bool:
+        """Reconnect, unless the other task already did since `generation` was read."""
+        async with self._aio_lock:
+            if self._generation != generation:
+                return True
+            metrics.inc("modbus_reconnects", help="Modbus TCP reconnect attempts")
+            metrics.event("reconnect", device="modbus", host=self.host)
+            try:
+                if self._client:
+                    self._client.close()
+                self._client = AsyncModbusTcpClient(self.host, port=self.port, timeout=2)
+                ok = await self._client.connect()
+                if ok:
+                    self._generation += 1
+                    print(f"Modbus reconnected: {self.host}:{self.port}")
+                return ok
+            except Exception as e:
+                print(f"Modbus reconnect failed: {e}")
+                return False
+
+    # ── Poll task ─────────────────────────────────────────────────────────────
+
+    async def _read_state_async(self) -> dict[int, bool] | None:
+        first = self.addresses[0]
+        count = self.addresses[-1] - first + 1
+        try:
+            async with self._aio_lock:
+                if self.use_coil:
+                    result = await self._client.read_coils(first, count=count)
+                else:
+                    result = await self._client.read_discrete_inputs(first, count=count)
+            if result.isError():
+                return None
+            return {a: bool(result.bits[a - first]) for a in self.addresses}
+        except Exception:
+            return None
+
+    async def _poll(self):
+        interval = self.poll_interval
+        self._reset_edges()
+
+        while self._polling.is_set():
+            started    = time.monotonic()
+            generation = self._generation
+            states     = await self._read_state_async()
+            now        = time.monotonic()
+
+            if states is None:
+                if not self._polling.is_set():
+                    return
+                print("Modbus connection lost, reconnecting...")
+                while not await self._reconnect_async(generation):
+                    if not self._polling.is_set():
+                        return
+                    await asyncio.sleep(1.0)
                 continue
 
-            if state and not self._last_state:
-                if callable(self.on_press):
-                    self.on_press()
+            self._detect_edges(states, now)
+            while callable(self.on_press) and not self._events.empty():
+                try:
+                    self.on_press(self._events.get_nowait())
+                except Exception as e:
+                    print(f"Modbus on_press callback failed: {e}")
 
-            self._last_state = state
-            time.sleep(self.poll_interval)
+            interval = self._next_interval(interval, now)
+            await asyncio.sleep(max(0.0, interval - (time.monotonic() - started)))
@@ -0,0 +1,327 @@
+import asyncio
+import inspect
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import metrics
+
+
+class Part:
+    """
+    One physical part moving through the pipeline.
+
+    Everything a later stage needs travels with the part (frame, encoded
+    bytes, result, output address), so the PLC result is always written for
+    the part that was actually captured — never for whichever part happens
+    to be in the camera when the API answers.
+    """
+
+    def __init__(self, output_address: int = 0, trigger_time: float | None = None,
+                 trigger_event=None, station: str | None = None):
+        self.part_id: int = 0  # assigned by Pipeline.submit()
+        self.capture_id: int = 0  # unique across runs, assigned at capture (catalog.py)
+        self.station        = station
+        self.trigger_time   = trigger_time if trigger_time is not None else time.time()
+        self.trigger_event  = trigger_event  # modbus_button.TriggerEvent, if PLC-triggered
+        self.output_address = output_address
+        self.frame          = None  # source_base.Frame
+        self.source_id: str | None = None
+        self.name: str | None = None  # file stem, e.g. capture_20250101-120000-123456
+        self.image_data: bytes | None = None  # upload copy
+        self.burst_frames: list = []  # extra burst frames to upload with the best one
+        self.extra_images: list[tuple[str, bytes]] = []  # their encoded (filename, bytes)
+        self.filename: str | None = None
+        self.mime: str | None = None
+        self.archive_data: bytes | None = None  # local copy (may use another encoder)
+        self.archive_filename: str | None = None  # relative to the archive root
+        self.archive_bytes: int | None = None  # set once queued for the archive
+        self.overall_result: str | None = None
+        self.idempotency_key: str | None = None
+        self.spooled = False  # upload deferred to the store-and-forward spool
+        self.duplicate_of: "Part | None" = None  # earlier part with the same picture
+        self.dedupe: str | None = None  # tag | skip | cache, set with duplicate_of
+        self.error: str | None = None
+        self.stage_times: dict[str, float] = {}
+        self.done = threading.Event()
+
+    def __repr__(self):
+        return f"Part(#{self.part_id}, result={self.overall_result}, error={self.error})"
+
+
+class Stage:
+    """
+    A pipeline step: func(part) is called by `workers` threads.
+    In an AsyncPipeline, func may also be a coroutine function; `workers`
+    then caps how many parts are inside the stage at once.
+
+    ordered=True forces parts through this stage in submission order (one
+    worker, reorder buffer) — used for the PLC write so results reach the
+    output coils in the same order the parts passed the camera.
+    run_on_error=True still calls func for parts that failed upstream.
+    """
+
+    def __init__(self, name: str, func, workers: int = 1, ordered: bool = False,
+                 run_on_error: bool = False):
+        self.name         = name
+        self.func         = func
+        self.workers      = 1 if ordered else max(1, workers)
+        self.ordered      = ordered
+        self.run_on_error = run_on_error
+
+
+_STOP = object()
+
+
+class Pipeline:
+    """
+    Runs parts through a chain of stages connected by bounded queues.
+
+    Each stage has its own worker threads, so while part N is uploading,
+    part N+1 can already be captured and encoded. Throughput is set by the
+    slowest stage instead of the sum of all stages. A full queue blocks the
+    upstream stage (backpressure); a full input queue drops the trigger.
+    """
+
+    def __init__(self, stages: list[Stage], queue_size: int = 4, on_done=None):
+        self.stages   = stages
+        self.on_done  = on_done
+        self._queues  = [queue.Queue(maxsize=queue_size) for _ in stages]
+        self._threads: list[list[threading.Thread]] = []
+        self._next_id = 1
+        self._submit_lock = threading.Lock()
+        self._running = False
+        self.dropped  = 0
+
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        for idx, stage in enumerate(self.stages):
+            target  = self._ordered_worker if stage.ordered else self._worker
+            threads = [
+                threading.Thread(target=target, args=(idx,), daemon=True,
+                                 name=f"pipeline-{stage.name}-{n}")
+                for n in range(stage.workers)
+            ]
+            for t in threads:
+                t.start()
+            self._threads.append(threads)
+
+    def submit(self, part: Part) -> bool:
+        """Queue a part for processing. Returns False if the pipeline is full."""
+        if not self._running:
+            raise RuntimeError("Pipeline not started")
+        with self._submit_lock:
+            # Ids are only consumed by accepted parts, so ordered stages never
+            # wait for a part that was dropped here.
+            part.part_id = self._next_id
+            try:
+                self._queues[0].put_nowait(part)
+            except queue.Full:
+                self.dropped += 1
+                metrics.inc("pipeline_dropped", {"station": part.station or ""},
+                            help="Triggers dropped because the pipeline was full")
+                metrics.event("drop", part_id=part.part_id, station=part.station, where="pipeline")
+                print(f"[Pipeline] Queue full — part dropped ({self.dropped} total)")
+                return False
+            self._next_id += 1
+            return True
+
+    def pending(self) -> int:
+        return sum(q.qsize() for q in self._queues)
+
+    def stop(self, timeout: float = 30.0):
+        """Drain in-flight parts stage by stage, then stop all workers."""
+        if not self._running:
+            return
+        deadline = time.time() + timeout
+        for idx, stage in enumerate(self.stages):
+            try:
+                for _ in range(stage.workers):
+                    self._queues[idx].put(_STOP, timeout=max(0.0, deadline - time.time()))
+            except queue.Full:
+                # A stuck stage with a full input queue: leave its (daemon) workers behind
+                print(f"[Pipeline] Stage {stage.name} did not drain within {timeout:g}s — "
+                      f"giving up on {self.pending()} queued part(s)")
+                break
+            for t in self._threads[idx]:
+                t.join(timeout=max(0.0, deadline - time.time()))
+        self._threads.clear()
+        self._running = False
+
+    # ── Workers ───────────────────────────────────────────────────────────────
+
+    def _run_stage(self, idx: int, part: Part):
+        stage = self.stages[idx]
+        if part.error is None or stage.run_on_error:
+            t = time.perf_counter()
+            try:
+                stage.func(part)
+            except Exception as e:
+                if part.error is None:
+                    part.error = f"{stage.name}: {e}"
+                metrics.inc("stage_errors", {"stage": stage.name})
+                print(f"[Pipeline] Part #{part.part_id} failed at {stage.name}: {e}")
+            elapsed = time.perf_counter() - t
+            part.stage_times[stage.name] = elapsed
+            metrics.observe("stage_seconds", elapsed, {"stage": stage.name},
+                            help="Time spent in each pipeline stage")
+
+        if idx + 1 < len(self.stages):
+            self._queues[idx + 1].put(part)
+        else:
+            part.done.set()
+            if callable(self.on_done):
+                try:
+                    self.on_done(part)
+                except Exception as e:
+                    print(f"[Pipeline] on_done callback failed: {e}")
+
+    def _worker(self, idx: int):
+        q = self._queues[idx]
+        while True:
+            part = q.get()
+            if part is _STOP:
+                return
+            self._run_stage(idx, part)
+
+    def _ordered_worker(self, idx: int):
+        q        = self._queues[idx]
+        held     = {}
+        next_id  = 1
+        while True:
+            part = q.get()
+            if part is _STOP:
+                # Flush whatever is left, in order, even if there are gaps
+                for pid in sorted(held):
+                    self._run_stage(idx, held[pid])
+                return
+            held[part.part_id] = part
+            while next_id in held:
+                self._run_stage(idx, held.pop(next_id))
+                next_id += 1
+
+
+class AsyncPipeline:
+    """
+    asyncio version of Pipeline: the same stages, ordering and drop rules,
+    with one task per in-flight part instead of threads per stage.
+
+    Coroutine stages (uploads, PLC writes) run on the event loop; plain
+    functions (camera reads, encodes) run on a per-stage thread pool of
+    `workers` threads so they never block the loop. At most
+    `max_in_flight` parts are in the pipeline at once; submit() drops the
+    trigger beyond that. Ordered stages admit parts strictly by part_id.
+    """
+
+    def __init__(self, stages: list[Stage], max_in_flight: int = 8, on_done=None):
+        self.stages        = stages
+        self.on_done       = on_done
+        self.max_in_flight = max(1, max_in_flight)
+        self.dropped       = 0
+        self._next_id      = 1
+        self._tasks: set[asyncio.Task] = set()
+        self._executors: dict[str, ThreadPoolExecutor] = {}
+        self._limits: dict[str, asyncio.Semaphore] = {}
+        self._turns: dict[str, asyncio.Condition] = {}
+        self._next_turn: dict[str, int] = {}
+        self._running = False
+
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        for stage in self.stages:
+            if stage.ordered:
+                self._turns[stage.name]     = asyncio.Condition()
+                self._next_turn[stage.name] = 1
+            elif inspect.iscoroutinefunction(stage.func):
+                self._limits[stage.name] = asyncio.Semaphore(stage.workers)
+            if not inspect.iscoroutinefunction(stage.func):
+                self._executors[stage.name] = ThreadPoolExecutor(
+                    max_workers=stage.workers, thread_name_prefix=f"pipeline-{stage.name}")
+
+    def submit(self, part: Part) -> bool:
+        """Start processing a part (call from the loop). False if the pipeline is full."""
+        if not self._running:
+            raise RuntimeError("Pipeline not started")
+        if len(self._tasks) >= self.max_in_flight:
+            self.dropped += 1
+            metrics.inc("pipeline_dropped", {"station": part.station or ""},
+                        help="Triggers dropped because the pipeline was full")
+            metrics.event("drop", part_id=self._next_id, station=part.station, where="pipeline")
+            print(f"[Pipeline] Queue full — part dropped ({self.dropped} total)")
+            return False
+        part.part_id = self._next_id
+        self._next_id += 1
+        task = asyncio.get_running_loop().create_task(self._run(part))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return True
+
+    def pending(self) -> int:
+        return len(self._tasks)
+
+    async def stop(self, timeout: float = 30.0):
+        """Wait for in-flight parts, cancel stragglers and release the thread pools."""
+        if not self._running:
+            return
+        if self._tasks:
+            _, late = await asyncio.wait(set(self._tasks), timeout=timeout)
+            for task in late:
+                task.cancel()
+        for executor in self._executors.values():
+            executor.shutdown(wait=False)
+        self._executors.clear()
+        self._running = False
+
+    # ── Part task ─────────────────────────────────────────────────────────────
+
+    async def _run(self, part: Part):
+        for stage in self.stages:
+            if stage.ordered:
+                await self._run_ordered(stage, part)
+            else:
+                await self._run_stage(stage, part)
+        part.done.set()
+        if callable(self.on_done):
+            try:
+                self.on_done(part)
+            except Exception as e:
+                print(f"[Pipeline] on_done callback failed: {e}")
+
+    async def _run_ordered(self, stage: Stage, part: Part):
+        turn = self._turns[stage.name]
+        async with turn:
+            await turn.wait_for(lambda: self._next_turn[stage.name] == part.part_id)
+        try:
+            await self._run_stage(stage, part)
+        finally:
+            async with turn:
+                self._next_turn[stage.name] += 1
+                turn.notify_all()
+
+    async def _run_stage(self, stage: Stage, part: Part):
+        if part.error is not None and not stage.run_on_error:
+            return
+        t = time.perf_counter()
+        try:
+            if stage.name in self._executors:
+                loop = asyncio.get_running_loop()
+                await loop.run_in_executor(self._executors[stage.name], stage.func, part)
+            elif stage.name in self._limits:
+                async with self._limits[stage.name]:
+                    await stage.func(part)
+            else:
+                await stage.func(part)
+        except Exception as e:
+            if part.error is None:
+                part.error = f"{stage.name}: {e}"
+            metrics.inc("stage_errors", {"stage": stage.name})
+            print(f"[Pipeline] Part #{part.part_id} failed at {stage.name}: {e}")
+        elapsed = time.perf_counter() - t
+        part.stage_times[stage.name] = elapsed
+        metrics.observe("stage_seconds", elapsed, {"stage": stage.name},
+                        help="Time spent in each pipeline stage")
@@ -0,0 +1,136 @@
+"""
+Software region-of-interest and downscaling applied to a frame before it is
+encoded. Works on any source (Baumer, webcam, RTSP) and can differ between
+the upload and the archive copy.
+
+A preprocess spec is a dict (config.json) or the equivalent string (.env):
+
+    {"crop": [x, y, width, height], "scale": 2, "resize": "bin", "gray": true}
+    "crop=x,y,width,height;scale=2;resize=bin;gray"
+    "none"      (full frame, unchanged)
+
+    crop    rectangle in source pixels (clamped to the frame)
+    scale   integer factor (2 = half width/height) for skip/bin, or any
+            factor > 1 for area
+    resize  skip — keep every n-th pixel (zero-copy view, aliasing)
+            bin  — average n×n blocks (default)
+            area — cv2.resize INTER_AREA, any factor
+    gray    convert to single-channel Mono8
+
+Crop and skip are NumPy views of the frame; only bin, area and gray allocate
+(and then only the smaller output).
+"""
+import numpy as np
+
+from source_base import debayer
+
+RESIZE_METHODS = ("skip", "bin", "area")
+
+
+class Preprocess:
+    """A crop / downscale / grayscale recipe, applied with apply(array, pixel_format)."""
+
+    def __init__(self, crop: tuple[int, int, int, int] | None = None, scale: float = 1,
+                 resize: str = "bin", gray: bool = False):
+        if resize not in RESIZE_METHODS:
+            raise ValueError(f"Unknown resize method '{resize}'. Choose from {RESIZE_METHODS}")
+        if scale < 1:
+            raise ValueError(f"scale must be >= 1 (a reduction factor), got {scale}")
+        if resize != "area" and scale != int(scale):
+            raise ValueError(f"resize={resize} needs an integer scale, got {scale}")
+        if crop is not None and (len(crop) != 4 or crop[2] <= 0 or crop[3] <= 0):
+            raise ValueError(f"crop must be [x, y, width, height], got {crop}")
+        self.crop   = tuple(int(v) for v in crop) if crop is not None else None
+        self.scale  = scale
+        self.resize = resize
+        self.gray   = gray
+
+    @property
+    def is_identity(self) -> bool:
+        return self.crop is None and self.scale == 1 and not self.gray
+
+    def apply(self, array: np.ndarray, pixel_format: str) -> tuple[np.ndarray, str]:
+        """Returns (array, pixel_format); the input array is never modified."""
+        if self.is_identity:
+            return array, pixel_format
+
+        if self.crop is not None:
+            array = self._crop(array, pixel_format.startswith("Bayer"))
+
+        if pixel_format.startswith("Bayer") and (self.scale != 1 or self.gray):
+            # Resampling a mosaic mixes colours; demosaic the (cropped) region first
+            array, pixel_format = debayer(array, pixel_format), "BGR8"
+
+        if self.scale != 1:
+            array = self._downscale(array)
+
+        if self.gray and array.ndim == 3:
+            import cv2
+            code  = cv2.COLOR_BGR2GRAY if pixel_format == "BGR8" else cv2.COLOR_RGB2GRAY
+            array = cv2.cvtColor(array, code)
+            pixel_format = "Mono8"
+        return array, pixel_format
+
+    def _crop(self, array: np.ndarray, bayer: bool) -> np.ndarray:
+        x, y, w, h = self.crop
+        height, width = array.shape[:2]
+        if bayer:
+            x, y = x & ~1, y & ~1  # keep the 2x2 colour pattern aligned
+        x0, y0 = min(max(x, 0), width), min(max(y, 0), height)
+        x1, y1 = min(x0 + w, width), min(y0 + h, height)
+        if x1 <= x0 or y1 <= y0:
+            raise ValueError(f"crop {self.crop} is outside the {width}x{height} frame")
+        return array[y0:y1, x0:x1]
+
+    def _downscale(self, array: np.ndarray) -> np.ndarray:
+        if self.resize == "skip":
+            n = int(self.scale)
+            return array[::n, ::n]
+
+        import cv2
+        height, width = array.shape[:2]
+        if self.resize == "bin":
+            # INTER_AREA at an exact integer factor is a plain n×n block average
+            n = int(self.scale)
+            height, width = (height // n) * n, (width // n) * n
+            array = array[:height, :width]
+        size = (max(1, round(width / self.scale)), max(1, round(height / self.scale)))
+        return cv2.resize(array, size, interpolation=cv2.INTER_AREA)  # reads ROI views in place
+
+    def __repr__(self):
+        parts = []
+        if self.crop:
+            parts.append("crop=" + ",".join(map(str, self.crop)))
+        if self.scale != 1:
+            parts.append(f"scale={self.scale:g};resize={self.resize}")
+        if self.gray:
+            parts.append("gray")
+        return f"Preprocess({';'.join(parts) or 'none'})"
+
+
+def build_preprocess(spec: dict | str | None) -> Preprocess:
+    """Build a Preprocess from a config.json dict, a .env string or None (no-op)."""
+    if not spec or (isinstance(spec, str) and spec.strip().lower() == "none"):
+        return Preprocess()
+    if isinstance(spec, str):
+        parsed = {}
+        for item in filter(None, (s.strip() for s in spec.split(";"))):
+            key, _, value = item.partition("=")
+            key = key.strip().lower()
+            if key == "crop":
+                parsed["crop"] = [int(v) for v in value.split(",")]
+            elif key == "scale":
+                parsed["scale"] = float(value)
+            elif key == "resize":
+                parsed["resize"] = value.strip().lower()
+            elif key in ("gray", "grey", "mono"):
+                parsed["gray"] = value.strip().lower() not in ("0", "false", "no")
+            else:
+                raise ValueError(f"Unknown preprocess option '{key}' in '{spec}'")
+        spec = parsed
+    return Preprocess(
+        crop=spec.get("crop"),
+        scale=float(spec.get("scale", 1)),
+        resize=str(spec.get("resize", "bin")).lower(),
+        gray=bool(spec.get("gray", False)),
+    )
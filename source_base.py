@@ -1,14 +1,260 @@
-import io
+import collections
+import itertools
+import threading
 import time
+import numpy as np
 from PIL import Image
 
+
+# OpenCV names Bayer patterns after the 2x2 block starting at row 1 / col 1,
+# so a GenICam "BayerRG8" sensor maps to OpenCV's BayerBG codes.
+_CV2_BAYER = {
+    "BayerRG8": ("COLOR_BayerBG2BGR", "COLOR_BayerBG2BGR_EA"),
+    "BayerGR8": ("COLOR_BayerGB2BGR", "COLOR_BayerGB2BGR_EA"),
+    "BayerGB8": ("COLOR_BayerGR2BGR", "COLOR_BayerGR2BGR_EA"),
+    "BayerBG8": ("COLOR_BayerRG2BGR", "COLOR_BayerRG2BGR_EA"),
+}
+
+# Position of (R, G1, G2, B) inside each 2x2 block as (row, col)
+_BAYER_SITES = {
+    "BayerRG8": ((0, 0), (0, 1), (1, 0), (1, 1)),
+    "BayerGR8": ((0, 1), (0, 0), (1, 1), (1, 0)),
+    "BayerGB8": ((1, 0), (0, 0), (1, 1), (0, 1)),
+    "BayerBG8": ((1, 1), (0, 1), (1, 0), (0, 0)),
+}
+
+
+def debayer(raw: np.ndarray, pixel_format: str, method: str = "bilinear") -> np.ndarray:
+    """
+    Demosaic a single-plane Bayer frame into a BGR8 array.
+
+    bilinear / edge_aware — full resolution via cv2.cvtColor
+    half                  — NumPy 2x2 superpixel: half width/height, no interpolation
+                            (an odd last row/column is dropped)
+    """
+    if pixel_format not in _CV2_BAYER:
+        raise ValueError(f"Not a Bayer pixel format: {pixel_format}")
+    if method == "half":
+        raw = raw[:raw.shape[0] & ~1, :raw.shape[1] & ~1]  # whole 2x2 blocks only
+        r, g1, g2, b = (raw[y::2, x::2] for y, x in _BAYER_SITES[pixel_format])
+        g = ((g1.astype(np.uint16) + g2) >> 1).astype(np.uint8)
+        return np.dstack((b, g, r))
+    import cv2
+    bilinear, edge_aware = _CV2_BAYER[pixel_format]
+    code = getattr(cv2, edge_aware if method == "edge_aware" else bilinear)
+    return cv2.cvtColor(raw, code)
+
+
+class Frame:
+    """
+    A captured frame: the source's ndarray plus metadata, without copying.
+
+    `data` is whatever array the source produced (HxWx3 for RGB8/BGR8,
+    HxW for Mono8 and raw Bayer*8) and must be treated as read-only. `owner` keeps the
+    object that owns the pixel buffer alive (e.g. a neoapi image).
+    PIL conversion only happens if a consumer calls to_pil().
+    """
+
+    def __init__(
+        self,
+        data: np.ndarray,
+        pixel_format: str = "RGB8",
+        timestamp: float | None = None,
+        source_id: str = "",
+        sequence: int = 0,
+        owner=None,
+    ):
+        self.data         = data
+        self.pixel_format = pixel_format
+        self.timestamp    = timestamp if timestamp is not None else time.monotonic()
+        self.source_id    = source_id
+        self.sequence     = sequence
+        self._owner       = owner
+        self._pil: Image.Image | None = None
+
+    @property
+    def width(self) -> int:
+        return self.data.shape[1]
+
+    @property
+    def height(self) -> int:
+        return self.data.shape[0]
+
+    def to_rgb(self) -> np.ndarray:
+        """RGB (or mono) array; a view unless the source delivered BGR or Bayer."""
+        if self.pixel_format in ("BGR8",) or self.pixel_format.startswith("Bayer"):
+            import cv2
+            bgr = (self.data if self.pixel_format == "BGR8"
+                   else debayer(self.data, self.pixel_format))
+            return cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB)
+        return self.data
+
+    def to_pil(self) -> Image.Image:
+        """Lazily build (and cache) a PIL Image for consumers that need one."""
+        if self._pil is None:
+            arr = self.to_rgb()
+            self._pil = Image.fromarray(arr, mode="L" if arr.ndim == 2 else "RGB")
+        return self._pil
+
+    def __repr__(self):
+        return (f"Frame({self.source_id}#{self.sequence}, {self.width}x{self.height} "
+                f"{self.pixel_format})")
+
+
 class ImageSource:
+    """
+    Subclasses implement get_frame() (preferred, zero-copy) or get_image();
+    each has a default built on the other.
+
+    `after` is a time.monotonic() instant (usually the trigger). Sources
+    that buffer frames return the first frame captured after it, waiting if
+    necessary; sources that capture on demand may ignore it.
+    """
+
+    source_id = ""
+    max_burst_frames: int | None = None  # frames one trigger can yield (None = any)
+
     def connect(self):
         raise NotImplementedError
 
-    def get_image(self) -> Image.Image:
+    def get_frame(self, after: float | None = None) -> Frame | None:
+        """Returns the latest frame as a Frame wrapping the source's ndarray"""
+        img = self.get_image(after=after)
+        if img is None:
+            return None
+        arr = np.asarray(img)
+        return Frame(arr, "Mono8" if arr.ndim == 2 else "RGB8",
+                     source_id=self.source_id, sequence=self._next_sequence())
+
+    def get_image(self, after: float | None = None) -> Image.Image:
         """Returns a PIL Image object"""
-        raise NotImplementedError
+        if type(self).get_frame is ImageSource.get_frame:
+            raise NotImplementedError
+        frame = self.get_frame(after=after)
+        return frame.to_pil() if frame is not None else None
 
     def disconnect(self):
         raise NotImplementedError
+
+    def frame_age(self) -> float | None:
+        """Seconds since the source last received a frame; None if it only captures on demand."""
+        return None
+
+    def _next_sequence(self) -> int:
+        counter = self.__dict__.get("_sequence_counter")
+        if counter is None:
+            counter = self.__dict__["_sequence_counter"] = itertools.count(1)
+        return next(counter)
+
+
+class FrameRing:
+    """
+    The last few decoded frames as (monotonic timestamp, sequence, ndarray).
+
+    The grab loop reports every grabbed frame via grabbed(); it only decodes
+    (retrieve) and put()s a frame when some consumer is waiting for one
+    newer than its trigger, so idle streams cost a grab per frame and no
+    colour conversion.
+    """
+
+    def __init__(self, size: int = 4):
+        self._entries = collections.deque(maxlen=max(1, size))
+        self._cond    = threading.Condition()
+        self._waiting: list[float] = []  # `after` of every blocked consumer
+        self.sequence = 0
+        self.last_grab = 0.0
+
+    def grabbed(self, timestamp: float) -> tuple[int, bool]:
+        """Record a grab; returns (sequence, whether a consumer wants it decoded)."""
+        with self._cond:
+            self.sequence += 1
+            self.last_grab = timestamp
+            return self.sequence, any(after < timestamp for after in self._waiting)
+
+    def put(self, timestamp: float, sequence: int, data: np.ndarray):
+        with self._cond:
+            self._entries.append((timestamp, sequence, data))
+            self._cond.notify_all()
+
+    def _first_after(self, after: float):
+        for entry in self._entries:
+            if entry[0] > after:
+                return entry
+        return None
+
+    def wait(self, after: float, timeout: float):
+        """First buffered frame newer than `after`, waiting up to `timeout` s; else None."""
+        with self._cond:
+            entry = self._first_after(after)
+            if entry is not None:
+                return entry
+            self._waiting.append(after)
+            try:
+                self._cond.wait_for(lambda: self._first_after(after) is not None, timeout)
+            finally:
+                self._waiting.remove(after)
+            return self._first_after(after)
+
+    def clear(self):
+        with self._cond:
+            self._entries.clear()
+
+
+class GrabbingSource(ImageSource):
+    """
+    Base for cv2.VideoCapture sources (webcam, RTSP): a background thread
+    calls grab() on every frame so the driver/stream never backs up, and
+    retrieve()s (decodes) only the frames consumers ask for into a FrameRing.
+    get_frame(after=t) returns the first frame grabbed after t.
+    """
+
+    ring_size     = 4
+    frame_timeout = 1.0   # max wait for a fresh frame (s)
+
+    def _start_grabbing(self, cap):
+        self._cap         = cap
+        if getattr(self, "_ring", None) is None:
+            self._ring = FrameRing(self.ring_size)  # kept across reconnects
+        self._grab_stop   = threading.Event()
+        self._grab_thread = threading.Thread(target=self._grab_loop, daemon=True,
+                                             name=f"grab-{self.source_id}")
+        self._grab_thread.start()
+
+    def _stop_grabbing(self):
+        stop, thread = getattr(self, "_grab_stop", None), getattr(self, "_grab_thread", None)
+        if stop:
+            stop.set()
+        if thread:
+            thread.join(timeout=2)
+        self._grab_thread = None
+        if getattr(self, "_ring", None):
+            self._ring.clear()
+
+    def _grab_loop(self):
+        cap = self._cap
+        while not self._grab_stop.is_set() and cap.isOpened():
+            if not cap.grab():
+                time.sleep(0.05)
+                continue
+            now = time.monotonic()
+            sequence, wanted = self._ring.grabbed(now)
+            if wanted:
+                ok, frame = cap.retrieve()
+                if ok and frame is not None:
+                    # retrieve() allocates a new array per frame, so consumers
+                    # can keep earlier ones without copying
+                    self._ring.put(now, sequence, frame)
+
+    def _wait_frame(self, after: float | None, timeout: float | None = None) -> Frame | None:
+        if after is None:
+            after = time.monotonic()
+        entry = self._ring.wait(after, self.frame_timeout if timeout is None else timeout)
+        if entry is None:
+            return None
+        ts, seq, data = entry
+        # OpenCV delivers BGR; conversion is left to the consumer (Frame.to_pil)
+        return Frame(data, "BGR8", timestamp=ts, source_id=self.source_id, sequence=seq)
+
+    def frame_age(self) -> float | None:
+        ring = getattr(self, "_ring", None)
+        return time.monotonic() - ring.last_grab if ring is not None else None
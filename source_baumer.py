@@ -1,9 +1,18 @@
+import collections
 import json
 import os
-import neoapi
-import numpy as np
-from PIL import Image
-from source_base import ImageSource
+import threading
+import time
+from metrics import metrics
+from source_base import Frame, ImageSource, debayer
+
+if os.getenv("BAUMER_FAKE", "false").lower() == "true":
+    import fake_neoapi as neoapi  # simulated camera for testing without hardware
+else:
+    try:
+        import neoapi
+    except ImportError:  # SDK only needed to talk to a camera, not to import this module
+        neoapi = None
 
 CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "config.json")
 
@@ -20,6 +29,25 @@ MEGA_PIXEL_RESOLUTIONS = {
 }
 
 
+# single           — start/stop the stream around every capture (original behaviour)
+# freerun          — stream continuously into a ring buffer, return the next fresh frame
+# software_trigger — stream armed with TriggerMode=On, capture via TriggerSoftware
+# hardware_trigger — stream armed, frames are triggered by the camera's input line
+ACQUISITION_MODES = ("single", "freerun", "software_trigger", "hardware_trigger")
+
+# Camera buffers the driver always has free to fill, on top of the ring and
+# of the frames still held by the pipeline
+DRIVER_BUFFERS = 2
+
+
+# Output pixel formats (config.json baumer.pixel_format.output):
+# RGB8    — neoapi Convert("RGB8") on every frame (original behaviour, 3 bytes/px)
+# Mono8   — 1 byte/px; passthrough when the sensor already delivers Mono8
+# raw     — whatever the sensor delivers (Mono8 or Bayer*8), no conversion at all
+# debayer — transfer raw Bayer, demosaic on the host with OpenCV/NumPy → BGR8
+OUTPUT_PIXEL_FORMATS = ("RGB8", "Mono8", "raw", "debayer")
+
+
 def load_config():
     """Load Baumer camera configuration from config.json."""
     with open(CONFIG_PATH, "r") as f:
@@ -27,11 +55,49 @@ def load_config():
 
 
 class BaumerSource(ImageSource):
-    def __init__(self):
+    def __init__(self, camera_id: str | None = None):
+        """camera_id: model name, serial number or user ID; None = last listed camera."""
         self.camera = None
+        self.camera_id = camera_id
         self.config = load_config()
 
+        acquisition = self.config.get("acquisition", {})
+        self.mode = acquisition.get("mode", "single")
+        if self.mode not in ACQUISITION_MODES:
+            raise ValueError(f"Invalid acquisition mode '{self.mode}'. Available: {ACQUISITION_MODES}")
+        self._timeout_ms = int(acquisition.get("timeout_ms", 1000))
+
+        pixel_format = self.config.get("pixel_format", {})
+        self.output_format = pixel_format.get("output", "RGB8")
+        if self.output_format not in OUTPUT_PIXEL_FORMATS:
+            raise ValueError(f"Invalid pixel_format.output '{self.output_format}'. "
+                             f"Available: {OUTPUT_PIXEL_FORMATS}")
+        self._debayer_method = pixel_format.get("debayer", "bilinear")
+        self._streaming = False
+
+        # Ring of (monotonic arrival time, neoapi image), filled by the grab
+        # thread in freerun and hardware_trigger mode. Ring images and
+        # zero-copy Frames not yet encoded (up to frames_in_flight) each pin a
+        # camera buffer, so the camera gets that many plus DRIVER_BUFFERS.
+        self._ring_size  = max(1, int(acquisition.get("buffer_count", 4)))
+        self._in_flight  = max(0, int(acquisition.get("frames_in_flight", 4)))
+        # hardware_trigger: an image may arrive before its Modbus edge is seen
+        # (up to one poll interval); images older than this are stale pulses
+        self._trigger_skew = float(acquisition.get("trigger_skew_ms", 200)) / 1000
+        self.stale_images  = 0
+        self._ring = collections.deque(maxlen=self._ring_size)
+        self._ring_cond = threading.Condition()
+        self._grab_thread: threading.Thread | None = None
+
+    @property
+    def max_burst_frames(self) -> int | None:
+        # One line pulse exposes one frame; a second grab would only wait
+        # timeout_ms for the next part's pulse
+        return 1 if self.mode == "hardware_trigger" else None
+
     def connect(self):
+        if neoapi is None:
+            raise RuntimeError("Baumer NeoAPI (neoapi) is not installed")
         print("Connecting to Baumer camera...")
 
         infolist = neoapi.CamInfoList.Get()  # Get the info list
@@ -44,12 +110,14 @@ class BaumerSource(ImageSource):
             )  # print a list of all connected cameras with its connection status
 
         self.camera = neoapi.Cam()
-        self.camera.Connect(model)
+        self.camera.Connect(self.camera_id or model)
 
         print("Camera connected?  ", self.camera.IsConnected())
 
-        if self.camera.IsConnected():
-            self._apply_config()
+        if not self.camera.IsConnected():
+            raise RuntimeError(f"Baumer camera '{self.camera_id or model}' not connectable")
+        self._apply_config()
+        self._start_acquisition()
 
         # Read model and serial (your SDK returns them as simple attributes)
         try:
@@ -59,6 +127,7 @@ class BaumerSource(ImageSource):
             model = "UnknownModel"
             serial = "UnknownSerial"
 
+        self.source_id = f"baumer:{serial}"
         print(f"Connected to: {model} ({serial})")
 
     def _apply_config(self):
@@ -90,6 +159,11 @@ class BaumerSource(ImageSource):
             if "y_offset" in img_fmt:
                 self.camera.f.OffsetY.Set(img_fmt["y_offset"])
 
+            # Sensor pixel format (e.g. Mono8 or BayerRG8) — what goes over the wire
+            sensor_format = self.config.get("pixel_format", {}).get("sensor")
+            if sensor_format:
+                self.camera.f.PixelFormat.SetString(sensor_format)
+
             # Brightness / Exposure
             if "exposure_time" in brightness:
                 self.camera.f.ExposureTime.Set(brightness["exposure_time"])
@@ -102,29 +176,177 @@ class BaumerSource(ImageSource):
         except Exception as e:
             print(f"Warning: Could not apply some config settings: {e}")
 
-    def get_image(self) -> Image.Image:
+    def _start_acquisition(self):
+        """Configure trigger/stream settings once and keep the stream running."""
+        if self.mode == "single":
+            return
+        acquisition = self.config.get("acquisition", {})
+        f = self.camera.f
+        try:
+            self.camera.SetImageBufferCount(self._ring_size + self._in_flight + DRIVER_BUFFERS)
+            f.AcquisitionMode.SetString("Continuous")
+            if self.mode == "freerun":
+                f.TriggerMode.SetString("Off")
+                if "frame_rate" in acquisition:
+                    f.AcquisitionFrameRate.Set(float(acquisition["frame_rate"]))
+            else:
+                f.TriggerSelector.SetString("FrameStart")
+                f.TriggerMode.SetString("On")
+                if self.mode == "software_trigger":
+                    f.TriggerSource.SetString("Software")
+                else:
+                    f.TriggerSource.SetString(acquisition.get("trigger_source", "Line0"))
+                    f.TriggerActivation.SetString(
+                        acquisition.get("trigger_activation", "RisingEdge"))
+            f.AcquisitionStart.Execute()
+        except Exception as e:
+            print(f"Warning: Could not start {self.mode} acquisition ({e}), falling back to single")
+            self.mode = "single"
+            return
+
+        self._streaming = True
+        if self.mode in ("freerun", "hardware_trigger"):
+            self._grab_thread = threading.Thread(target=self._grab_loop, daemon=True)
+            self._grab_thread.start()
+        print(f"Acquisition mode: {self.mode} (stream kept running)")
+
+    def _grab_loop(self):
+        """Keep the newest images in the ring buffer, stamped on arrival."""
+        while self._streaming:
+            try:
+                img = self.camera.GetImage(self._timeout_ms)
+            except Exception as e:
+                print(f"Baumer grab failed: {e}")
+                time.sleep(0.1)
+                continue
+            if img.IsEmpty():
+                continue
+            with self._ring_cond:
+                self._ring.append((time.monotonic(), img))
+                self._ring_cond.notify_all()
+
+    def _next_ring_image(self, after: float):
+        """Wait for the first free-run image that arrived after `after`."""
+        deadline = max(after, time.monotonic()) + self._timeout_ms / 1000
+        with self._ring_cond:
+            while True:
+                for ts, img in self._ring:
+                    if ts > after:
+                        return img, ts
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None, 0.0
+                self._ring_cond.wait(remaining)
+
+    def _take_triggered_image(self, after: float):
+        """
+        hardware_trigger: remove and return the image of the pulse seen at
+        `after`. Older images come from pulses no capture consumed (a trigger
+        dropped by a full pipeline, a double pulse, a missed Modbus edge);
+        they are discarded, so a part never gets the previous part's image.
+        """
+        deadline = max(after, time.monotonic()) + self._timeout_ms / 1000
+        stale    = 0
+        try:
+            with self._ring_cond:
+                while True:
+                    while self._ring and self._ring[0][0] < after - self._trigger_skew:
+                        self._ring.popleft()
+                        stale += 1
+                    if self._ring:
+                        ts, img = self._ring.popleft()
+                        return img, ts
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return None, 0.0
+                    self._ring_cond.wait(remaining)
+        finally:
+            if stale:
+                self.stale_images += stale
+                metrics.inc("baumer_stale_images", {"source": self.source_id}, stale,
+                            help="Hardware-trigger images discarded as older than their trigger")
+                print(f"[Baumer] Discarded {stale} image(s) from unconsumed line pulses — "
+                      f"camera and trigger counts diverged ({self.stale_images} total)")
+
+    def frame_age(self) -> float | None:
+        if self.mode != "freerun" or not self._streaming:
+            return None
+        with self._ring_cond:
+            return time.monotonic() - (self._ring[-1][0] if self._ring else 0.0)
+
+    def _drain_buffered(self):
+        """Drop images left over from an earlier (timed-out) trigger."""
+        while not self.camera.GetImage(0).IsEmpty():
+            pass
+
+    def get_frame(self, after: float | None = None) -> Frame:
         if not self.camera or not self.camera.IsConnected():
             raise Exception("Baumer camera not connected")
 
-        # Start acquisition (same flow as your working script)
-        self.camera.f.AcquisitionStart.Execute()
+        if self.mode == "freerun":
+            # An image that arrived after the trigger may already be buffered
+            img, ts = self._next_ring_image(time.monotonic() if after is None else after)
+            if img is None:
+                return None
+        elif self.mode == "software_trigger":
+            self._drain_buffered()
+            self.camera.f.TriggerSoftware.Execute()
+            img = self.camera.GetImage(self._timeout_ms)
+            ts = time.monotonic()
+        elif self.mode == "hardware_trigger":
+            # The line pulse may already have produced the image
+            img, ts = self._take_triggered_image(time.monotonic() if after is None else after)
+            if img is None:
+                return None
+        else:
+            # Start acquisition (same flow as your working script)
+            self.camera.f.AcquisitionStart.Execute()
 
-        img = self.camera.GetImage()  # 1s timeout
+            img = self.camera.GetImage()  # 1s timeout
 
-        self.camera.f.AcquisitionStop.Execute()
+            self.camera.f.AcquisitionStop.Execute()
+            ts = time.monotonic()
 
         if img.IsEmpty():
             return None
+        return self._to_frame(img, ts)
+
+    def _to_frame(self, img, ts: float) -> Frame:
+        """Apply the configured output pixel format to a neoapi image."""
+        native = img.GetPixelFormat()
+        if self.output_format == "RGB8":
+            # Convert to RGB8 so Pillow always works
+            img, fmt = img.Convert("RGB8"), "RGB8"
+        elif self.output_format == "Mono8":
+            if native != "Mono8":
+                img = img.Convert("Mono8")
+            fmt = "Mono8"
+        else:
+            fmt = native
 
-        # Convert to RGB8 so Pillow always works
-        rgb_img = img.Convert("RGB8")
+        # GetNPArray views the neoapi buffer; the Frame keeps img alive
+        data = img.GetNPArray()
+        if data.ndim == 3 and data.shape[2] == 1:
+            data = data[:, :, 0]  # single-plane formats may come back as HxWx1
 
-        img_array = rgb_img.GetNPArray()
+        if self.output_format == "debayer" and fmt.startswith("Bayer"):
+            # The demosaiced copy no longer needs the camera buffer
+            data, fmt, img = debayer(data, fmt, self._debayer_method), "BGR8", None
 
-        # Pillow image
-        return Image.fromarray(img_array, mode="RGB")
+        return Frame(data, fmt, timestamp=ts, source_id=self.source_id,
+                     sequence=self._next_sequence(), owner=img)
 
     def disconnect(self):
+        if self._streaming:
+            self._streaming = False
+            if self._grab_thread:
+                self._grab_thread.join(timeout=2)
+                self._grab_thread = None
+            try:
+                self.camera.f.AcquisitionStop.Execute()
+            except Exception as e:
+                print(f"Warning: AcquisitionStop failed: {e}")
+            self._ring.clear()
         if self.camera and self.camera.IsConnected():
             print("Disconnecting Baumer camera...")
             self.camera.Disconnect()
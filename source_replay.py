@@ -0,0 +1,190 @@
+"""
+Replay source: saved captures or a recording, served as an ImageSource.
+
+`path` is either a directory of images, searched recursively (e.g. a day
+of IMAGES_SAVE_PATH), or a video file. Only the file listing is made up
+front, and it costs one stat per file. A background thread reads and
+decodes the next `prefetch` frames into a bounded queue, so a capture
+only takes a decoded frame. A capture that has to wait because the
+decoder is behind is counted as starved (`replay_starved`), which tells
+you the test measured the replay and not the pipeline.
+
+Images are replayed in capture order. The time comes from the capture
+name (capture_20250101-120000-123456), or from the file's mtime when the
+name has none. timeline() returns these times as offsets, so
+load_generator.py can fire triggers at the original pace. A recording's
+timeline follows its frame rate.
+"""
+import datetime
+import os
+import queue
+import re
+import threading
+
+from metrics import metrics
+from source_base import Frame, ImageSource
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp", ".bmp", ".tif", ".tiff", ".ppm", ".pgm")
+VIDEO_EXTENSIONS = (".mp4", ".avi", ".mkv", ".mov", ".m4v")
+
+_STAMP = re.compile(r"(\d{8}-\d{6})(?:-(\d{6}))?")
+_END   = object()
+
+
+class ReplayFinished(RuntimeError):
+    """Every frame of the replay has been served (and loop is off)."""
+
+
+def _capture_time(path: str, mtime: float) -> float:
+    match = _STAMP.search(os.path.basename(path))
+    if not match:
+        return mtime
+    stamp = datetime.datetime.strptime(match.group(1), "%Y%m%d-%H%M%S").timestamp()
+    return stamp + int(match.group(2) or 0) / 1_000_000
+
+
+def list_images(root: str) -> list[tuple[float, str]]:
+    """(capture time, path) of every image under root, oldest first."""
+    items = []
+    for dirpath, _, filenames in os.walk(root):
+        for name in filenames:
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                path = os.path.join(dirpath, name)
+                try:
+                    items.append((_capture_time(path, os.stat(path).st_mtime), path))
+                except OSError:
+                    continue  # deleted while listing (archive retention)
+    items.sort()
+    return items
+
+
+class ReplaySource(ImageSource):
+    def __init__(self, path: str, loop: bool = False, prefetch: int = 8):
+        self.path      = path
+        self.loop      = loop
+        self.prefetch  = max(1, prefetch)
+        self.source_id = f"replay:{os.path.basename(os.path.normpath(path))}"
+        self.starved   = 0
+        self.skipped   = 0
+        self._items: list[tuple[float, str]] = []
+        self._fps      = 0.0
+        self._frames   = 0
+        self._queue: queue.Queue | None = None
+        self._stop     = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    @property
+    def is_video(self) -> bool:
+        return os.path.isfile(self.path) and self.path.lower().endswith(VIDEO_EXTENSIONS)
+
+    def connect(self):
+        import cv2
+        if self.is_video:
+            cap = cv2.VideoCapture(self.path)
+            if not cap.isOpened():
+                raise RuntimeError(f"Cannot open recording {self.path}")
+            self._fps    = cap.get(cv2.CAP_PROP_FPS) or 25.0
+            self._frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+            cap.release()
+            what = f"{self._frames} frames at {self._fps:g} fps"
+        elif os.path.isdir(self.path):
+            self._items = list_images(self.path)
+            if not self._items:
+                raise RuntimeError(f"No images found under {self.path}")
+            span = self._items[-1][0] - self._items[0][0]
+            what = f"{len(self._items)} images spanning {span / 60:.1f} min"
+        else:
+            raise ValueError(f"Replay path must be a directory or a video file: {self.path}")
+
+        self._queue = queue.Queue(maxsize=self.prefetch)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._prefetch_loop, daemon=True,
+                                        name=f"replay-{self.source_id}")
+        self._thread.start()
+        print(f"Replay source ready: {self.path} ({what}{', looped' if self.loop else ''})")
+
+    def __len__(self) -> int:
+        """Frames in one pass."""
+        return self._frames if self.is_video else len(self._items)
+
+    def timeline(self) -> list[float]:
+        """Seconds from the first frame to each frame of one pass."""
+        if self.is_video:
+            return [i / self._fps for i in range(self._frames)]
+        first = self._items[0][0] if self._items else 0.0
+        return [t - first for t, _ in self._items]
+
+    # ── Prefetch thread ───────────────────────────────────────────────────────
+
+    def _frames_once(self):
+        import cv2
+        if self.is_video:
+            cap = cv2.VideoCapture(self.path)
+            try:
+                while not self._stop.is_set():
+                    ok, data = cap.read()
+                    if not ok:
+                        return
+                    yield data
+            finally:
+                cap.release()
+            return
+        for _, path in self._items:
+            data = cv2.imread(path, cv2.IMREAD_UNCHANGED)
+            if data is None:
+                self.skipped += 1  # deleted or unreadable since the listing
+                continue
+            yield data
+
+    def _prefetch_loop(self):
+        while not self._stop.is_set():
+            served = 0
+            for data in self._frames_once():
+                if data.ndim == 3 and data.shape[2] == 4:
+                    data = data[..., :3]  # BGRA → BGR view
+                if not self._put((data, "Mono8" if data.ndim == 2 else "BGR8")):
+                    return
+                served += 1
+            if not (self.loop and served):
+                break
+        self._put(_END)
+
+    def _put(self, item) -> bool:
+        """Blocking put that gives up when the source is disconnected."""
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.2)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    # ── Captures ──────────────────────────────────────────────────────────────
+
+    def get_frame(self, after: float | None = None) -> Frame:
+        if self._queue is None:
+            raise RuntimeError("Replay source not connected")
+        try:
+            item = self._queue.get_nowait()
+        except queue.Empty:
+            self.starved += 1
+            metrics.inc("replay_starved", help="Replay captures that waited for the decoder")
+            try:
+                item = self._queue.get(timeout=10)
+            except queue.Empty:
+                raise RuntimeError("Replay decoder produced no frame within 10 s") from None
+        if item is _END:
+            self._queue.put(_END)  # every later capture ends too
+            raise ReplayFinished(f"Replay of {self.path} finished ({len(self)} frames)")
+        data, fmt = item
+        return Frame(data, fmt, source_id=self.source_id, sequence=self._next_sequence())
+
+    def disconnect(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=2)
+            self._thread = None
+        self._queue = None
+        if self.starved or self.skipped:
+            print(f"Replay: {self.starved} captures waited for the decoder, "
+                  f"{self.skipped} unreadable files skipped")
@@ -0,0 +1,200 @@
+"""
+Health supervision and background reconnect for any ImageSource.
+
+SupervisedSource wraps a source and watches two signals:
+
+  frame age   time since the source last received a frame, for sources
+              that stream (frame_age() is not None): webcam, RTSP and
+              Baumer free-run
+  errors      consecutive failed captures (exceptions or empty frames),
+              plus the failure rate over the last 50 captures for status
+
+When a source goes unhealthy, a supervisor thread reconnects it. The first
+attempt is immediate, later ones back off exponentially up to
+`max_backoff`. Meanwhile get_frame() raises SourceUnavailable at once
+with the reason and the attempt count. A part fails in microseconds
+instead of waiting out a camera timeout and a reconnect. The backoff
+resets once the source delivers frames again.
+"""
+import collections
+import threading
+import time
+
+from metrics import metrics
+from source_base import Frame, ImageSource
+
+
+def _brief(error: Exception) -> str:
+    """First line of an error (ffmpeg and SDK errors can span several)."""
+    lines = str(error).strip().splitlines()
+    return lines[0] if lines else type(error).__name__
+
+
+class SourceUnavailable(RuntimeError):
+    """get_frame() while the source is down and being reconnected."""
+
+
+class SupervisedSource(ImageSource):
+    def __init__(self, source: ImageSource, stale_after: float = 3.0, max_errors: int = 2,
+                 backoff: float = 0.5, max_backoff: float = 30.0, check_interval: float = 0.25):
+        self.source         = source
+        self.stale_after    = stale_after
+        self.max_errors     = max(1, max_errors)
+        self.backoff        = backoff
+        self.max_backoff    = max_backoff
+        self.check_interval = check_interval
+        self.state          = "disconnected"  # ok | reconnecting | disconnected
+        self.reason         = ""
+        self.reconnects     = 0
+        self.attempts       = 0  # failed-or-unconfirmed reconnects since the last good frame
+        self._outcomes      = collections.deque(maxlen=50)
+        self._errors_in_row = 0
+        self._down_since    = 0.0
+        self._up_since      = 0.0
+        self._state_lock = threading.Lock()
+        self._use_lock   = threading.Lock()  # a capture and a reconnect never overlap
+        self._wake       = threading.Event()
+        self._stop       = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    @property
+    def source_id(self) -> str:
+        return self.source.source_id
+
+    def connect(self):
+        """Connect now; if that fails, keep retrying in the background instead of raising."""
+        try:
+            self.source.connect()
+            self._up()
+        except Exception as e:
+            self._down(f"connect failed: {_brief(e)}")
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._supervise, daemon=True,
+                                        name=f"supervisor-{self.source_id or 'source'}")
+        self._thread.start()
+
+    def get_frame(self, after: float | None = None) -> Frame | None:
+        if self.state != "ok":
+            metrics.inc("source_unavailable", {"source": self.source_id},
+                        help="Captures refused because the source was reconnecting")
+            raise SourceUnavailable(self.describe())
+        with self._use_lock:
+            try:
+                frame = self.source.get_frame(after=after)
+            except Exception as e:
+                self._record(False, _brief(e))
+                raise
+        self._record(frame is not None, "empty frame")
+        return frame
+
+    def frame_age(self) -> float | None:
+        return self.source.frame_age()
+
+    def disconnect(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+        with self._use_lock:
+            self.source.disconnect()
+        self.state = "disconnected"
+
+    def status(self) -> dict:
+        age = self.source.frame_age() if self.state == "ok" else None
+        return {
+            "state": self.state,
+            "reason": self.reason,
+            "frame_age": round(age, 3) if age is not None else None,
+            "error_rate": round(self._outcomes.count(False) / len(self._outcomes), 3)
+                          if self._outcomes else 0.0,
+            "reconnects": self.reconnects,
+            "attempts": self.attempts,
+            "down_for": round(time.monotonic() - self._down_since, 3)
+                        if self.state == "reconnecting" else 0.0,
+        }
+
+    def describe(self) -> str:
+        down  = time.monotonic() - self._down_since
+        tries = f", {self.attempts} attempt(s) so far" if self.attempts else ""
+        return (f"source {self.source_id or '?'} unavailable ({self.reason}); "
+                f"reconnecting for {down:.1f}s{tries}")
+
+    # ── Health ────────────────────────────────────────────────────────────────
+
+    def _record(self, ok: bool, reason: str):
+        self._outcomes.append(ok)
+        if ok:
+            self._errors_in_row = 0
+            self.attempts = 0  # frames flow again: next outage starts a fresh backoff
+            return
+        self._errors_in_row += 1
+        if self._errors_in_row >= self.max_errors:
+            self._down(f"{self._errors_in_row} failed captures, last: {reason}")
+
+    def _up(self):
+        with self._state_lock:
+            self.state, self.reason = "ok", ""
+            self._errors_in_row = 0
+            self._up_since = time.monotonic()
+
+    def _down(self, reason: str):
+        with self._state_lock:
+            if self.state == "reconnecting":
+                return
+            self.state, self.reason = "reconnecting", reason
+            self._down_since = time.monotonic()
+        print(f"[Source] {self.source_id or 'source'} unhealthy ({reason}) — reconnecting in background")
+        metrics.event("source_down", source=self.source_id, reason=reason)
+        self._wake.set()
+
+    def _supervise(self):
+        while not self._stop.is_set():
+            if self.state == "ok":
+                age = self.source.frame_age()
+                if age is not None:
+                    # A fresh connection gets stale_after to deliver its first frame
+                    age = min(age, time.monotonic() - self._up_since)
+                    if age > self.stale_after:
+                        self._down(f"no frame for {age:.1f}s")
+                        continue
+                    if age < self.stale_after / 2:
+                        self.attempts = 0
+                self._wake.wait(self.check_interval)
+                self._wake.clear()
+                continue
+
+            if self.attempts:
+                delay = min(self.max_backoff, self.backoff * 2 ** (self.attempts - 1))
+                if self._stop.wait(delay):
+                    break
+            self._reconnect()
+
+    def _reconnect(self):
+        self.attempts += 1
+        with self._use_lock:
+            try:
+                self.source.disconnect()
+            except Exception as e:
+                print(f"[Source] {self.source_id or 'source'} disconnect failed: {_brief(e)}")
+            try:
+                self.source.connect()
+                ok, error = True, ""
+            except Exception as e:
+                ok, error = False, _brief(e)
+        metrics.inc("source_reconnects", {"source": self.source_id, "ok": str(ok).lower()},
+                    help="Background source reconnect attempts")
+        if not ok:
+            self.reason = f"reconnect failed: {error}"
+            delay = min(self.max_backoff, self.backoff * 2 ** (self.attempts - 1))
+            print(f"[Source] {self.source_id or 'source'} reconnect #{self.attempts} failed "
+                  f"({error}); next try in {delay:g}s")
+            return
+        downtime = time.monotonic() - self._down_since
+        self.reconnects += 1
+        self._up()
+        metrics.observe("source_recovery_seconds", downtime,
+                        help="Source unhealthy → reconnected")
+        metrics.event("source_up", source=self.source_id, downtime=round(downtime, 3))
+        print(f"[Source] {self.source_id or 'source'} reconnected after {downtime:.1f}s "
+              f"(attempt {self.attempts})")
@@ -0,0 +1,60 @@
+import time
+import numpy as np
+from source_base import Frame, ImageSource
+from source_baumer import MEGA_PIXEL_RESOLUTIONS
+
+
+def synthetic_frame(width: int, height: int, mono: bool = False) -> np.ndarray:
+    """Smooth gradients plus sensor-like noise — compresses like a real part photo."""
+    rng = np.random.default_rng(0)
+    y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+    x = np.linspace(0, 255, width, dtype=np.float32)[None, :]
+    base = (0.6 * x + 0.4 * y)
+    noise = rng.normal(0, 4, size=(height, width)).astype(np.float32)
+    gray = np.clip(base + noise, 0, 255).astype(np.uint8)
+    if mono:
+        return gray
+    return np.stack([gray, np.roll(gray, 7, axis=1), 255 - gray], axis=-1)
+
+
+class SyntheticSource(ImageSource):
+    """
+    Camera stand-in for benchmarks: serves generated frames of any Baumer
+    resolution (MEGA_PIXEL_RESOLUTIONS) after an optional simulated
+    exposure/transfer delay. A small pool of pre-rendered frames is cycled
+    so frame generation never shows up in the measurements.
+    """
+
+    def __init__(self, mega_pixels: int = 6, width: int | None = None, height: int | None = None,
+                 mono: bool = False, capture_delay: float = 0.0, pool_size: int = 4):
+        if width is None or height is None:
+            if mega_pixels not in MEGA_PIXEL_RESOLUTIONS:
+                raise ValueError(f"{mega_pixels} MP not supported. "
+                                 f"Available: {sorted(MEGA_PIXEL_RESOLUTIONS)}")
+            width, height = MEGA_PIXEL_RESOLUTIONS[mega_pixels]
+        self.width         = width
+        self.height        = height
+        self.mono          = mono
+        self.capture_delay = capture_delay
+        self.pool_size     = max(1, pool_size)
+        self.source_id     = f"synthetic:{width}x{height}"
+        self._pool: list[np.ndarray] = []
+
+    def connect(self):
+        base = synthetic_frame(self.width, self.height, mono=self.mono)
+        # Shift each pool frame so consecutive captures are not byte-identical
+        self._pool = [np.roll(base, i * 16, axis=1) for i in range(self.pool_size)]
+        print(f"Synthetic source ready: {self.width}x{self.height} "
+              f"{'Mono8' if self.mono else 'RGB8'}")
+
+    def get_frame(self, after: float | None = None) -> Frame:
+        if not self._pool:
+            raise RuntimeError("Synthetic source not connected")
+        if self.capture_delay:
+            time.sleep(self.capture_delay)
+        seq = self._next_sequence()
+        return Frame(self._pool[seq % self.pool_size], "Mono8" if self.mono else "RGB8",
+                     source_id=self.source_id, sequence=seq)
+
+    def disconnect(self):
+        self._pool = []
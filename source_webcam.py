@@ -1,35 +1,101 @@
+"""
+USB/built-in webcam source, plus camera enumeration.
+
+On Linux, cameras are listed from /sys/class/video4linux without opening any
+device. Each node gives its name, its /dev/videoN index, its physical device
+path (USB port) and the USB serial number. On Windows, names still come from
+PowerShell and indices from probing DirectShow. That call is made at most
+once per process.
+
+A WEBCAM_ID that is a name substring is resolved through a small JSON index
+on disk. The index remembers which physical camera (by serial, else by
+device path) each name resolved to. The same camera is picked again after
+a reboot renumbers /dev/video*, or when two cameras share a name. On
+Windows the index also stores the camera list, so a restart skips
+PowerShell. It is refreshed when the cached index fails to open.
+"""
+import functools
+import json
+import os
+import re
 import subprocess
-import threading
+import sys
 import time
+
 import cv2
-from PIL import Image
-from source_base import ImageSource
+from source_base import Frame, GrabbingSource
 
+SYSFS_V4L = "/sys/class/video4linux"
 
-def list_webcams() -> list[tuple[int, str]]:
-    """
-    Returns a list of (index, name) for all available webcams.
-    Name is resolved via PowerShell on Windows; falls back to 'Camera <index>'.
-    """
-    names = _get_camera_names_windows()
+
+def capture_backend() -> int:
+    """OpenCV capture API for this platform (DirectShow on Windows, V4L2 on Linux)."""
+    if sys.platform == "win32":
+        return cv2.CAP_DSHOW
+    if sys.platform.startswith("linux"):
+        return cv2.CAP_V4L2
+    return cv2.CAP_ANY
+
+
+class CameraInfo:
+    """One enumerated camera. `key` identifies the physical device across reboots."""
+
+    def __init__(self, index: int, name: str, path: str = "", serial: str = ""):
+        self.index  = index
+        self.name   = name
+        self.path   = path
+        self.serial = serial
+
+    @property
+    def key(self) -> str:
+        if self.serial:
+            return f"serial:{self.serial}"
+        return f"path:{self.path}" if self.path else f"index:{self.index}"
+
+    def to_dict(self) -> dict:
+        return {"index": self.index, "name": self.name, "path": self.path, "serial": self.serial}
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "CameraInfo":
+        return cls(int(d["index"]), d.get("name", ""), d.get("path", ""), d.get("serial", ""))
+
+    def __repr__(self):
+        return f"CameraInfo({self.index}, {self.name!r}, {self.key})"
+
+
+def _read_attr(directory: str, name: str) -> str:
+    try:
+        with open(os.path.join(directory, name)) as f:
+            return f.read().strip()
+    except OSError:
+        return ""
+
+
+def enumerate_linux(root: str = SYSFS_V4L) -> list[CameraInfo]:
+    """Capture nodes from sysfs, sorted by /dev/videoN; no device is opened."""
+    try:
+        entries = os.listdir(root)
+    except OSError:
+        return []
     cameras = []
-    idx = 0
-    while True:
-        cap = cv2.VideoCapture(idx, cv2.CAP_DSHOW)
-        if not cap.isOpened():
-            cap.release()
-            break
-        name = names[idx] if idx < len(names) else f"Camera {idx}"
-        cameras.append((idx, name))
-        cap.release()
-        idx += 1
-        if idx > 9:
-            break
-    return cameras
+    for entry in entries:
+        match = re.fullmatch(r"video(\d+)", entry)
+        if not match:
+            continue
+        node = os.path.join(root, entry)
+        # UVC cameras expose a second (metadata) node with index 1; only 0 captures
+        if _read_attr(node, "index") not in ("", "0"):
+            continue
+        device = os.path.realpath(os.path.join(node, "device"))
+        serial = _read_attr(device, "serial") or _read_attr(os.path.dirname(device), "serial")
+        cameras.append(CameraInfo(int(match.group(1)), _read_attr(node, "name") or entry,
+                                  path=device, serial=serial))
+    return sorted(cameras, key=lambda c: c.index)
 
 
-def _get_camera_names_windows() -> list[str]:
-    """Query PnP camera device names via PowerShell."""
+@functools.lru_cache(maxsize=1)
+def _get_camera_names_windows() -> tuple[str, ...]:
+    """Query PnP camera device names via PowerShell (once per process)."""
     try:
         cmd = [
             "powershell", "-NoProfile", "-Command",
@@ -38,56 +104,140 @@ def _get_camera_names_windows() -> list[str]:
             "Select-Object -ExpandProperty FriendlyName"
         ]
         out = subprocess.check_output(cmd, timeout=5, stderr=subprocess.DEVNULL, text=True)
-        return [line.strip() for line in out.strip().splitlines() if line.strip()]
+        return tuple(line.strip() for line in out.strip().splitlines() if line.strip())
     except Exception:
-        return []
+        return ()
+
+
+def _enumerate_by_probing() -> list[CameraInfo]:
+    """Open indices 0–9 until one fails (Windows / macOS)."""
+    names = _get_camera_names_windows() if sys.platform == "win32" else ()
+    cameras = []
+    for idx in range(10):
+        cap = cv2.VideoCapture(idx, capture_backend())
+        opened = cap.isOpened()
+        cap.release()
+        if not opened:
+            break
+        cameras.append(CameraInfo(idx, names[idx] if idx < len(names) else f"Camera {idx}"))
+    return cameras
+
+
+def enumerate_cameras() -> list[CameraInfo]:
+    if sys.platform.startswith("linux"):
+        return enumerate_linux()
+    return _enumerate_by_probing()
+
+
+def list_webcams() -> list[tuple[int, str]]:
+    """
+    Returns a list of (index, name) for all available webcams.
+    Linux reads sysfs; elsewhere indices are probed and named via PowerShell
+    on Windows, falling back to 'Camera <index>'.
+    """
+    return [(c.index, c.name) for c in enumerate_cameras()]
+
+
+class WebcamIndex:
+    """
+    On-disk camera index: {"cameras": [...], "pins": {name: key}, "updated": ts}.
+
+    `path=""` keeps everything in memory (nothing is remembered across runs).
+    """
+
+    def __init__(self, path: str = ""):
+        self.path = path
+        self._data = {"cameras": [], "pins": {}}
+        if path:
+            try:
+                with open(path) as f:
+                    self._data.update(json.load(f))
+            except (OSError, ValueError):
+                pass
+
+    def cameras(self, refresh: bool = False) -> list[CameraInfo]:
+        # sysfs is cheap and always current; the probing path is what's worth caching
+        if refresh or sys.platform.startswith("linux") or not self._data["cameras"]:
+            self._data["cameras"] = [c.to_dict() for c in enumerate_cameras()]
+        return [CameraInfo.from_dict(d) for d in self._data["cameras"]]
+
+    def resolve(self, name: str, refresh: bool = False) -> CameraInfo | None:
+        """The camera matching `name`, preferring the one it resolved to last time."""
+        needle  = name.lower()
+        matches = [c for c in self.cameras(refresh) if needle in c.name.lower()]
+        if not matches:
+            return None
+        pinned = self._data["pins"].get(needle)
+        camera = next((c for c in matches if c.key == pinned), None)
+        if camera is None:
+            # First time (or the pinned camera is gone): lowest port path, then index
+            camera = min(matches, key=lambda c: (c.path or "~", c.index))
+        self._data["pins"][needle] = camera.key
+        self._save()
+        return camera
 
+    def _save(self):
+        if not self.path:
+            return
+        self._data["updated"] = time.time()
+        tmp = self.path + ".tmp"
+        try:
+            with open(tmp, "w") as f:
+                json.dump(self._data, f, indent=1)
+            os.replace(tmp, self.path)
+        except OSError as e:
+            print(f"Could not write webcam index {self.path}: {e}")
 
-def _resolve_webcam_index(webcam_id: str) -> int:
+
+def _resolve_webcam_index(webcam_id: str, index: WebcamIndex | None = None,
+                          refresh: bool = False) -> int:
     """
     Resolve a WEBCAM_ID string to an OpenCV camera index.
     - If it's a plain integer string (e.g. "0"), use it directly.
-    - Otherwise, treat it as a device name substring and search for a match.
+    - Otherwise, treat it as a device name substring and look it up in the
+      camera index (see WebcamIndex).
     """
     if webcam_id.lstrip("-").isdigit():
         return int(webcam_id)
 
-    # Name-based lookup
-    names = _get_camera_names_windows()
-    needle = webcam_id.lower()
-    for i, name in enumerate(names):
-        if needle in name.lower():
-            print(f"Matched webcam name '{name}' at index {i}")
-            return i
-
-    # Brute-force: try indices until we find one that opens
-    print(f"No exact name match for '{webcam_id}', scanning available cameras...")
-    cameras = list_webcams()
+    index  = index or WebcamIndex()
+    camera = index.resolve(webcam_id, refresh=refresh)
+    if camera is not None:
+        print(f"Matched webcam name '{camera.name}' at index {camera.index} ({camera.key})")
+        return camera.index
+
+    print(f"No name match for '{webcam_id}', available cameras:")
+    cameras = index.cameras()
     if cameras:
-        for i, name in cameras:
-            print(f"  [{i}] {name}")
-        print(f"Defaulting to index 0. Set WEBCAM_ID=<index> to choose a specific camera.")
-        return 0
+        for c in cameras:
+            print(f"  [{c.index}] {c.name}")
+        print(f"Defaulting to index {cameras[0].index}. "
+              f"Set WEBCAM_ID=<index> to choose a specific camera.")
+        return cameras[0].index
 
     raise RuntimeError(f"No webcam found matching '{webcam_id}'")
 
 
-class WebcamSource(ImageSource):
-    """Captures frames from a local USB/built-in webcam via OpenCV."""
+class WebcamSource(GrabbingSource):
+    """
+    Captures frames from a local USB/built-in webcam via OpenCV.
 
-    def __init__(self, webcam_id: str = "0"):
+    A background thread grabs every frame; only frames a capture asks for
+    are decoded (see GrabbingSource).
+    """
+
+    def __init__(self, webcam_id: str = "0", index_path: str = ""):
         self.webcam_id = webcam_id
+        self.camera_index = WebcamIndex(index_path)
         self._index: int = 0
         self._cap: cv2.VideoCapture | None = None
-        self._latest_frame = None
-        self._frame_lock = threading.Lock()
-        self._capture_thread: threading.Thread | None = None
-        self._stop_capture = False
 
     def connect(self):
-        self._index = _resolve_webcam_index(self.webcam_id)
-        print(f"Opening webcam index {self._index} (id='{self.webcam_id}')...")
-        self._cap = cv2.VideoCapture(self._index, cv2.CAP_DSHOW)
+        self._open(refresh=False)
+        if not self._cap.isOpened() and not self.webcam_id.lstrip("-").isdigit():
+            # The cached camera list may be stale (camera unplugged/renumbered)
+            self._cap.release()
+            self._open(refresh=True)
         if not self._cap.isOpened():
             raise RuntimeError(f"Failed to open webcam at index {self._index}")
 
@@ -97,42 +247,26 @@ class WebcamSource(ImageSource):
         for _ in range(5):
             self._cap.grab()
 
-        self._stop_capture = False
-        self._capture_thread = threading.Thread(target=self._continuous_capture, daemon=True)
-        self._capture_thread.start()
+        self._start_grabbing(self._cap)
         print("Webcam ready.")
 
-    def _continuous_capture(self):
-        while not self._stop_capture and self._cap and self._cap.isOpened():
-            ret, frame = self._cap.read()
-            if ret and frame is not None:
-                with self._frame_lock:
-                    self._latest_frame = frame
-            time.sleep(0.03)  # ~30 FPS
+    def _open(self, refresh: bool):
+        self._index = _resolve_webcam_index(self.webcam_id, self.camera_index, refresh)
+        self.source_id = f"webcam:{self._index}"
+        print(f"Opening webcam index {self._index} (id='{self.webcam_id}')...")
+        self._cap = cv2.VideoCapture(self._index, capture_backend())
 
-    def get_image(self) -> Image.Image:
+    def get_frame(self, after: float | None = None) -> Frame:
         if not self._cap or not self._cap.isOpened():
             raise RuntimeError("Webcam not connected")
-
-        with self._frame_lock:
-            frame = self._latest_frame.copy() if self._latest_frame is not None else None
-
+        frame = self._wait_frame(after)
         if frame is None:
-            # Fallback: direct read
-            ret, frame = self._cap.read()
-            if not ret or frame is None:
-                raise RuntimeError("Failed to capture frame from webcam")
-
-        frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        return Image.fromarray(frame_rgb)
+            raise RuntimeError(f"No webcam frame within {self.frame_timeout:g}s")
+        return frame
 
     def disconnect(self):
-        self._stop_capture = True
-        if self._capture_thread:
-            self._capture_thread.join(timeout=2)
+        self._stop_grabbing()
         if self._cap:
             self._cap.release()
             self._cap = None
-        with self._frame_lock:
-            self._latest_frame = None
         print("Webcam disconnected.")
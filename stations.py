@@ -0,0 +1,61 @@
+import json
+import os
+
+from source_baumer import CONFIG_PATH
+
+
+class Station:
+    """
+    One inspection station: a trigger input, an image source and the first
+    of its three result coils (NA/Pass/Fail).
+
+    Configured in config.json:
+
+        "stations": [
+            {"name": "st1", "input_address": 0, "output_address": 0,
+             "source": {"type": "baumer", "camera_id": "700012345678"}},
+            {"name": "st2", "input_address": 1, "output_address": 3,
+             "source": {"type": "rtsp", "url": "rtsp://..."}},
+            {"name": "st3", "input_address": 2, "output_address": 6,
+             "source": {"type": "webcam", "webcam_id": "0"}}
+        ]
+    """
+
+    def __init__(self, name: str, input_address: int, output_address: int, source: dict):
+        self.name           = name
+        self.input_address  = input_address
+        self.output_address = output_address
+        self.source         = source
+
+    def __repr__(self):
+        return (f"Station({self.name}: X{self.input_address} → {self.source.get('type')} "
+                f"→ Y{self.output_address}..Y{self.output_address + 2})")
+
+
+def load_stations(path: str = CONFIG_PATH) -> list[Station]:
+    """Read the station table from config.json; an empty list means single-station mode."""
+    if not os.path.exists(path):
+        return []
+    with open(path, "r") as f:
+        entries = json.load(f).get("stations", [])
+
+    stations = []
+    for i, entry in enumerate(entries):
+        try:
+            station = Station(
+                name=str(entry.get("name", f"station{i + 1}")),
+                input_address=int(entry["input_address"]),
+                output_address=int(entry["output_address"]),
+                source=dict(entry.get("source", {"type": "baumer"})),
+            )
+        except (KeyError, TypeError, ValueError) as e:
+            raise ValueError(f"Invalid station #{i + 1} in {path}: {e}") from e
+        stations.append(station)
+
+    inputs = [s.input_address for s in stations]
+    if len(set(inputs)) != len(inputs):
+        raise ValueError(f"Duplicate station input_address in {path}: {inputs}")
+    names = [s.name for s in stations]
+    if len(set(names)) != len(names):
+        raise ValueError(f"Duplicate station name in {path}: {names}")
+    return stations
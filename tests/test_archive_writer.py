@@ -0,0 +1,93 @@
+"""ArchiveWriter retention, and the catalog forgetting evicted paths."""
+import os
+import time
+
+from archive_writer import ArchiveWriter
+from catalog import CaptureCatalog
+
+
+def _write(writer: ArchiveWriter, names: list[str], size: int = 100):
+    for name in names:
+        assert writer.submit(os.path.join("2025-01-01", name), b"x" * size)
+
+
+def test_max_files_evicts_oldest(tmp_path):
+    evicted = []
+    writer = ArchiveWriter(str(tmp_path), batch_size=1, max_files=3, on_evicted=evicted.append)
+    writer.start()
+    _write(writer, [f"{i}.jpg" for i in range(5)])
+    writer.stop()
+
+    assert sorted(os.listdir(tmp_path / "2025-01-01")) == ["2.jpg", "3.jpg", "4.jpg"]
+    assert evicted == [str(tmp_path / "2025-01-01" / f"{i}.jpg") for i in (0, 1)]
+    assert writer.stats()["files"] == 3 and writer.evicted == 2
+
+
+def test_max_bytes_evicts_oldest(tmp_path):
+    writer = ArchiveWriter(str(tmp_path), batch_size=1, max_bytes=250)
+    writer.start()
+    _write(writer, ["a.jpg", "b.jpg", "c.jpg", "d.jpg"], size=100)
+    writer.stop()
+
+    assert sorted(os.listdir(tmp_path / "2025-01-01")) == ["c.jpg", "d.jpg"]
+    assert writer.stats()["bytes"] == 200
+
+
+def test_max_age_evicts_existing_files_at_start(tmp_path):
+    old, new = tmp_path / "old.jpg", tmp_path / "new.jpg"
+    old.write_bytes(b"x")
+    new.write_bytes(b"x")
+    two_days_ago = time.time() - 2 * 86400
+    os.utime(old, (two_days_ago, two_days_ago))
+
+    evicted = []
+    writer = ArchiveWriter(str(tmp_path), max_age_s=86400, on_evicted=evicted.append)
+    writer.start()
+    writer.stop()
+
+    assert not old.exists() and new.exists()
+    assert evicted == [str(old)]
+
+
+def test_emptied_shard_directories_are_removed(tmp_path):
+    writer = ArchiveWriter(str(tmp_path), batch_size=1, max_files=1)
+    writer.start()
+    writer.submit(os.path.join("2025-01-01", "00", "a.jpg"), b"x")
+    writer.submit(os.path.join("2025-01-02", "00", "b.jpg"), b"x")
+    writer.stop()
+
+    assert os.listdir(tmp_path) == ["2025-01-02"]
+
+
+def test_failing_on_evicted_does_not_stop_the_writer(tmp_path):
+    def on_evicted(path):
+        raise RuntimeError("boom")
+
+    writer = ArchiveWriter(str(tmp_path), batch_size=1, max_files=1, on_evicted=on_evicted)
+    writer.start()
+    _write(writer, ["a.jpg", "b.jpg", "c.jpg"])
+    writer.stop()
+
+    assert os.listdir(tmp_path / "2025-01-01") == ["c.jpg"]
+    assert writer.written == 3
+
+
+def test_catalog_forgets_evicted_paths(tmp_path):
+    root = tmp_path / "images"
+    catalog = CaptureCatalog(str(tmp_path / "captures.sqlite"))
+    catalog.start()
+    for i in range(3):
+        catalog.record(capture_id=i + 1, name=f"{i}", station="", spooled=0, trigger_time=1.0 + i,
+                       path=os.path.join("2025-01-01", f"{i}.jpg"), bytes=100)
+
+    writer = ArchiveWriter(str(root), batch_size=1, max_files=2,
+                           on_evicted=lambda path: catalog.forget_path(str(root), path))
+    writer.start()
+    _write(writer, [f"{i}.jpg" for i in range(3)])
+    writer.stop()
+    catalog.stop()
+
+    paths = {row["capture_id"]: row["path"] for row in catalog.query()}
+    assert paths == {1: None,
+                     2: os.path.join("2025-01-01", "1.jpg"),
+                     3: os.path.join("2025-01-01", "2.jpg")}
@@ -0,0 +1,45 @@
+"""Burst capture against scripted sources."""
+import time
+
+import numpy as np
+import pytest
+
+from burst import Burst
+from source_base import Frame, ImageSource
+
+
+class _Scripted(ImageSource):
+    """Returns a new frame per grab; raises once `fail_at` grabs are done."""
+
+    source_id = "scripted"
+
+    def __init__(self, fail_at: int | None = None, max_burst_frames: int | None = None):
+        self.fail_at = fail_at
+        self.max_burst_frames = max_burst_frames
+        self.grabs = 0
+
+    def get_frame(self, after=None):
+        if self.grabs == self.fail_at:
+            raise RuntimeError("grab failed")
+        self.grabs += 1
+        data = np.zeros((32, 32), dtype=np.uint8)
+        data[::2, ::self.grabs + 1] = 255  # a different pattern per grab
+        return Frame(data, "Mono8", timestamp=time.monotonic(), sequence=self.grabs)
+
+
+def test_later_grab_failure_keeps_frames():
+    source = _Scripted(fail_at=2)
+    kept = Burst(frames=5, budget=1.0, keep="all").capture(source)
+    assert sorted(frame.sequence for frame, _ in kept) == [1, 2]
+
+
+def test_first_grab_failure_raises():
+    with pytest.raises(RuntimeError):
+        Burst(frames=5, budget=1.0).capture(_Scripted(fail_at=0))
+
+
+def test_source_caps_burst():
+    source = _Scripted(max_burst_frames=1)
+    kept = Burst(frames=5, budget=1.0, keep="all").capture(source)
+    assert len(kept) == 1
+    assert source.grabs == 1
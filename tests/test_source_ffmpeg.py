@@ -0,0 +1,93 @@
+"""The ffmpeg rawvideo reader, fed a generated BGR24 file instead of ffmpeg output."""
+import sys
+import time
+
+import numpy as np
+import pytest
+
+from source_ffmpeg import FFmpegRTSPSource, _FFmpegPipe
+
+WIDTH, HEIGHT, FRAMES = 32, 24, 10
+
+# Stands in for ffmpeg: copies the file to stdout one frame every `interval` s
+_PACED_CAT = """
+import sys, time
+path, size, interval = sys.argv[1], int(sys.argv[2]), float(sys.argv[3])
+with open(path, "rb") as f:
+    while chunk := f.read(size):
+        sys.stdout.buffer.write(chunk)
+        sys.stdout.buffer.flush()
+        time.sleep(interval)
+"""
+
+
+@pytest.fixture
+def rawvideo(tmp_path):
+    """FRAMES frames of HEIGHTxWIDTH BGR24; every byte of frame n is n."""
+    path = tmp_path / "clip.bgr"
+    frames = [np.full((HEIGHT, WIDTH, 3), n, dtype=np.uint8) for n in range(FRAMES)]
+    path.write_bytes(b"".join(f.tobytes() for f in frames))
+    return path
+
+
+def _cat(path) -> list[str]:
+    return [sys.executable, "-c", _PACED_CAT, str(path), str(WIDTH * HEIGHT * 3), "0"]
+
+
+def test_pipe_reads_every_frame(rawvideo):
+    pipe = _FFmpegPipe(_cat(rawvideo), WIDTH, HEIGHT)
+    try:
+        frames = []
+        while pipe.grab():
+            ok, frame = pipe.retrieve()
+            assert ok
+            frames.append(frame)
+    finally:
+        pipe.release()
+
+    assert len(frames) == FRAMES
+    for n, frame in enumerate(frames):
+        assert frame.shape == (HEIGHT, WIDTH, 3)
+        assert frame.dtype == np.uint8
+        assert (frame == n).all()  # retrieve() copies, the buffer is reused
+
+
+def test_pipe_drops_truncated_last_frame(rawvideo):
+    data = rawvideo.read_bytes()
+    rawvideo.write_bytes(data[:len(data) - WIDTH * HEIGHT])
+    pipe = _FFmpegPipe(_cat(rawvideo), WIDTH, HEIGHT)
+    try:
+        grabbed = 0
+        while pipe.grab():
+            grabbed += 1
+    finally:
+        pipe.release()
+    assert grabbed == FRAMES - 1
+
+
+def test_source_frames_and_timestamps(monkeypatch, rawvideo):
+    interval = 0.03
+    monkeypatch.setattr(FFmpegRTSPSource, "_command", lambda self: [
+        sys.executable, "-c", _PACED_CAT, str(rawvideo), str(WIDTH * HEIGHT * 3), str(interval)])
+    source = FFmpegRTSPSource(str(rawvideo), width=WIDTH, height=HEIGHT, stall_timeout=5.0)
+    source.connect()
+    try:
+        frames = []
+        after = time.monotonic()
+        for _ in range(3):
+            frame = source.get_frame(after=after)
+            assert frame.timestamp > after
+            frames.append(frame)
+            after = frame.timestamp
+    finally:
+        source.disconnect()
+
+    for frame in frames:
+        assert frame.data.shape == (HEIGHT, WIDTH, 3)
+        assert frame.pixel_format == "BGR8"
+    values = [int(f.data[0, 0, 0]) for f in frames]
+    assert values == sorted(set(values))  # each capture is a newer frame
+    assert [f.sequence for f in frames] == [v + 1 for v in values]  # one grab per frame
+    assert values[-1] < FRAMES
+    # Timestamps follow the writer's pacing, not the order of the get_frame calls
+    assert frames[-1].timestamp - frames[0].timestamp >= interval * (len(frames) - 1) * 0.5
@@ -0,0 +1,223 @@
+import asyncio
+import json
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import aiohttp
+except ImportError:  # optional: AsyncUploadClient falls back to a thread executor
+    aiohttp = None
+
+from metrics import metrics
+
+
+class UploadError(Exception):
+    """Raised when the inspection API rejects an upload or cannot be reached."""
+
+    def __init__(self, message: str, status_code: int | None = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+    @property
+    def retryable(self) -> bool:
+        """Network errors, timeouts and 5xx are worth retrying; most 4xx are not."""
+        s = self.status_code
+        return s is None or s >= 500 or s in (408, 409, 425, 429)
+
+
+class UploadClient:
+    """
+    Long-lived client for the headless inspection API.
+
+    One pooled requests.Session is shared by all uploads, so TCP connections
+    (and TLS sessions) are kept alive and reused instead of being set up for
+    every image. Headers and form fields are built once at construction.
+
+    upload() is blocking and thread-safe; submit() runs it on an internal
+    pool of `max_in_flight` threads and returns a Future.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        api_key: str | None = None,
+        workspace_id: str | None = None,
+        form_fields: dict | None = None,
+        image_field: str = "image_file",
+        pool_size: int = 4,
+        max_in_flight: int = 2,
+        timeout: float = 30.0,
+    ):
+        self.url           = url
+        self.image_field   = image_field
+        self.timeout       = timeout
+        self.max_in_flight = max(1, max_in_flight)
+
+        self._headers = {
+            k: v for k, v in (("x-api-key", api_key), ("x-workspace-id", workspace_id)) if v
+        }
+        self._form = {k: v for k, v in (form_fields or {}).items() if v is not None}
+
+        self._session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=max(pool_size, self.max_in_flight),
+            pool_block=True,
+        )
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+        self._session.headers.update(self._headers)
+
+        self._executor: ThreadPoolExecutor | None = None
+        self._executor_lock = threading.Lock()
+
+    def upload(self, filename: str, image_data: bytes, mime: str = "image/webp",
+               extra_headers: dict | None = None,
+               extra_images: list[tuple[str, bytes]] | None = None) -> dict:
+        """
+        POST one image and return the parsed JSON body. `extra_images`
+        (filename, bytes) go in the same request under the same field.
+        """
+        files = [(self.image_field, (filename, image_data, mime))]
+        files += [(self.image_field, (name, data, mime)) for name, data in extra_images or ()]
+        started = time.perf_counter()
+        try:
+            response = self._session.post(
+                self.url, data=self._form, files=files,
+                headers=extra_headers, timeout=self.timeout,
+            )
+        except requests.RequestException as e:
+            metrics.inc("upload_errors", {"kind": type(e).__name__})
+            raise UploadError(f"API upload failed: {e}") from e
+        metrics.observe("upload_http_seconds", time.perf_counter() - started,
+                        help="HTTP round trip to the inspection API")
+
+        print(f"API Response: {response.status_code}")
+        if response.status_code >= 400:
+            metrics.inc("upload_errors", {"kind": f"http_{response.status_code}"})
+            raise UploadError(f"API error {response.status_code}: {response.text}",
+                              status_code=response.status_code)
+        return response.json()
+
+    def submit(self, filename: str, image_data: bytes, mime: str = "image/webp",
+               extra_headers: dict | None = None,
+               extra_images: list[tuple[str, bytes]] | None = None) -> Future:
+        """Queue an upload on the client's worker pool."""
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_in_flight, thread_name_prefix="upload")
+        return self._executor.submit(self.upload, filename, image_data, mime, extra_headers,
+                                     extra_images)
+
+    def close(self):
+        with self._executor_lock:
+            if self._executor:
+                self._executor.shutdown(wait=True)
+                self._executor = None
+        self._session.close()
+
+
+class AsyncUploadClient:
+    """
+    asyncio counterpart of UploadClient for the async run mode.
+
+    With aiohttp installed, uploads run natively on the event loop over one
+    pooled ClientSession (keep-alive, at most `max_in_flight` connections).
+    Without it, each upload is handed to a wrapped UploadClient on a worker
+    thread, so callers see the same coroutine API either way. Errors are
+    raised as UploadError with the same retryable semantics.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        api_key: str | None = None,
+        workspace_id: str | None = None,
+        form_fields: dict | None = None,
+        image_field: str = "image_file",
+        pool_size: int = 4,
+        max_in_flight: int = 2,
+        timeout: float = 30.0,
+    ):
+        self.url           = url
+        self.image_field   = image_field
+        self.timeout       = timeout
+        self.pool_size     = pool_size
+        self.max_in_flight = max(1, max_in_flight)
+
+        self._headers = {
+            k: v for k, v in (("x-api-key", api_key), ("x-workspace-id", workspace_id)) if v
+        }
+        self._form = {k: v for k, v in (form_fields or {}).items() if v is not None}
+        self._session = None  # aiohttp.ClientSession, created on the running loop
+        self._sync: UploadClient | None = None
+        if aiohttp is None:
+            self._sync = UploadClient(url, api_key, workspace_id, form_fields, image_field,
+                                      pool_size=pool_size, max_in_flight=max_in_flight,
+                                      timeout=timeout)
+        self._limit: asyncio.Semaphore | None = None
+
+    @property
+    def backend(self) -> str:
+        return "aiohttp" if self._sync is None else "requests (executor)"
+
+    async def upload(self, filename: str, image_data: bytes, mime: str = "image/webp",
+                     extra_headers: dict | None = None,
+                     extra_images: list[tuple[str, bytes]] | None = None) -> dict:
+        """POST one image (plus any `extra_images`) and return the parsed JSON body."""
+        if self._limit is None:
+            self._limit = asyncio.Semaphore(self.max_in_flight)
+        async with self._limit:
+            if self._sync is not None:
+                return await asyncio.to_thread(self._sync.upload, filename, image_data,
+                                               mime, extra_headers, extra_images)
+            return await self._upload_aiohttp(filename, image_data, mime, extra_headers,
+                                              extra_images)
+
+    async def _upload_aiohttp(self, filename, image_data, mime, extra_headers,
+                              extra_images=None) -> dict:
+        if self._session is None:
+            self._session = aiohttp.ClientSession(
+                headers=self._headers,
+                connector=aiohttp.TCPConnector(limit=max(self.pool_size, self.max_in_flight)),
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+            )
+        form = aiohttp.FormData()
+        for key, value in self._form.items():
+            form.add_field(key, str(value))
+        form.add_field(self.image_field, image_data, filename=filename, content_type=mime)
+        for name, data in extra_images or ():
+            form.add_field(self.image_field, data, filename=name, content_type=mime)
+
+        started = time.perf_counter()
+        try:
+            async with self._session.post(self.url, data=form, headers=extra_headers) as response:
+                status = response.status
+                text   = await response.text()
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            metrics.inc("upload_errors", {"kind": type(e).__name__})
+            raise UploadError(f"API upload failed: {e!r}") from e
+        metrics.observe("upload_http_seconds", time.perf_counter() - started,
+                        help="HTTP round trip to the inspection API")
+
+        print(f"API Response: {status}")
+        if status >= 400:
+            metrics.inc("upload_errors", {"kind": f"http_{status}"})
+            raise UploadError(f"API error {status}: {text}", status_code=status)
+        try:
+            return json.loads(text)
+        except ValueError as e:
+            raise UploadError(f"API returned invalid JSON: {e}", status_code=status) from e
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+        if self._sync is not None:
+            self._sync.close()
@@ -0,0 +1,279 @@
+import json
+import os
+import threading
+import time
+
+from metrics import metrics
+from upload_client import UploadClient, UploadError
+
+
+class UploadSpool:
+    """
+    Durable store-and-forward queue for uploads that could not be delivered.
+
+    Layout under `directory`:
+      journal.log   — append-only JSON lines: {"op": "put", ...} / {"op": "ack", "id": ...}
+      blobs/<id>    — image bytes, written to a temp file, fsynced and renamed
+                      before the "put" line is appended, so a crash never leaves
+                      a journal entry without its image
+      blobs/<id>.<n> — extra images sent with the same request (BURST_UPLOAD=all)
+      rejected/     — images the API refused with a non-retryable 4xx
+
+    On start the journal is replayed; every "put" without a matching "ack"
+    is pending again. A background replayer sends pending uploads oldest
+    first, `concurrency` at a time, with exponential backoff while the API
+    is unreachable. Each entry carries an idempotency key that is sent as
+    an Idempotency-Key header, so the API can ignore a replay of an upload
+    whose response was lost.
+    """
+
+    JOURNAL = "journal.log"
+
+    def __init__(
+        self,
+        directory: str,
+        client: UploadClient,
+        concurrency: int = 2,
+        base_backoff: float = 1.0,
+        max_backoff: float = 300.0,
+        on_result=None,
+    ):
+        self.directory    = directory
+        self.client       = client
+        self.concurrency  = max(1, concurrency)
+        self.base_backoff = base_backoff
+        self.max_backoff  = max_backoff
+        self.on_result    = on_result  # on_result(entry: dict, body: dict)
+
+        self._blob_dir     = os.path.join(directory, "blobs")
+        self._rejected_dir = os.path.join(directory, "rejected")
+        self._journal_path = os.path.join(directory, self.JOURNAL)
+        self._journal      = None
+        self._lock         = threading.Lock()
+        self._wakeup       = threading.Event()
+        self._stop         = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._pending: dict[str, dict] = {}  # insertion order == upload order
+        self._seq          = 0
+        self._backoff      = 0.0
+        self._retry_at     = 0.0
+
+        self.replayed = 0
+        self.rejected = 0
+
+    # ── Public API ────────────────────────────────────────────────────────────
+
+    def start(self):
+        os.makedirs(self._blob_dir, exist_ok=True)
+        os.makedirs(self._rejected_dir, exist_ok=True)
+        self._load_journal()
+        self._compact()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True, name="upload-spool")
+        self._thread.start()
+        if self._pending:
+            print(f"[Spool] {len(self._pending)} pending upload(s) found, replaying in background")
+            self._wakeup.set()
+
+    def stop(self, timeout: float = 10.0):
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread:
+            self._thread.join(timeout=timeout)
+            self._thread = None
+        with self._lock:
+            if self._journal:
+                self._journal.close()
+                self._journal = None
+
+    def put(self, filename: str, data: bytes, mime: str, idempotency_key: str,
+            meta: dict | None = None, extra_images: list[tuple[str, bytes]] | None = None):
+        """Durably record an upload (and any extra images of the same request) for later delivery."""
+        with self._lock:
+            self._seq += 1
+            entry_id = f"{int(time.time() * 1000):013d}-{self._seq:06d}"
+            entry = {
+                "op": "put",
+                "id": entry_id,
+                "seq": self._seq,
+                "filename": filename,
+                "mime": mime,
+                "idempotency_key": idempotency_key,
+                "created": time.time(),
+                "meta": meta or {},
+            }
+            if extra_images:
+                entry["extras"] = [name for name, _ in extra_images]
+            self._write_blob(entry_id, data)
+            for i, (_, extra) in enumerate(extra_images or ()):
+                self._write_blob(f"{entry_id}.{i}", extra)
+            self._append(entry)
+            self._pending[entry_id] = entry
+        metrics.inc("spooled", help="Uploads deferred to the store-and-forward spool")
+        print(f"[Spool] Queued {filename} for retry ({len(self._pending)} pending)")
+        self._wakeup.set()
+
+    def is_backing_off(self) -> bool:
+        """True while the API is considered unreachable (live uploads should spool directly)."""
+        return bool(self._pending) and time.time() < self._retry_at
+
+    def pending_count(self) -> int:
+        return len(self._pending)
+
+    # ── Journal ───────────────────────────────────────────────────────────────
+
+    def _write_blob(self, entry_id: str, data: bytes):
+        path = os.path.join(self._blob_dir, entry_id)
+        tmp  = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+    def _append(self, record: dict):
+        if self._journal is None:
+            self._journal = open(self._journal_path, "a", encoding="utf-8")
+        self._journal.write(json.dumps(record, separators=(",", ":")) + "\n")
+        self._journal.flush()
+        os.fsync(self._journal.fileno())
+
+    def _load_journal(self):
+        self._pending.clear()
+        if os.path.exists(self._journal_path):
+            with open(self._journal_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # torn last line after a crash
+                    if record.get("op") == "put":
+                        self._pending[record["id"]] = record
+                        self._seq = max(self._seq, record.get("seq", 0))
+                    elif record.get("op") == "ack":
+                        self._pending.pop(record.get("id"), None)
+
+        for entry_id, entry in list(self._pending.items()):
+            if not all(os.path.exists(os.path.join(self._blob_dir, blob))
+                       for blob in self._blobs(entry)):
+                print(f"[Spool] Missing blob for {entry_id}, dropping entry")
+                del self._pending[entry_id]
+
+    @staticmethod
+    def _blobs(entry: dict) -> list[str]:
+        """Blob file names of an entry: the image, then its extra images."""
+        return [entry["id"], *(f"{entry['id']}.{i}" for i in range(len(entry.get("extras", ()))))]
+
+    def _compact(self):
+        """Rewrite the journal with only pending entries and delete orphaned blobs."""
+        tmp = self._journal_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            for entry in self._pending.values():
+                f.write(json.dumps(entry, separators=(",", ":")) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self._journal_path)
+
+        for name in os.listdir(self._blob_dir):
+            if name.endswith(".tmp") or name.split(".", 1)[0] not in self._pending:
+                try:
+                    os.remove(os.path.join(self._blob_dir, name))
+                except OSError:
+                    pass
+
+    def _ack(self, entry: dict, rejected: bool = False):
+        entry_id = entry["id"]
+        names    = [entry["filename"], *entry.get("extras", ())]
+        with self._lock:
+            self._append({"op": "ack", "id": entry_id, "rejected": rejected})
+            self._pending.pop(entry_id, None)
+            for blob, name in zip(self._blobs(entry), names):
+                blob = os.path.join(self._blob_dir, blob)
+                try:
+                    if rejected:
+                        os.replace(blob, os.path.join(self._rejected_dir, f"{entry_id}-{name}"))
+                    else:
+                        os.remove(blob)
+                except OSError:
+                    pass
+            if not self._pending:
+                # Everything delivered: start a fresh journal instead of growing forever
+                self._journal.close()
+                self._journal = None
+                self._compact()
+
+    # ── Replayer ──────────────────────────────────────────────────────────────
+
+    def _run(self):
+        while not self._stop.is_set():
+            delay = self._retry_at - time.time()
+            self._wakeup.wait(timeout=delay if delay > 0 else None)
+            self._wakeup.clear()
+            if self._stop.is_set():
+                return
+            if time.time() < self._retry_at:
+                continue
+
+            while self._pending and not self._stop.is_set():
+                with self._lock:
+                    batch = list(self._pending.values())[:self.concurrency]
+                if not self._send_batch(batch):
+                    metrics.inc("spool_retries", help="Spool replay attempts that failed and were rescheduled")
+                    self._backoff  = min(self.max_backoff,
+                                         max(self.base_backoff, self._backoff * 2))
+                    self._retry_at = time.time() + self._backoff
+                    print(f"[Spool] API unreachable, {len(self._pending)} pending — "
+                          f"retrying in {self._backoff:.1f}s")
+                    break
+                self._backoff  = 0.0
+                self._retry_at = 0.0
+
+    def _send_batch(self, batch: list[dict]) -> bool:
+        """Send entries in parallel; returns False if the API looks unreachable."""
+        futures = []
+        for entry in batch:
+            blobs = []
+            try:
+                for blob in self._blobs(entry):
+                    with open(os.path.join(self._blob_dir, blob), "rb") as f:
+                        blobs.append(f.read())
+            except OSError as e:
+                # Deleted by hand or a disk error: nothing left to send, don't retry forever
+                print(f"[Spool] Cannot read blob for {entry['filename']} ({e}), dropping entry")
+                metrics.inc("spool_lost", help="Spooled uploads dropped because their blob was unreadable")
+                self._ack(entry, rejected=True)
+                continue
+            headers = {"Idempotency-Key": entry["idempotency_key"]}
+            extras  = list(zip(entry.get("extras", ()), blobs[1:]))
+            futures.append((entry, self.client.submit(entry["filename"], blobs[0],
+                                                      entry["mime"], headers, extras)))
+
+        ok = True
+        for entry, future in futures:
+            try:
+                body = future.result()
+            except UploadError as e:
+                if not e.retryable:
+                    print(f"[Spool] {entry['filename']} rejected by API ({e.status_code}), "
+                          f"moved to rejected/")
+                    self.rejected += 1
+                    self._ack(entry, rejected=True)
+                else:
+                    ok = False
+                continue
+            except Exception as e:
+                print(f"[Spool] Replay of {entry['filename']} failed: {e}")
+                ok = False
+                continue
+
+            self.replayed += 1
+            metrics.inc("spool_replayed")
+            self._ack(entry)
+            print(f"[Spool] Replayed {entry['filename']}: {body.get('overall_result', 'NA')} "
+                  f"({len(self._pending)} pending)")
+            if callable(self.on_result):
+                try:
+                    self.on_result(entry, body)
+                except Exception as e:
+                    print(f"[Spool] on_result callback failed: {e}")
+        return ok